@@ -0,0 +1,55 @@
+""" Times the assembling of the compiler P-Code, without the image cache.
+
+The digest of the assembled code, constant tables and labels is printed with the timings,
+so that the outputs of two versions of the assembler can be compared.
+
+Run from the root of the repository:
+`python -m benchmarks.assembler` or `python -m benchmarks.assembler --runs 20`
+"""
+import argparse
+import hashlib
+import pickle
+import time
+
+from reinterpreted.assembler import load
+from reinterpreted.code import CodeSegment
+from reinterpreted.store import Store, StoreConfiguration
+
+COMPILER = "compiler/pcomp-adjusted.p2"
+
+
+def assemble_file(prd_filename) -> tuple[float, str]:
+    """Returns the time taken by the assembling and the digest of its result"""
+    store = Store(StoreConfiguration())
+    code = CodeSegment()
+    with open(prd_filename) as prd:
+        start = time.perf_counter()
+        labels = load(prd, store, code)
+        elapsed = time.perf_counter() - start
+        prd_position = prd.tell()
+
+    image = ([field[:code.size].tobytes() for field in (code.op, code.p, code.q)], store.export_constants(),
+             labels.labels, prd_position)
+    return elapsed, hashlib.sha256(pickle.dumps(image)).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the assembling of a P-Code file")
+    parser.add_argument("--prd", default=COMPILER, help="P-Code file to assemble")
+    parser.add_argument("--runs", type=int, default=10, help="number of runs, the best one is kept")
+    arguments = parser.parse_args()
+
+    with open(arguments.prd) as prd:
+        line_count = sum(1 for _ in prd)
+
+    results = [assemble_file(arguments.prd) for _ in range(arguments.runs)]
+    best = min(elapsed for elapsed, _ in results)
+    digests = {digest for _, digest in results}
+
+    print(f"{arguments.prd}: {line_count} lines")
+    print(f"best of {arguments.runs}: {best * 1000:.1f} ms, {line_count / best:.0f} lines/s")
+    print(f"digest: {' '.join(digests)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+""" Compares the interpreter engines when the compiler compiles a source file.
+
+Run from the root of the repository:
+`python -m benchmarks.engines` or `python -m benchmarks.engines --source compiler/pcomp-adjusted.pas --runs 1`
+"""
+import argparse
+import io
+import time
+
+from reinterpreted import image_cache, interpreter, table_interpreter, tiered
+from reinterpreted.code import CodeSegment
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, StoreConfiguration
+from translation import streams
+
+COMPILER = "compiler/pcomp-adjusted.p2"
+
+engines = {
+    'classic': interpreter.run,
+    'table': table_interpreter.run,
+    'tier2': tiered.run,
+}
+
+
+def count_instructions(context: Context, code: CodeSegment) -> int:
+    """Runs the code with the table handlers, counting the executed instructions"""
+    handlers = table_interpreter.op_handlers
+    ops, ps, qs = code.op, code.p, code.q
+    count = 0
+    while context.running:
+        pc = context.pc
+        context.pc = pc + 1
+        handlers[ops[pc]](ps[pc], qs[pc], context)
+        count += 1
+    return count
+
+
+def prepare_compilation(source_text) -> tuple[Context, CodeSegment]:
+    """Returns a context and code ready to run the compiler on the given source"""
+    configuration = StoreConfiguration()
+    store = Store(configuration)
+    code = CodeSegment()
+    with open(COMPILER) as prd:
+        image_cache.load(prd, store, code, configuration)
+
+    context = Context(streams.MemoryInputStream(4, io.StringIO(source_text)), streams.OutputStream(5, io.StringIO()),
+                      None, streams.OutputStream(7, io.StringIO()), store)
+    interpreter.initialize_files(context)
+    return context, code
+
+
+def time_compilation(run, source_text) -> float:
+    context, code = prepare_compilation(source_text)
+    start = time.perf_counter()
+    run(context, code)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interpreter engines benchmark")
+    parser.add_argument("--source", default="examples/hello.pas", help="Pascal source file to compile")
+    parser.add_argument("--runs", type=int, default=5, help="number of runs per engine, the best one is kept")
+    arguments = parser.parse_args()
+
+    with open(arguments.source) as source:
+        source_text = source.read()
+
+    instructions = count_instructions(*prepare_compilation(source_text))
+    print(f"Compiling {arguments.source}: {instructions} instructions")
+
+    reference_time = None
+    for name, run in engines.items():
+        best_time = min(time_compilation(run, source_text) for _ in range(arguments.runs))
+        reference_time = reference_time or best_time
+        print(f"{name:>10}: {best_time:8.3f} s {instructions / best_time:12,.0f} instructions/s"
+              f" x{reference_time / best_time:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+""" Runs a command and writes its wall time and peak memory to a file, for benchmarks.suite.
+
+The maximum resident set size of a child process starts at the size of its parent when it forks,
+so the runs are forked from this small process instead of the suite, which holds the compiler.
+Run with `python -S`, to keep it small: `python -S benchmarks/launcher.py RESULT_FILE COMMAND...`
+"""
+import os
+import sys
+import time
+
+
+def main():
+    result_filename, command = sys.argv[1], sys.argv[2:]
+
+    start = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.execv(command[0], command)
+        finally:
+            os._exit(127)
+    _, status, usage = os.wait4(pid, 0)
+    elapsed = time.perf_counter() - start
+
+    peak_memory = usage.ru_maxrss if sys.platform != 'darwin' else usage.ru_maxrss // 1024
+    with open(result_filename, "w") as result:
+        result.write(f"{elapsed} {peak_memory}\n")
+    sys.exit(os.waitstatus_to_exitcode(status))
+
+
+if __name__ == '__main__':
+    main()
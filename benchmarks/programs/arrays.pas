@@ -0,0 +1,45 @@
+PROGRAM ARRAYS(OUTPUT);
+(* LOOPS OVER ARRAYS: INDEXED LOADS AND STORES, WITH THEIR BOUND CHECKS *)
+CONST SIEVESIZE = 3000; SORTSIZE = 200; N = 16;
+VAR PRIME: ARRAY [2..SIEVESIZE] OF BOOLEAN;
+    LIST: ARRAY [1..SORTSIZE] OF INTEGER;
+    A, B, C: ARRAY [1..N, 1..N] OF INTEGER;
+    I, J, K, COUNT, SUM, SEED, T: INTEGER;
+BEGIN
+  FOR I := 2 TO SIEVESIZE DO PRIME[I] := TRUE;
+  FOR I := 2 TO SIEVESIZE DIV 2 DO
+    IF PRIME[I] THEN
+    BEGIN
+      J := I + I;
+      WHILE J <= SIEVESIZE DO BEGIN PRIME[J] := FALSE; J := J + I END
+    END;
+  COUNT := 0;
+  FOR I := 2 TO SIEVESIZE DO IF PRIME[I] THEN COUNT := COUNT + 1;
+  WRITELN(COUNT:6, ' PRIMES BELOW ', SIEVESIZE:6);
+
+  SEED := 17;
+  FOR I := 1 TO SORTSIZE DO
+  BEGIN
+    SEED := (SEED * 125 + 3) MOD 8191;
+    LIST[I] := SEED
+  END;
+  FOR I := SORTSIZE - 1 DOWNTO 1 DO
+    FOR J := 1 TO I DO
+      IF LIST[J] > LIST[J + 1] THEN
+      BEGIN T := LIST[J]; LIST[J] := LIST[J + 1]; LIST[J + 1] := T END;
+  WRITELN('SORTED: ', LIST[1]:6, LIST[SORTSIZE DIV 2]:6, LIST[SORTSIZE]:6);
+
+  FOR I := 1 TO N DO
+    FOR J := 1 TO N DO
+    BEGIN A[I, J] := I + J; B[I, J] := (I * J) MOD 7 END;
+  FOR I := 1 TO N DO
+    FOR J := 1 TO N DO
+    BEGIN
+      SUM := 0;
+      FOR K := 1 TO N DO SUM := SUM + A[I, K] * B[K, J];
+      C[I, J] := SUM
+    END;
+  SUM := 0;
+  FOR I := 1 TO N DO SUM := SUM + C[I, I];
+  WRITELN('TRACE: ', SUM:8)
+END.
@@ -0,0 +1,37 @@
+PROGRAM REALS(OUTPUT);
+(* REAL ARITHMETIC: CONVERSIONS, THE FOUR OPERATIONS, ABS, SQR AND TRUNC.
+   THE REAL CONSTANTS TABLE IS SMALL, AND THE ASSEMBLER READS NEITHER EXPONENTS NOR THE ZEROS
+   AFTER THE DECIMAL POINT: MOST CONSTANTS ARE INTEGERS, CONVERTED WHEN NEEDED. *)
+CONST TERMS = 30000;
+VAR I, STEPS: INTEGER;
+    PI, SIGN, X, ROOT, SUM, AREA: REAL;
+BEGIN
+  PI := 0;
+  SIGN := 1;
+  FOR I := 0 TO TERMS DO
+  BEGIN
+    PI := PI + SIGN * 4 / (2 * I + 1);
+    SIGN := -SIGN
+  END;
+  WRITELN('PI IS ABOUT ', PI:16);
+
+  SUM := 0;
+  STEPS := 0;
+  FOR I := 1 TO 3000 DO
+  BEGIN
+    X := I;
+    ROOT := X / 2 + 1;
+    WHILE ABS(SQR(ROOT) - X) > X / 30000 / 30000 DO
+    BEGIN ROOT := (ROOT + X / ROOT) / 2; STEPS := STEPS + 1 END;
+    SUM := SUM + ROOT
+  END;
+  WRITELN('SUM OF ROOTS ', SUM:16, ' IN ', STEPS:6, ' STEPS');
+
+  AREA := 0;
+  FOR I := 0 TO 9999 DO
+  BEGIN
+    X := (I + 0.5) / 10000;
+    AREA := AREA + 4 / (1 + SQR(X)) / 10000
+  END;
+  WRITELN('MIDPOINT PI ', AREA:16, ' ', TRUNC(AREA * 10000):8)
+END.
@@ -0,0 +1,47 @@
+PROGRAM RECURSION(OUTPUT);
+(* CALLS AND UP-LEVEL ACCESSES, THROUGH THE STATIC LINKS OF NESTED PROCEDURES *)
+VAR CALLS, TOTAL, I: INTEGER;
+
+PROCEDURE HANOI(N: INTEGER);
+  VAR MOVES: INTEGER;
+
+  PROCEDURE SOLVE;
+
+    PROCEDURE MOVE(K, SOURCE, TARGET, SPARE: INTEGER);
+    BEGIN
+      CALLS := CALLS + 1;
+      IF K > 0 THEN
+      BEGIN
+        MOVE(K - 1, SOURCE, SPARE, TARGET);
+        MOVES := MOVES + 1;
+        MOVE(K - 1, SPARE, TARGET, SOURCE)
+      END
+    END;
+
+  BEGIN
+    MOVE(N, 1, 3, 2)
+  END;
+
+BEGIN
+  MOVES := 0;
+  SOLVE;
+  TOTAL := TOTAL + MOVES;
+  WRITELN('HANOI ', N:2, ': ', MOVES:8, ' MOVES')
+END;
+
+FUNCTION ACK(M, N: INTEGER): INTEGER;
+BEGIN
+  CALLS := CALLS + 1;
+  IF M = 0 THEN ACK := N + 1
+  ELSE IF N = 0 THEN ACK := ACK(M - 1, 1)
+  ELSE ACK := ACK(M - 1, ACK(M, N - 1))
+END;
+
+BEGIN
+  CALLS := 0;
+  TOTAL := 0;
+  FOR I := 10 TO 13 DO HANOI(I);
+  FOR I := 1 TO 5 DO WRITELN('ACK(2, ', I:1, ') = ', ACK(2, I):4);
+  WRITELN('ACK(3, 4) = ', ACK(3, 4):4);
+  WRITELN(TOTAL:8, ' MOVES, ', CALLS:8, ' CALLS')
+END.
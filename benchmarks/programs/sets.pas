@@ -0,0 +1,38 @@
+PROGRAM SETS(OUTPUT);
+(* SET CONSTRUCTION, UNION, INTERSECTION, DIFFERENCE, INCLUSION AND MEMBERSHIP TESTS *)
+CONST ROUNDS = 150;
+TYPE SMALL = SET OF 0..47;
+VAR MULTIPLES, PRIMES, ODDS, REST: SMALL;
+    I, K, ROUND, MEMBERS, INCLUDED: INTEGER;
+BEGIN
+  MEMBERS := 0;
+  INCLUDED := 0;
+  FOR ROUND := 1 TO ROUNDS DO
+  BEGIN
+    PRIMES := [];
+    ODDS := [];
+    FOR I := 0 TO 47 DO
+    BEGIN
+      IF I >= 2 THEN PRIMES := PRIMES + [I];
+      IF ODD(I) THEN ODDS := ODDS + [I]
+    END;
+    FOR K := 2 TO 7 DO
+    BEGIN
+      MULTIPLES := [];
+      I := K + K;
+      WHILE I <= 47 DO BEGIN MULTIPLES := MULTIPLES + [I]; I := I + K END;
+      PRIMES := PRIMES - MULTIPLES;
+      IF MULTIPLES * ODDS <= ODDS THEN INCLUDED := INCLUDED + 1
+    END;
+    REST := PRIMES * ODDS + [ROUND MOD 48];
+    FOR I := 0 TO 47 DO
+    BEGIN
+      IF I IN PRIMES THEN MEMBERS := MEMBERS + 1;
+      IF I IN REST THEN MEMBERS := MEMBERS + 1;
+      IF (I IN [1, 3, 5, 7, 11, 13]) AND NOT (I IN MULTIPLES) THEN MEMBERS := MEMBERS + 1
+    END
+  END;
+  FOR I := 0 TO 47 DO IF I IN PRIMES THEN WRITE(I:3);
+  WRITELN(OUTPUT);
+  WRITELN(MEMBERS:8, ' MEMBERS, ', INCLUDED:8, ' INCLUSIONS')
+END.
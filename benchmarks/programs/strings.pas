@@ -0,0 +1,30 @@
+PROGRAM STRINGS(OUTPUT);
+(* ASSIGNMENTS AND COMPARISONS OF PACKED ARRAYS OF CHARACTERS, MADE BY MOV AND THE STRING COMPARES *)
+CONST COUNT = 60; ROUNDS = 4;
+TYPE NAME = PACKED ARRAY [1..12] OF CHAR;
+VAR NAMES: ARRAY [1..COUNT] OF NAME;
+    T, LOWEST: NAME;
+    I, J, ROUND, EQUALS, SWAPS: INTEGER;
+BEGIN
+  SWAPS := 0;
+  EQUALS := 0;
+  FOR ROUND := 1 TO ROUNDS DO
+  BEGIN
+    FOR I := 1 TO COUNT DO
+      FOR J := 1 TO 12 DO
+        NAMES[I][J] := CHR(ORD('A') + (I * 7 + J * ROUND + I * J) MOD 26);
+    FOR I := COUNT - 1 DOWNTO 1 DO
+      FOR J := 1 TO I DO
+        IF NAMES[J] > NAMES[J + 1] THEN
+        BEGIN T := NAMES[J]; NAMES[J] := NAMES[J + 1]; NAMES[J + 1] := T; SWAPS := SWAPS + 1 END;
+    LOWEST := 'ZZZZZZZZZZZZ';
+    FOR I := 1 TO COUNT DO
+    BEGIN
+      IF NAMES[I] < LOWEST THEN LOWEST := NAMES[I];
+      FOR J := 1 TO COUNT DO
+        IF NAMES[I] = NAMES[J] THEN EQUALS := EQUALS + 1
+    END;
+    WRITELN(NAMES[1], ' ', NAMES[COUNT], ' ', LOWEST)
+  END;
+  WRITELN(SWAPS:8, ' SWAPS, ', EQUALS:8, ' EQUALS')
+END.
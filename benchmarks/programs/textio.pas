@@ -0,0 +1,30 @@
+PROGRAM TEXTIO(INPUT, OUTPUT);
+(* CHARACTER READS, LINE ENDS, AND FORMATTED WRITES OF INTEGERS AND CHARACTERS, TO OUTPUT AND PRR *)
+VAR CH: CHAR;
+    LINES, CHARS, LETTERS, I, WIDTH: INTEGER;
+BEGIN
+  LINES := 0;
+  CHARS := 0;
+  LETTERS := 0;
+  WHILE NOT EOF(INPUT) DO
+  BEGIN
+    WIDTH := 0;
+    WHILE NOT EOLN(INPUT) DO
+    BEGIN
+      READ(CH);
+      CHARS := CHARS + 1;
+      WIDTH := WIDTH + 1;
+      IF (CH >= 'A') AND (CH <= 'Z') THEN
+      BEGIN LETTERS := LETTERS + 1; WRITE(CH) END
+    END;
+    READ(INPUT, CH);  (* THE LINE END, READ AS A SPACE *)
+    WRITELN(' ', WIDTH:3);
+    LINES := LINES + 1
+  END;
+  WRITELN(LINES:6, ' LINES, ', CHARS:6, ' CHARACTERS, ', LETTERS:6, ' LETTERS');
+  FOR I := 1 TO 4000 DO
+  BEGIN
+    WRITELN(I:6, I * I:10, ' ', CHR(ORD('A') + I MOD 26), ' ', ORD(ODD(I)):1);
+    WRITELN(PRR, I:8, ' ', CHR(ORD('A') + I MOD 26))
+  END
+END.
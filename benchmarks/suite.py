@@ -0,0 +1,220 @@
+""" Runs the benchmark programs with the interpreters of translation/ and reinterpreted/.
+
+The programs of benchmarks/programs each stress a part of the interpreters: calls and up-level
+accesses, array loops, string moves and compares, sets, real arithmetic and text I/O. They are
+compiled by the compiler, then run by each interpreter in its own process, with their source as INPUT.
+The `compiler` benchmark runs the compiler on its own source.
+
+For each program and interpreter, the best wall time of the runs, the instructions run per second
+and the peak memory of the process (its maximum resident set size, measured by benchmarks/launcher.py)
+are printed, and saved as JSON with --output. The results of a previous version are compared with --baseline.
+
+Run from the root of the repository:
+`python -m benchmarks.suite` or
+`python -m benchmarks.suite --programs recursion sets --interpreters table tier2 --output results.json`
+"""
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from os.path import basename, join, splitext
+
+from benchmarks.engines import COMPILER, count_instructions
+from reinterpreted import image_cache, interpreter
+from reinterpreted.code import CodeSegment
+from reinterpreted.compile_server import CompileServer
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, StoreConfiguration
+from translation import streams
+
+PROGRAMS_FOLDER = "benchmarks/programs"
+COMPILER_SOURCE = "compiler/pcomp-adjusted.pas"
+LAUNCHER = join(os.path.dirname(os.path.abspath(__file__)), "launcher.py")
+
+# The command running a P-Code file, before and after its name
+interpreters = {
+    'translation': (["translation/pascal_interpreter.py"], []),
+    'classic': (["-m", "reinterpreted.pascal_interpreter"], ["--engine", "classic"]),
+    'table': (["-m", "reinterpreted.pascal_interpreter"], ["--engine", "table"]),
+    'tier2': (["-m", "reinterpreted.pascal_interpreter"], ["--engine", "table", "--tier2"]),
+}
+
+
+class Benchmark:
+    def __init__(self, name, prd_filename, input_filename):
+        self.name = name
+        self.prd_filename = prd_filename
+        self.input_filename = input_filename
+        self.instructions = 0
+
+
+def benchmark_names() -> list[str]:
+    names = [splitext(basename(filename))[0] for filename in glob.glob(join(PROGRAMS_FOLDER, "*.pas"))]
+    return sorted(names) + ['compiler']
+
+
+def prepare_benchmarks(names, directory) -> list[Benchmark]:
+    """Writes the P-Code of the benchmarks to directory, the programs being compiled by the compiler"""
+    server = None
+    benchmarks = []
+    for name in names:
+        prd_filename = join(directory, name + ".p2")
+        if name == 'compiler':
+            shutil.copyfile(COMPILER, prd_filename)
+            benchmarks.append(Benchmark(name, prd_filename, COMPILER_SOURCE))
+            continue
+
+        server = server or CompileServer.from_file(COMPILER)
+        source_filename = join(PROGRAMS_FOLDER, name + ".pas")
+        with open(source_filename) as source:
+            result = server.compile(source.read())
+        if result.errors:
+            raise RuntimeError(f"{source_filename} doesn't compile: {result.errors[0]}")
+        with open(prd_filename, "w") as prd:
+            prd.write(result.pcode)
+        benchmarks.append(Benchmark(name, prd_filename, source_filename))
+    return benchmarks
+
+
+def count_benchmark_instructions(benchmark: Benchmark) -> int:
+    """Runs the benchmark with the table handlers, counting the instructions.
+    This also caches the assembled image used by the runs of reinterpreted/."""
+    configuration = StoreConfiguration()
+    store = Store(configuration)
+    code = CodeSegment()
+    with open(benchmark.prd_filename) as prd, open(benchmark.input_filename) as input_file:
+        image_cache.load(prd, store, code, configuration)
+        context = Context(streams.MemoryInputStream(4, input_file), streams.OutputStream(5, io.StringIO()),
+                          prd, streams.OutputStream(7, io.StringIO()), store)
+        interpreter.initialize_files(context)
+        return count_instructions(context, code)
+
+
+def run_once(command, benchmark: Benchmark) -> tuple[float, int, str]:
+    """Runs the command through the launcher, returns its wall time, its peak memory in KB
+    and the digest of its outputs"""
+    base_filename, _ = splitext(benchmark.prd_filename)
+    with (open(benchmark.input_filename) as input_file, tempfile.TemporaryFile() as output,
+          tempfile.NamedTemporaryFile("r") as result):
+        launcher_command = [sys.executable, "-S", LAUNCHER, result.name] + command
+        returncode = subprocess.call(launcher_command, stdin=input_file, stdout=output, stderr=subprocess.DEVNULL)
+        if returncode:
+            raise RuntimeError(f"{' '.join(command)} failed with {returncode}")
+        elapsed, peak_memory = result.read().split()
+
+        output.seek(0)
+        digest = hashlib.sha256(output.read())
+    with open(base_filename + ".out", "rb") as prr:
+        digest.update(prr.read())
+
+    return float(elapsed), int(peak_memory), digest.hexdigest()
+
+
+def run_benchmark(benchmark: Benchmark, interpreter_name, runs) -> dict:
+    arguments_before, arguments_after = interpreters[interpreter_name]
+    command = [sys.executable] + arguments_before + [benchmark.prd_filename] + arguments_after
+    results = [run_once(command, benchmark) for _ in range(runs)]
+    best_time = min(elapsed for elapsed, _, _ in results)
+    return {'program': benchmark.name,
+            'interpreter': interpreter_name,
+            'instructions': benchmark.instructions,
+            'wall_time_s': best_time,
+            'instructions_per_s': benchmark.instructions / best_time,
+            'peak_memory_kb': max(peak_memory for _, peak_memory, _ in results),
+            'output_digest': results[0][2]}
+
+
+def load_baseline(filename) -> dict[tuple[str, str], dict]:
+    with open(filename) as baseline:
+        return {(result['program'], result['interpreter']): result for result in json.load(baseline)['results']}
+
+
+def peaks_differ(results) -> bool:
+    """Tells if the interpreters running a benchmark have different peak memories, as they should"""
+    return len(results) < 2 or len({result['peak_memory_kb'] for result in results}) > 1
+
+
+def report_line(result, reference_digest, baseline) -> str:
+    line = (f"{result['program']:<10}{result['interpreter']:<12}{result['instructions']:>12,}"
+            f"{result['wall_time_s']:>10.3f}{result['instructions_per_s']:>14,.0f}"
+            f"{result['peak_memory_kb'] / 1024:>10.1f}")
+    previous = baseline.get((result['program'], result['interpreter']))
+    if previous:
+        line += f"{previous['wall_time_s'] / result['wall_time_s']:>9.2f}x"
+    if result['output_digest'] != reference_digest:
+        line += "  output differs"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite of the interpreters")
+    parser.add_argument("--programs", nargs='+', choices=benchmark_names(), default=benchmark_names(),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--interpreters", nargs='+', choices=interpreters.keys(), default=list(interpreters.keys()),
+                        help="interpreters running the benchmarks (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="number of runs of each benchmark, the best one is kept")
+    parser.add_argument("--output", metavar="JSON_FILE", help="file where the results are saved")
+    parser.add_argument("--baseline", metavar="JSON_FILE",
+                        help="results of a previous version, the speedups over them are printed")
+    arguments = parser.parse_args()
+
+    baseline = load_baseline(arguments.baseline) if arguments.baseline else {}
+    results = []
+    print(f"{'Program':<10}{'Interpreter':<12}{'instructions':>12}{'time s':>10}{'instr./s':>14}{'peak MB':>10}"
+          + (f"{'speedup':>10}" if baseline else ""))
+    with tempfile.TemporaryDirectory() as directory:
+        for benchmark in prepare_benchmarks(arguments.programs, directory):
+            benchmark.instructions = count_benchmark_instructions(benchmark)
+            reference_digest = None
+            benchmark_results = []
+            for interpreter_name in arguments.interpreters:
+                result = run_benchmark(benchmark, interpreter_name, arguments.runs)
+                reference_digest = reference_digest or result['output_digest']
+                print(report_line(result, reference_digest, baseline), flush=True)
+                benchmark_results.append(result)
+            if not peaks_differ(benchmark_results):
+                print(f"{benchmark.name}: same peak memory for all the interpreters, "
+                      f"it may be the one of the launcher", file=sys.stderr)
+            results.extend(benchmark_results)
+
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump({'python': platform.python_version(), 'platform': platform.platform(),
+                       'date': time.strftime("%Y-%m-%dT%H:%M:%S"), 'runs': arguments.runs,
+                       'results': results}, output, indent=2)
+
+
+class TestSuite(unittest.TestCase):
+    def run_command(self, source) -> int:
+        with tempfile.TemporaryDirectory() as directory:
+            benchmark = Benchmark("test", join(directory, "test.p2"), os.devnull)
+            open(join(directory, "test.out"), "w").close()
+            _, peak_memory, _ = run_once([sys.executable, "-c", source], benchmark)
+        return peak_memory
+
+    def test_peak_memory_is_the_one_of_the_command(self):
+        suite_memory = b"x" * (200 * 1024 * 1024)  # Much larger than a Python process
+
+        small_peak = self.run_command("pass")
+        large_peak = self.run_command("memory = b'x' * (100 * 1024 * 1024)")
+
+        self.assertLess(small_peak, len(suite_memory) // 1024 // 2)
+        self.assertGreater(large_peak, small_peak + 90 * 1024)
+
+    def test_peaks_must_differ_between_interpreters(self):
+        self.assertTrue(peaks_differ([{'peak_memory_kb': 17000}, {'peak_memory_kb': 20000}]))
+        self.assertFalse(peaks_differ([{'peak_memory_kb': 21600}, {'peak_memory_kb': 21600}]))
+        self.assertTrue(peaks_differ([{'peak_memory_kb': 21600}]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 import unittest
 
-from reinterpreted.code import Code
+from reinterpreted.code import Code, CodeSegment
 
 
 class Labels:
@@ -24,7 +24,7 @@ class Labels:
             raise RuntimeError("Duplicated label")
 
         while chained_address != -1:  # Forward reference
-            c = code[chained_address]
+            c = code[chained_address]  # A Code, or a CodeCell of a CodeSegment
             chained_address = c.q
             c.q = label_value
 
@@ -69,3 +69,12 @@ class TestLabels(unittest.TestCase):
         self.assertEqual(100, code[10].q)
         self.assertEqual(100, code[15].q)
         self.assertEqual(100, code[20].q)
+
+    def test_forward_references_are_updated_in_a_code_segment(self):
+        labels = Labels(5)
+        code = CodeSegment(25)
+        code.q[10] = labels.add_reference(5, 10)
+        code.q[15] = labels.add_reference(5, 15)
+        labels.declare(5, 100, code)
+        self.assertEqual(100, code.q[10])
+        self.assertEqual(100, code.q[15])
@@ -1,8 +1,9 @@
+import io
 import unittest
 
 from reinterpreted.asm_labels import Labels
-from reinterpreted.code import Code
-from reinterpreted.store import Store
+from reinterpreted.code import CodeSegment
+from reinterpreted.store import Store, TestStore
 from translation import string_buffer
 
 BEGINCODE = 3  #
@@ -27,133 +28,113 @@ sptable = ['GET', 'PUT', 'RST', 'RLN', 'NEW',
            'SAV']
 
 
-def get_name(line):
-    line = line.lstrip()
-    word = line[:2]
-    line = line[2:]
-
-    if len(line):
-        word += line[0]
-        line = line[1:]
-
-    return word, line
+# Opcodes and standard procedure numbers, indexed by their names
+INSTRUCTION_CODES = {name: op for op, name in enumerate(instructions)}
+STANDARD_PROCEDURE_CODES = {name: q for q, name in enumerate(sptable)}
 
 
-def get_label_id(line):
-    l_index = line.index('L')
-    line = line[l_index + 1:]
-    x, _ = string_buffer.parse_integer(line)
-
-    return x
+def get_label_id(operands) -> int:
+    """Returns the number of the label ending the operands, as in `0 L   3`"""
+    return int(operands[operands.index('L') + 1:])
 
 
 def assemble(line, pc, store, labels: Labels):
-    """TRANSLATE SYMBOLIC CODE INTO MACHINE CODE AND context.store"""
-    name, line = get_name(line)
+    """TRANSLATE SYMBOLIC CODE INTO MACHINE CODE AND context.store
 
-    op = instructions.index(name)
+    The operands are split once, the numbers being converted by int, which ignores the blanks around them.
+    """
+    line = line.lstrip()
+    op = INSTRUCTION_CODES[line[:3]]
+    operands = line[3:]
     p = 0
     q = 0
 
     if op in (17, 18, 19, 20, 21, 22):  # (*EQU,NEQ,GEQ,GRT,LEQ,LES*)
-        p = 'AIRBSM'.index(line[0])
+        p = 'AIRBSM'.index(operands[0])
         if p == 5:
-            q, _ = string_buffer.parse_integer(line[1:])
+            q = int(operands[1:])
     elif op in (0, 2, 4):  # (*LOD,STR,LDA*)
-        p, line = string_buffer.parse_integer(line)
-        q, _ = string_buffer.parse_integer(line)
+        p, q = map(int, operands.split())
     elif op == 12:  # (*CUP*)
-        p, line = string_buffer.parse_integer(line)
-        label_id = get_label_id(line)
-        q = labels.add_reference(label_id, pc)
+        p = int(operands[:operands.index('L')])
+        q = labels.add_reference(get_label_id(operands), pc)
     elif op == 11:  # (*MST*)
-        p, _ = string_buffer.parse_integer(line)
+        p = int(operands)
     elif op == 14:  # (*RET*)
-        p = 'PIRCBA'.index(line[0])
+        p = 'PIRCBA'.index(operands[0])
     elif op in (1, 3, 5, 9, 10, 16, 55, 57):  # (*LDO,SRO,LAO,IND,INC,IXA,MOV,DEC*)
-        q, _ = string_buffer.parse_integer(line)
+        q = int(operands)
     elif op in (13, 23, 24, 25):  # (*ENT,UJP,FJP,XJP*)
-        label_id = get_label_id(line)
-        q = labels.add_reference(label_id, pc)
+        q = labels.add_reference(get_label_id(operands), pc)
     elif op == 15:  # (*CSP*)
-        name, _ = get_name(line)
-        while sptable[q] != name:
-            q += 1
+        q = STANDARD_PROCEDURE_CODES[operands.lstrip()[:3]]
     elif op == 7:  # (*LDC*)
-        type_ch = line[0]
-        line = line[1:]
+        type_ch = operands[0]
+        operands = operands[1:]
         if type_ch == 'I':
             p = 1
-            i, _ = string_buffer.parse_integer(line)
+            i = int(operands)
             if abs(i) > LARGEINT:
                 op = 8  # Change to LCI
                 q = store.add_int_constant(i)
             else:
                 q = i
-            pass
         elif type_ch == 'R':
             op = 8  # Change to LCI
             p = 2
-            r, _ = string_buffer.parse_real(line)
+            r, _ = string_buffer.parse_real(operands)
             q = store.add_real_constant(r)
-            pass
         elif type_ch == 'N':
             pass
         elif type_ch == 'B':
             p = 3
-            q, _ = string_buffer.parse_integer(line)
+            q = int(operands)
         elif type_ch == '(':
             op = 8  # Change to LCI
             p = 4
-            s = set()
-
-            while type_ch != ')':
-                s1, line = string_buffer.parse_integer(line)
-                type_ch = line.strip()[0]
-
-                s.add(s1)
+            s = 0  # Sets are bitmasks, the empty set being ()
+            for s1 in operands[:operands.index(')')].split():
+                s |= 1 << int(s1)
 
             q = store.add_set_constant(s)
     elif op == 26:  # (*CHK*)
-        lb, line = string_buffer.parse_integer(line[1:])
-        ub, _ = string_buffer.parse_integer(line)
+        lb, ub = map(int, operands[1:].split())
 
         q = store.add_boundary_constant((lb, ub))
     elif op == 56:  # (*LCA*)
-        line = line[1:]
-        data = [ord(ch) for ch in line[:line.index("'")]]
+        operands = operands[1:]
+        data = [ord(ch) for ch in operands[:operands.index("'")]]
         q = store.add_multiple_constant(data)
 
     return op, p, q
 
 
-def generate(prd, pc, store: Store, labels: Labels, code: list[Code]):
-    while line := prd.readline():
-        if len(line.strip()) == 0:  # End of listing / blank line, stop assembling
-            break
-
-        ch, line = line[0], line[1:]
-
-        if ch == 'I':  # Ignore comments
-            pass
-        elif ch == 'L':  # Define labels
-            label_id, line = string_buffer.parse_integer(line)
-            line = line.strip()
-            if line and line[0] == '=':
-                label_value, _ = string_buffer.parse_integer(line[1:])
-            else:
-                label_value = pc
-            labels.declare(label_id, label_value, code)
-        elif ch == ' ':  # Assemble and store instructions
-            op, p, q = assemble(line, pc, store, labels)
-            code[pc].op = op
-            code[pc].p = p
-            code[pc].q = q
+def generate(prd, pc, store: Store, labels: Labels, code: CodeSegment):
+    # readline, as the position in prd is read after the loading
+    readline = prd.readline
+    code_op, code_p, code_q = code.op, code.p, code.q
+    while line := readline():
+        ch = line[0]
 
+        if ch == ' ':  # Assemble and store instructions
+            if not line.strip():  # Blank line, stop assembling
+                break
+            if pc >= len(code_op):
+                code.reserve(pc)
+            code_op[pc], code_p[pc], code_q[pc] = assemble(line, pc, store, labels)
             pc += 1
+        elif ch == 'L':  # Define labels
+            label_id, _, label_value = line[1:].partition('=')
+            labels.declare(int(label_id), int(label_value) if label_value.strip() else pc, code)
+        elif ch == 'I':  # Ignore comments
+            pass
+        elif not line.strip():  # End of listing / blank line, stop assembling
+            break
+    if pc > code.size:
+        code.size = pc
 
 
-def load(prd, store: Store, code):
+def load(prd, store: Store, code: CodeSegment):
     labels = Labels(MAX_LABELS)
 
     # There are two generate calls. The first is the general source code to assemble
@@ -162,6 +143,8 @@ def load(prd, store: Store, code):
     generate(prd, BEGINCODE, store, labels, code)
     generate(prd, 0, store, labels, code)
 
+    return labels
+
 
 class TestAssembler(unittest.TestCase):
     def test_can_assemble_LOD_instruction(self):
@@ -171,3 +154,34 @@ class TestAssembler(unittest.TestCase):
         self.assertEqual(0, op)
         self.assertEqual(4, p)
         self.assertEqual(6, q)
+
+    def test_can_assemble_call_and_standard_procedure(self):
+        labels = Labels(5)
+        labels.declare(3, 100, [])
+
+        self.assertEqual((12, 1, 100), assemble(' CUP   1   L   3\n', 0, None, labels))
+        self.assertEqual((15, 0, sptable.index('WRC')), assemble(' CSP         WRC\n', 0, None, labels))
+        self.assertEqual((17, 5, 8), assemble(' EQUM          8\n', 0, None, labels))
+
+    def test_can_assemble_constants_into_the_store(self):
+        store = Store(TestStore.MockStoreConfiguration())
+        labels = Labels(2)
+
+        op, p, q = assemble(' LDC(  1  5)\n', 0, store, labels)
+        self.assertEqual((8, 4, (1 << 1) | (1 << 5)), (op, p, store.get_value(q)))
+        op, p, q = assemble(' LDC()\n', 0, store, labels)
+        self.assertEqual(0, store.get_value(q))
+        op, p, q = assemble(" LCA'AB'\n", 0, store, labels)
+        self.assertEqual([('INT', 65), ('INT', 66)], store.get_cells(q, q + 2))
+
+    def test_labels_are_declared_at_the_current_address(self):
+        code = CodeSegment(10)
+        prd = io.StringIO("L   3\n ENT       L   4\n RETP\nL   4=         5\n\n"
+                          " MST           0\n CUP   0   L   3\n STP\n\n")
+        labels = load(prd, Store(TestStore.MockStoreConfiguration()), code)
+
+        self.assertEqual((3, 'DEFINED'), labels.labels[3])
+        self.assertEqual([13, 14], list(code.op[3:5]))
+        self.assertEqual(5, code.q[3])
+        self.assertEqual(3, code.q[1])
+        self.assertEqual(5, code.size)
@@ -0,0 +1,143 @@
+""" Batch runs of a P-Code program, usually the compiler, over a list of input files.
+
+The program is loaded once, and the store reset between the runs by compile_server.CompileServer.
+Each run writes its PRR output to the .out file and its OUTPUT to the .lst file named after its input:
+`python -m reinterpreted.batch compiler/pcomp-adjusted.p2 examples/*.pas`
+
+With several jobs, the runs are shared by worker processes forked once the program is loaded,
+so that they start with the code and the store of the parent, shared until written.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from os.path import splitext
+from time import perf_counter
+
+from reinterpreted import compile_server
+from reinterpreted.compile_server import CompileServer
+from reinterpreted.flow import make_code
+from reinterpreted.pascal_interpreter import engines, store_types
+from reinterpreted.store import Store, TestStore
+
+
+worker_server = None  # The server of the parent, inherited by the forked workers
+
+
+def compile_file(server: CompileServer, input_filename) -> tuple[str, list[str], float]:
+    """Runs the program on an input file, writes the outputs, returns the file, its errors and the time taken.
+    A file that can't be read, decoded or written is an error of this file only."""
+    start = perf_counter()
+    try:
+        with open(input_filename, encoding='utf-8') as input_file:
+            result = server.compile(input_file.read())
+
+        base_filename, _ = splitext(input_filename)
+        with open(base_filename + ".out", "w") as prr:
+            prr.write(result.pcode)
+        with open(base_filename + ".lst", "w") as listing:
+            listing.write(result.listing)
+    except (OSError, UnicodeDecodeError) as error:
+        return input_filename, [f"{type(error).__name__}: {error}"], perf_counter() - start
+    return input_filename, result.errors, perf_counter() - start
+
+
+def compile_in_worker(input_filename) -> tuple[str, list[str], float]:
+    return compile_file(worker_server, input_filename)
+
+
+def compile_files(server: CompileServer, input_filenames, jobs):
+    """Yields the results of compile_file, in the order they are done"""
+    if jobs <= 1 or 'fork' not in multiprocessing.get_all_start_methods():
+        for input_filename in input_filenames:
+            yield compile_file(server, input_filename)
+        return
+
+    global worker_server
+    worker_server = server
+    gc.freeze()  # Keeps the collector from writing to the objects shared with the workers
+    try:
+        with multiprocessing.get_context('fork').Pool(jobs) as pool:
+            yield from pool.imap_unordered(compile_in_worker, input_filenames)
+    finally:
+        gc.unfreeze()
+        worker_server = None
+
+
+def run_batch(server: CompileServer, input_filenames, report=sys.stderr, jobs=1) -> int:
+    """Runs the program on each input file, returns the number of inputs with errors"""
+    start = perf_counter()
+    failures = 0
+    latencies = []
+    for input_filename, errors, latency in compile_files(server, input_filenames, jobs):
+        print(f"{input_filename}: {len(errors)} error(s), {latency * 1000:.1f} ms", file=report)
+        for error in errors:
+            print(f"    {error}", file=report)
+        failures += bool(errors)
+        latencies.append(latency)
+
+    elapsed = perf_counter() - start
+    if latencies:
+        print(f"{len(latencies)} files in {elapsed:.2f} s with {jobs} job(s): {len(latencies) / elapsed:.1f} files/s, "
+              f"latency {min(latencies) * 1000:.1f} / {sum(latencies) / len(latencies) * 1000:.1f} / "
+              f"{max(latencies) * 1000:.1f} ms (min / mean / max)", file=report)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a P-Code program on each of the input files")
+    parser.add_argument("prd_filename", help="P-Code file to run, usually the compiler")
+    parser.add_argument("input_filenames", nargs='+', metavar="INPUT",
+                        help="input file, the outputs go to the .out and .lst files with the same name")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: the number of processors)")
+    parser.add_argument("--engine", choices=list(engines.keys()) + ['tier2'], default='table',
+                        help="interpreter engine running the P-Code")
+    parser.add_argument("--store", choices=store_types.keys(), default='tuple',
+                        help="representation of the data store")
+    arguments = parser.parse_args()
+
+    server = CompileServer.from_file(arguments.prd_filename, arguments.engine, arguments.store)
+    sys.exit(1 if run_batch(server, arguments.input_filenames, jobs=arguments.jobs) else 0)
+
+
+class TestBatch(unittest.TestCase):
+    def run_batch_on_files(self, jobs, missing_files=0, latin1_files=0):
+        # The program writes the character it reads
+        server = CompileServer(make_code(compile_server.TestCompileServer.program),
+                               Store(TestStore.MockStoreConfiguration()))
+        with tempfile.TemporaryDirectory() as directory:
+            input_filenames = [os.path.join(directory, f"{name}.pas") for name in "ABCD"]
+            for input_filename, text in zip(input_filenames, "ABCD"):
+                with open(input_filename, "w") as input_file:
+                    input_file.write(text)
+            input_filenames[1:1] = [os.path.join(directory, f"missing{index}.pas") for index in range(missing_files)]
+            for index in range(latin1_files):
+                latin1_filename = os.path.join(directory, f"latin1_{index}.pas")
+                with open(latin1_filename, "wb") as input_file:
+                    input_file.write("é".encode('latin-1'))
+                input_filenames.insert(1, latin1_filename)
+
+            with open(os.devnull, "w") as report:
+                self.assertEqual(missing_files + latin1_files, run_batch(server, input_filenames, report, jobs))
+            for name in "ABCD":
+                with open(os.path.join(directory, f"{name}.lst")) as listing:
+                    self.assertEqual(f"{name}\n", listing.read())
+                self.assertTrue(os.path.exists(os.path.join(directory, f"{name}.out")))
+
+    def test_each_input_gets_its_outputs(self):
+        self.run_batch_on_files(jobs=1)
+
+    def test_workers_get_the_outputs_of_the_parent(self):
+        self.run_batch_on_files(jobs=2)
+
+    def test_unreadable_inputs_are_failures_of_their_own(self):
+        self.run_batch_on_files(jobs=1, missing_files=1, latin1_files=1)
+        self.run_batch_on_files(jobs=2, missing_files=2, latin1_files=2)
+
+
+if __name__ == '__main__':
+    main()
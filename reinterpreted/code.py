@@ -1,5 +1,122 @@
+import unittest
+from array import array
+
+INITIAL_CAPACITY = 256
+
+
 class Code:
     def __init__(self):
         self.op = 0
         self.p = 0
         self.q = 0
+
+
+class CodeCell:
+    """A view on one instruction of a CodeSegment, with the same attributes as Code"""
+    __slots__ = ('segment', 'address')
+
+    def __init__(self, segment, address):
+        self.segment = segment
+        self.address = address
+
+    @property
+    def op(self):
+        return self.segment.op[self.address]
+
+    @op.setter
+    def op(self, value):
+        self.segment.op[self.address] = value
+
+    @property
+    def p(self):
+        return self.segment.p[self.address]
+
+    @p.setter
+    def p(self, value):
+        self.segment.p[self.address] = value
+
+    @property
+    def q(self):
+        return self.segment.q[self.address]
+
+    @q.setter
+    def q(self, value):
+        self.segment.q[self.address] = value
+
+
+class CodeSegment:
+    """The code, as three typed arrays for op, p and q, indexed by address.
+
+    This is more compact than a list of Code, and the interpreter reads the arrays directly.
+    Indexing the segment gives a CodeCell, for the code that works on Code instances.
+    The size is the address following the highest instruction set.
+    The arrays grow in place when an instruction is set after their end, so that the
+    references to them stay valid.
+    """
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.op = array('i', [0]) * capacity
+        self.p = array('i', [0]) * capacity
+        self.q = array('i', [0]) * capacity
+        self.size = 0
+
+    def reserve(self, address):
+        """Makes the arrays long enough to hold an instruction at address, doubling their length"""
+        capacity = len(self.op)
+        if address >= capacity:
+            extension = array('i', [0]) * (max(address + 1, 2 * capacity) - capacity)
+            for field in (self.op, self.p, self.q):
+                field.extend(extension)
+
+    def __len__(self):
+        return len(self.op)
+
+    def __getitem__(self, address) -> CodeCell:
+        if not 0 <= address < len(self.op):
+            raise IndexError("Code address out of range")
+        return CodeCell(self, address)
+
+    def set(self, address, op, p, q):
+        if address >= len(self.op):
+            self.reserve(address)
+        self.op[address] = op
+        self.p[address] = p
+        self.q[address] = q
+        if address >= self.size:
+            self.size = address + 1
+
+
+class TestCodeSegment(unittest.TestCase):
+    def test_code_segment_is_initialized_to_zero(self):
+        code = CodeSegment(10)
+        self.assertEqual(10, len(code))
+        self.assertEqual(0, code.size)
+        self.assertEqual((0, 0, 0), (code[9].op, code[9].p, code[9].q))
+
+    def test_an_instruction_can_be_set(self):
+        code = CodeSegment(10)
+        code.set(3, 12, 1, 200)
+        self.assertEqual(12, code.op[3])
+        self.assertEqual(1, code.p[3])
+        self.assertEqual(200, code.q[3])
+        self.assertEqual(4, code.size)
+
+    def test_an_instruction_can_be_modified_through_its_cell(self):
+        code = CodeSegment(10)
+        code[5].q = -1
+        code[5].op = 23
+        self.assertEqual(-1, code.q[5])
+        self.assertEqual(23, code[5].op)
+
+    def test_segment_grows_when_an_instruction_is_set_after_its_end(self):
+        code = CodeSegment(4)
+        op = code.op
+        code.set(2, 7, 1, 5)
+        code.set(6, 58, 0, 0)
+        self.assertEqual(8, len(code))
+        self.assertEqual(7, code.size)
+        self.assertEqual([7, 0, 0, 0, 58], list(op[2:7]))
+
+    def test_out_of_range_address_raises(self):
+        code = CodeSegment(10)
+        self.assertRaises(IndexError, code.__getitem__, 10)
@@ -0,0 +1,405 @@
+""" Generation of Python source code from basic blocks of P-Code.
+
+A basic block is translated into a function taking the same parameters as an instruction
+handler of the table interpreter, so that it can replace the handler of its first instruction.
+
+The P-Code evaluation stack is simulated while generating: the values pushed by the block are
+kept in Python locals and only written to the store when needed, that is before an instruction
+that isn't translated (it is run by its handler), and at the end of the block.
+The stack pointer is kept in a local too, and written back to the context at the same times.
+
+A loaded value is read from the store when it is pushed, as the interpreter does. As the store
+cell isn't written yet, all the pending loaded values are written to the stack before any write
+to the store, in case the write modifies the loaded cell.
+"""
+import unittest
+from math import trunc
+
+from reinterpreted.assembler import instructions, sptable
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import make_code
+from reinterpreted.int_context import Context
+from reinterpreted.interpreter import base, flush_files
+from reinterpreted.store import Store, TestStore
+from reinterpreted.table_interpreter import op_handlers, sp_handlers
+
+SETTERS = {'INT': 'set_int', 'REEL': 'set_real', 'BOOL': 'set_bool', 'SETT': 'set_set', 'ADR': 'set_address'}
+
+BINARY_OPERATIONS = {
+    17: ('BOOL', '{} == {}'), 18: ('BOOL', '{} != {}'), 19: ('BOOL', '{} >= {}'),
+    20: ('BOOL', '{} > {}'), 21: ('BOOL', '{} <= {}'), 22: ('BOOL', '{} < {}'),
+    28: ('INT', '{} + {}'), 29: ('REEL', '{} + {}'), 30: ('INT', '{} - {}'), 31: ('REEL', '{} - {}'),
+    43: ('BOOL', '{} and {}'), 44: ('BOOL', '{} or {}'),
+    45: ('SETT', '{} & ~{}'), 46: ('SETT', '{} & {}'), 47: ('SETT', '{} | {}'),
+    48: ('BOOL', '{0} >= 0 and bool({1} >> {0} & 1)'), 49: ('INT', '{} % {}'),
+    51: ('INT', '{} * {}'), 52: ('REEL', '{} * {}'), 53: ('INT', '{} // {}'), 54: ('REEL', '{} / {}'),
+}
+
+# Comparisons of sets (p = 4), other than EQU and NEQ
+SET_COMPARISONS = {
+    19: 'not {1} & ~{0}', 20: '{0} != {1} and not {1} & ~{0}',
+    21: 'not {0} & ~{1}', 22: '{0} != {1} and not {0} & ~{1}',
+}
+
+UNARY_OPERATIONS = {
+    32: ('SETT', '1 << {}'), 33: ('REEL', '{}'), 35: ('INT', 'int(trunc({}))'),
+    36: ('INT', '-{}'), 37: ('REEL', '-{}'), 38: ('INT', '{0} * {0}'), 39: ('REEL', '{0} * {0}'),
+    40: ('INT', 'abs({})'), 41: ('REEL', 'abs({})'), 42: ('BOOL', 'not {}'), 50: ('BOOL', '({} % 2) > 0'),
+}
+
+COMPARISONS = range(17, 23)
+
+
+class StackEntry:
+    """A value pushed by the block and not written to the store yet.
+
+    A 'value' entry is the result of an expression whose type is known.
+    A 'load' entry is a copy of the store cell at the given address, whose type is unknown.
+    A 'stored' entry is already written at its place in the stack.
+    """
+    __slots__ = ('kind', 'type', 'value', 'address')
+
+    def __init__(self, kind, type_name, value, address=None):
+        self.kind = kind
+        self.type = type_name
+        self.value = value
+        self.address = address
+
+
+class BlockCompiler:
+    """Generates the source of the functions running basic blocks.
+
+    The generated code needs the names of namespace() to run.
+    How the control is transferred at the end of a block is defined by the emit_* methods
+    and compile_call, which can be specialized, as well as the parameters of the functions.
+    """
+    parameters = "p, q, context"
+
+    def __init__(self, code: CodeSegment):
+        self.code = code
+        self.lines = []
+        self.indent = 1
+        self.stack = []
+        self.offset = 0
+        self.variables = 0
+
+    def namespace(self, handlers) -> dict:
+        return {'base': base, 'flush_files': flush_files, 'trunc': trunc, 'handlers': handlers,
+                'sp_handlers': sp_handlers}
+
+    # Generation helpers
+
+    def emit(self, line):
+        self.lines.append("    " * self.indent + line)
+
+    def new_variable(self, prefix) -> str:
+        self.variables += 1
+        return f"{prefix}{self.variables}"
+
+    @staticmethod
+    def relative(name, offset) -> str:
+        if offset == 0:
+            return name
+        return f"{name} + {offset}" if offset > 0 else f"{name} - {-offset}"
+
+    def slot(self, offset=0) -> str:
+        return self.relative('sp', self.offset + offset)
+
+    @staticmethod
+    def frame_address(p, q) -> str:
+        return f"mp + {q}" if p == 0 else f"base(context, {p}) + {q}"
+
+    # Simulated stack
+
+    def grow(self):
+        self.offset += 1
+        self.emit(f"if {self.slot()} > np:")
+        self.emit("    raise RuntimeError(\"Store Overflow\")")
+
+    def push_value(self, type_name, expression, simple=False):
+        if not simple:
+            variable = self.new_variable('v')
+            self.emit(f"{variable} = {expression}")
+            expression = variable
+        self.grow()
+        self.stack.append(StackEntry('value', type_name, expression))
+
+    def push_load(self, address, check=True):
+        address_variable = self.new_variable('a')
+        value_variable = self.new_variable('v')
+        self.emit(f"{address_variable} = {address}")
+        if check:
+            self.emit(f"if store.is_undefined({address_variable}):")
+            self.emit("    raise RuntimeError(\"Value Undefined\")")
+        self.emit(f"{value_variable} = store.get_value({address_variable})")
+        self.grow()
+        self.stack.append(StackEntry('load', None, value_variable, address_variable))
+
+    def pop_entry(self) -> tuple[StackEntry | None, str]:
+        """Pops the top of the stack, returns its entry (None if it is in the store) and its slot"""
+        slot = self.slot()
+        self.offset -= 1
+        return (self.stack.pop() if self.stack else None), slot
+
+    def pop(self) -> str:
+        """Pops the top of the stack, returns the expression of its value"""
+        entry, slot = self.pop_entry()
+        if entry is not None:
+            return entry.value
+        variable = self.new_variable('v')
+        self.emit(f"{variable} = store.get_value({slot})")
+        return variable
+
+    def write_entry(self, destination, entry: StackEntry | None, slot):
+        """Writes an entry popped from slot to the destination address"""
+        if entry is None or (entry.kind == 'stored' and entry.type is None):
+            self.emit(f"store.copy({destination}, {slot})")
+        elif entry.kind == 'load':
+            self.emit(f"store.copy({destination}, {entry.address})")
+        else:
+            self.emit(f"store.{SETTERS[entry.type]}({destination}, {entry.value})")
+
+    def write_loads(self):
+        """Writes the pending loaded values to the stack, before the store gets modified"""
+        top = len(self.stack) - 1
+        for index, entry in enumerate(self.stack):
+            if entry.kind == 'load':
+                self.emit(f"store.copy({self.slot(index - top)}, {entry.address})")
+                entry.kind = 'stored'
+
+    def flush(self):
+        """Writes all the pending values to the stack"""
+        top = len(self.stack) - 1
+        for index, entry in enumerate(self.stack):
+            if entry.kind != 'stored':
+                self.write_entry(self.slot(index - top), entry, None)
+        self.stack = []
+
+    def store_to(self, destination):
+        entry, slot = self.pop_entry()
+        self.write_loads()
+        self.write_entry(destination, entry, slot)
+
+    def synchronize(self):
+        """Writes the stack and the stack pointer back to the context"""
+        self.flush()
+        self.emit(f"context.sp = {self.slot()}")
+
+    # Control transfers, at the end of the blocks
+
+    def emit_jump(self, target):
+        self.emit(f"context.pc = {target}")
+
+    def emit_branch(self, condition, next_pc, target):
+        self.emit(f"context.pc = {next_pc} if {condition} else {target}")
+
+    def emit_indexed_jump(self, address):
+        self.emit(f"context.pc = {address}")
+
+    def compile_call(self, p, q, return_address) -> bool:
+        """Generates a CUP, returns True if it ends the block"""
+        self.emit(f"mp = context.sp - {p + 3}")
+        self.emit("context.mp = mp")
+        self.emit(f"store[mp + 3] = ('MARK', {return_address})")
+        self.emit_jump(q)
+        return True
+
+    def emit_return(self, p):
+        self.emit(f"context.sp = {'mp - 1' if p == 0 else 'mp'}")
+        self.emit("context.pc = store.get_value(mp + 3)")
+        self.emit("context.mp = store.get_value(mp + 2)")
+
+    def emit_stop(self, next_pc):
+        self.emit("context.running = False")
+        self.emit("flush_files(context)")
+        self.emit_jump(next_pc)
+
+    # Instructions
+
+    def compile_instruction(self, pc, op, p, q):
+        """Generates the code of one instruction, returns True if it ends the block"""
+        if op in (0, 1, 8):  # LOD, LDO, LCI
+            self.push_load(self.frame_address(p, q) if op == 0 else str(q), check=op != 8)
+        elif op in (2, 3):  # STR, SRO
+            self.store_to(self.frame_address(p, q) if op == 2 else str(q))
+        elif op == 4:  # LDA
+            self.push_value('ADR', self.frame_address(p, q))
+        elif op in (5, 56):  # LAO, LCA
+            self.push_value('ADR', str(q), simple=True)
+        elif op == 6:  # STO
+            entry, slot = self.pop_entry()
+            address = self.pop()
+            self.write_loads()
+            self.write_entry(address, entry, slot)
+        elif op == 7:  # LDC
+            if p == 1:
+                self.push_value('INT', str(q), simple=True)
+            elif p == 3:
+                self.push_value('BOOL', str(q == 1), simple=True)
+            else:
+                self.push_value('ADR', "store.highest_address")
+        elif op == 9:  # IND
+            address = self.pop()
+            self.push_load(self.relative(address, q))
+        elif op == 10 and self.stack and self.stack[-1].type is not None:  # INC
+            type_name = self.stack[-1].type
+            self.push_value(type_name, f"{self.pop()} + {q}")
+        elif op == 16:  # IXA
+            index = self.pop()
+            address = self.pop()
+            self.push_value('ADR', f"{q} * {index} + {address}")
+        elif op in SET_COMPARISONS and p == 4:
+            right = self.pop()
+            left = self.pop()
+            self.push_value('BOOL', SET_COMPARISONS[op].format(left, right))
+        elif op in BINARY_OPERATIONS and not (op in COMPARISONS and p == 5):
+            right = self.pop()
+            left = self.pop()
+            type_name, operation = BINARY_OPERATIONS[op]
+            self.push_value(type_name, operation.format(left, right))
+        elif op in UNARY_OPERATIONS:
+            type_name, operation = UNARY_OPERATIONS[op]
+            self.push_value(type_name, operation.format(self.pop()))
+        elif op == 57:  # DEC
+            self.push_value('INT', f"{self.pop()} - {q}")
+        elif op == 26:  # CHK
+            if self.stack:
+                value = self.stack[-1].value
+            else:
+                value = self.new_variable('v')
+                self.emit(f"{value} = store.get_value({self.slot()})")
+            self.emit(f"if {value} < store.get_value({q - 1}) or {value} > store.get_value({q}):")
+            self.emit("    raise RuntimeError(\"Value out of range\")")
+        elif op == 23:  # UJP
+            self.synchronize()
+            self.emit_jump(q)
+            return True
+        elif op == 24:  # FJP
+            condition = self.pop()
+            self.synchronize()
+            self.emit_branch(condition, pc + 1, q)
+            return True
+        elif op == 25:  # XJP
+            value = self.pop()
+            self.synchronize()
+            self.emit_indexed_jump(self.relative(value, q))
+            return True
+        elif op == 12:  # CUP
+            self.synchronize()
+            return self.compile_call(p, q, pc + 1)
+        elif op == 14:  # RET
+            self.flush()
+            self.emit_return(p)
+            return True
+        elif op == 58:  # STP
+            self.synchronize()
+            self.emit_stop(pc + 1)
+            return True
+        else:
+            self.compile_handler_call(op, p, q)
+        return False
+
+    def compile_handler_call(self, op, p, q):
+        """Runs an instruction that isn't translated with its handler"""
+        self.synchronize()
+        if op == 15:  # CSP
+            self.emit(f"sp_handlers[{q}](context)")
+        else:
+            self.emit(f"handlers[{op}]({p}, {q}, context)")
+        self.emit("sp = context.sp")
+        self.emit("np = context.np")
+        self.offset = 0
+
+    def compile_block(self, begin, end) -> str:
+        """Returns the source of the function block_<begin> running the instructions from begin to end excluded"""
+        self.lines = []
+        self.indent = 1
+        self.stack = []
+        self.offset = 0
+        self.variables = 0
+
+        ops, ps, qs = self.code.op, self.code.p, self.code.q
+        ended = False
+        for pc in range(begin, end):
+            op, p, q = ops[pc], ps[pc], qs[pc]
+            name = sptable[q] if op == 15 else ''
+            self.emit(f"# {pc}: {instructions[op]} {p} {q} {name}".rstrip())
+            ended = self.compile_instruction(pc, op, p, q)
+        if not ended:
+            self.synchronize()
+            self.emit_jump(end)
+
+        header = [f"def block_{begin}({self.parameters}):",
+                  "    store = context.store",
+                  "    sp = context.sp",
+                  "    mp = context.mp",
+                  "    np = context.np"]
+        return "\n".join(header + self.lines) + "\n"
+
+
+def compile_blocks(code: CodeSegment, blocks, handlers, namespace=None, compiler_class=BlockCompiler) -> dict:
+    """Compiles the blocks given as (begin, end) ranges, returns their functions indexed by begin"""
+    compiler = compiler_class(code)
+    source = "\n\n".join(compiler.compile_block(begin, end) for begin, end in blocks)
+    globals_namespace = compiler.namespace(handlers)
+    globals_namespace.update(namespace or {})
+    exec(compile(source, f"<blocks {blocks[0][0]}>", "exec"), globals_namespace)
+    return {begin: globals_namespace[f"block_{begin}"] for begin, _ in blocks}
+
+
+class TestCodegen(unittest.TestCase):
+    def run_block(self, instructions, store=None):
+        code = make_code(instructions)
+        store = store or Store(TestStore.MockStoreConfiguration())
+        context = Context(None, None, None, None, store)
+        functions = compile_blocks(code, [(0, code.size)], op_handlers)
+        functions[0](0, 0, context)
+        return context
+
+    def test_values_are_written_to_the_stack_at_the_end_of_the_block(self):
+        context = self.run_block([(7, 1, 6), (7, 1, 4), (28, 0, 0), (7, 3, 1)])
+
+        self.assertEqual(4, context.pc)
+        self.assertEqual(1, context.sp)
+        self.assertEqual(('INT', 10), context.store[0])
+        self.assertEqual(('BOOL', True), context.store[1])
+
+    def test_a_loaded_value_is_read_before_its_cell_is_modified(self):
+        store = Store(TestStore.MockStoreConfiguration())
+        store[10] = ('INT', 1)
+        # LDO 10 / LDCI 2 / SRO 10 / SRO 11
+        context = self.run_block([(1, 0, 10), (7, 1, 2), (3, 0, 10), (3, 0, 11)], store)
+
+        self.assertEqual(-1, context.sp)
+        self.assertEqual(('INT', 2), store[10])
+        self.assertEqual(('INT', 1), store[11])
+
+    def test_undefined_value_raises(self):
+        self.assertRaises(RuntimeError, self.run_block, [(1, 0, 10)])
+
+    def test_untranslated_instruction_runs_its_handler(self):
+        store = Store(TestStore.MockStoreConfiguration())
+        store[20] = ('INT', 5)
+        store[21] = ('INT', 6)
+        # LAO 10 / LAO 20 / MOV 2 / LDO 11
+        context = self.run_block([(5, 0, 10), (5, 0, 20), (55, 0, 2), (1, 0, 11)], store)
+
+        self.assertEqual(0, context.sp)
+        self.assertEqual(('INT', 5), store[10])
+        self.assertEqual(('INT', 6), store[0])
+
+    def test_set_operations_are_bit_operations(self):
+        # {3} + {5} / {3} <= {3, 5} / 5 in {3, 5} / {3, 5} - {3}
+        three_five = [(7, 1, 3), (32, 0, 0), (7, 1, 5), (32, 0, 0), (47, 0, 0)]
+        context = self.run_block(three_five + [(7, 1, 3), (32, 0, 0)] + three_five + [(21, 4, 0)] +
+                                 [(7, 1, 5)] + three_five + [(48, 0, 0)] +
+                                 three_five + [(7, 1, 3), (32, 0, 0), (45, 0, 0)])
+
+        self.assertEqual([('SETT', 0b101000), ('BOOL', True), ('BOOL', True), ('SETT', 0b100000)],
+                         context.store.get_cells(0, 4))
+
+    def test_false_jump_ends_the_block(self):
+        context = self.run_block([(7, 3, 0), (24, 0, 7)])
+
+        self.assertEqual(7, context.pc)
+        self.assertEqual(-1, context.sp)
@@ -0,0 +1,194 @@
+""" Compile server, running a P-Code program on many inputs without loading it each time.
+
+The program, usually the compiler, is loaded once. Each request gives the text of the INPUT file,
+the source to compile, and gets back what the run wrote to PRR (the P-Code) and to OUTPUT
+(the listing), with the errors found: the `****` lines of the listing and the error stopping the run.
+Before each run, the ranges of the store written by the previous one are restored to their state
+after the loading, so that a run can't see what the previous ones left (see Store.snapshot).
+
+The requests and the responses are JSON objects, one per line, on stdin and stdout, or on the
+connections to a Unix socket:
+`{"id": 1, "source": "PROGRAM P(OUTPUT); ..."}` gives `{"id": 1, "pcode": ..., "listing": ..., "errors": [...]}`.
+`python -m reinterpreted.compile_server compiler/pcomp-adjusted.p2 --socket /tmp/pcomp.socket`
+"""
+import argparse
+import io
+import json
+import os
+import signal
+import socketserver
+import sys
+import unittest
+
+from reinterpreted import image_cache, interpreter, tiered
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import make_code
+from reinterpreted.int_context import Context
+from reinterpreted.pascal_interpreter import engines, store_types
+from reinterpreted.store import Store, TestStore
+from translation import streams
+
+ERROR_MARK = "****"
+
+
+class CompileResult:
+    def __init__(self, pcode, listing, errors):
+        self.pcode = pcode
+        self.listing = listing
+        self.errors = errors
+
+    def to_json(self) -> dict:
+        return {'pcode': self.pcode, 'listing': self.listing, 'errors': self.errors}
+
+
+class CompileServer:
+    def __init__(self, code: CodeSegment, store, prd_text="", engine='table'):
+        self.code = code
+        self.store = store
+        self.prd_text = prd_text  # What follows the code in the P-Code file, read by the program as PRD
+        self.snapshot = store.snapshot()
+        if engine == 'tier2':
+            # The procedures compiled by a run stay compiled for the next ones
+            self.run_engine = tiered.TieredEngine(code).run
+        else:
+            self.run_engine = lambda context: engines[engine](context, code)
+
+    @classmethod
+    def from_file(cls, prd_filename, engine='table', store_type='tuple'):
+        store_class = store_types[store_type]
+        configuration = store_class.configuration_class()
+        store = store_class(configuration)
+        code = CodeSegment()
+        with open(prd_filename) as prd:
+            image_cache.load(prd, store, code, configuration)
+            prd_text = prd.read()
+        return cls(code, store, prd_text, engine)
+
+    def reset(self):
+        """Restores the store as it was after the loading"""
+        self.store.restore(self.snapshot, self.store.dirty_ranges(self.snapshot))
+
+    def compile(self, source) -> CompileResult:
+        self.reset()
+        output, prr = io.StringIO(), io.StringIO()
+        # The line ends of the source are translated, as they are for the files read by pascal_interpreter
+        source_stream = io.StringIO(source, newline=None)
+        context = Context(streams.MemoryInputStream(4, source_stream), streams.OutputStream(5, output),
+                          io.StringIO(self.prd_text), streams.OutputStream(7, prr), self.store)
+        interpreter.initialize_files(context)
+
+        errors = []
+        try:
+            self.run_engine(context)
+        except Exception as error:
+            errors.append(f"{type(error).__name__} at {context.pc - 1}: {error}")
+        finally:
+            interpreter.flush_files(context)
+
+        listing = output.getvalue()
+        errors[:0] = [line.strip() for line in listing.splitlines() if line.lstrip().startswith(ERROR_MARK)]
+        return CompileResult(prr.getvalue(), listing, errors)
+
+    def respond(self, request_line) -> dict:
+        """Returns the response to a JSON request line"""
+        try:
+            request = json.loads(request_line)
+            source = request['source']
+            if not isinstance(source, str):
+                raise TypeError(f"source is a {type(source).__name__}, not a string")
+        except (ValueError, KeyError, TypeError) as error:
+            return {'id': None, 'pcode': "", 'listing': "", 'errors': [f"Invalid request: {error}"]}
+        return {'id': request.get('id'), **self.compile(source).to_json()}
+
+    def serve_lines(self, requests, responses):
+        for line in requests:
+            if line.strip():
+                responses.write(json.dumps(self.respond(line)) + "\n")
+                responses.flush()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        requests = io.TextIOWrapper(self.rfile, encoding='utf-8')
+        responses = io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True)
+        self.server.compile_server.serve_lines(requests, responses)
+
+
+def serve_socket(compile_server: CompileServer, socket_path):
+    """Serves the connections one at a time, as they share the store"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    # Leaves through the finally clause, which removes the socket
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        server.compile_server = compile_server
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a P-Code program on the sources of JSON requests")
+    parser.add_argument("prd_filename", help="P-Code file to run, usually the compiler")
+    parser.add_argument("--socket", metavar="PATH", help="serve on a Unix socket instead of stdin and stdout")
+    parser.add_argument("--engine", choices=list(engines.keys()) + ['tier2'], default='table',
+                        help="interpreter engine running the P-Code")
+    parser.add_argument("--store", choices=store_types.keys(), default='tuple',
+                        help="representation of the data store")
+    arguments = parser.parse_args()
+
+    compile_server = CompileServer.from_file(arguments.prd_filename, arguments.engine, arguments.store)
+    if arguments.socket:
+        serve_socket(compile_server, arguments.socket)
+    else:
+        compile_server.serve_lines(sys.stdin, sys.stdout)
+
+
+class TestCompileServer(unittest.TestCase):
+    # LAO 20 / LAO INPUT / CSP RDC / LDO 20 / LDCI 1 / LAO OUTPUT / CSP WRC / LAO OUTPUT / CSP WLN
+    # / LAO PRR / CSP WLN / STP
+    program = [(5, 0, 20), (5, 0, 4), (15, 0, 13), (1, 0, 20), (7, 1, 1), (5, 0, 5), (15, 0, 10),
+               (5, 0, 5), (15, 0, 5), (5, 0, 7), (15, 0, 5), (58, 0, 0)]
+
+    def make_server(self, program) -> CompileServer:
+        return CompileServer(make_code(program), Store(TestStore.MockStoreConfiguration()))
+
+    def test_each_request_runs_on_its_own_input(self):
+        server = self.make_server(self.program)
+
+        self.assertEqual("A\n", server.compile("A").listing)
+        result = server.compile("B")
+        self.assertEqual("B\n", result.listing)
+        self.assertEqual("\n", result.pcode)
+        self.assertEqual([], result.errors)
+
+    def test_store_is_restored_before_each_request(self):
+        server = self.make_server(self.program)
+        server.compile("A")
+        self.assertEqual(('INT', 65), server.store[20])
+
+        server.reset()
+        self.assertEqual(('UNDEF', None), server.store[20])
+
+    def test_errors_are_reported(self):
+        # LDO 30, undefined / STP
+        server = self.make_server([(1, 0, 30), (58, 0, 0)])
+
+        self.assertIn("Value Undefined", server.compile("").errors[0])
+
+    def test_requests_and_responses_are_json_lines(self):
+        server = self.make_server(self.program)
+        responses = io.StringIO()
+        server.serve_lines(io.StringIO('{"id": 7, "source": "C"}\n\nnot json\n{"id": 1, "source": 5}\n'
+                                       '{"id": 8, "source": "C"}\n'), responses)
+
+        first, second, third, fourth = [json.loads(line) for line in responses.getvalue().splitlines()]
+        self.assertEqual({'id': 7, 'pcode': "\n", 'listing': "C\n", 'errors': []}, first)
+        self.assertIn("Invalid request", second['errors'][0])
+        self.assertIn("Invalid request", third['errors'][0])
+        self.assertEqual(first | {'id': 8}, fourth)
+
+
+if __name__ == '__main__':
+    main()
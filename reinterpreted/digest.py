@@ -0,0 +1,283 @@
+""" Execution digests, to check that an engine runs a program as the reference interpreter does.
+
+Every interval instructions, the state of the run (pc, op, sp and the cell on top of the stack)
+is folded into a rolling hash, and the hash is kept as a checkpoint. Two runs of the same program
+with the same input execute the same instructions up to their first divergent checkpoint, so
+comparing the checkpoints gives the window of instructions where the engines diverge, without
+writing a trace of the whole run.
+
+The reference is the interpreter of translation/, run by `reference` on a P-Code file:
+`python -m reinterpreted.digest reference compiler/pcomp-adjusted.p2 reference.json < examples/hello.pas`
+The engines of pascal_interpreter write their digest with `--digest`, and `compare` reports the
+first divergent checkpoint: `python -m reinterpreted.digest compare reference.json fused.json`
+
+The engines stepping through the instructions have a digest: the classic and table engines, with
+their checked, unchecked and display handlers, and the superinstructions. A superinstruction that
+would run past a checkpoint is run as its first instruction, the following ones not being fused.
+The procedures compiled by the tier2 engine don't stop between their instructions.
+"""
+import argparse
+import hashlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from reinterpreted import interpreter, superinstructions, table_interpreter
+from reinterpreted.assembler import load
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import make_code
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, StoreConfiguration, TestStore
+
+DEFAULT_INTERVAL = 100_000  # Instructions between two checkpoints
+OPCODE_COUNT = 64
+
+
+def top_cell(cell) -> list:
+    """Returns the type and the value of a cell, in the same form for both interpreters:
+    the values of the undefined cells are ignored and the sets are bitmasks.
+    The empty set constants of translation/ hold None."""
+    if cell is None or cell[0] == 'UNDEF':
+        return ['UNDEF', None]
+    cell_type, value = cell
+    if isinstance(value, (set, frozenset)):
+        value = sum(1 << member for member in value if member is not None)
+    elif isinstance(value, bool):
+        value = int(value)
+    return [cell_type, value]
+
+
+class ExecutionDigest:
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.digest = ""
+        self.checkpoints = []
+
+    def add(self, count, context, op):
+        """Folds the state of the context, before it runs the instruction op, into the digest"""
+        sp = context.sp
+        state = {'pc': context.pc, 'op': op, 'sp': sp, 'top': top_cell(context.store[sp] if sp >= 0 else None)}
+        self.digest = hashlib.blake2b(f"{self.digest}{count}{state}".encode(), digest_size=8).hexdigest()
+        self.checkpoints.append({'instructions': count, 'digest': self.digest, 'state': state})
+
+    def to_json(self) -> dict:
+        return {'interval': self.interval, 'checkpoints': self.checkpoints}
+
+    def save(self, filename):
+        with open(filename, "w") as output:
+            json.dump(self.to_json(), output)
+
+    @classmethod
+    def load(cls, filename) -> 'ExecutionDigest':
+        with open(filename) as digest_file:
+            content = json.load(digest_file)
+        execution_digest = cls(content['interval'])
+        execution_digest.checkpoints = content['checkpoints']
+        return execution_digest
+
+
+def instruction_lengths(opcode_count) -> tuple[list[int], list[int]]:
+    """Returns, for each opcode, the opcode of its first plain instruction and its number of instructions,
+    which are not 1 for the superinstructions only"""
+    plain_ops = list(range(opcode_count))
+    lengths = [1] * opcode_count
+    for index, superinstruction in enumerate(superinstructions.superinstructions):
+        op = superinstructions.FIRST_OPCODE + index
+        if op < opcode_count:
+            plain_ops[op] = superinstruction.pattern[0][0]
+            lengths[op] = len(superinstruction.pattern)
+    return plain_ops, lengths
+
+
+def run(context, code: CodeSegment, handlers, interval=DEFAULT_INTERVAL) -> ExecutionDigest:
+    """Runs the code as table_interpreter.run does, with a checkpoint every interval instructions
+    and one at the end of the run"""
+    execution_digest = ExecutionDigest(interval)
+    plain_ops, lengths = instruction_lengths(len(handlers))
+    ops, ps, qs = code.op, code.p, code.q
+
+    count = 0
+    next_checkpoint = interval
+    while context.running:
+        pc = context.pc
+        op = ops[pc]
+        if count + lengths[op] > next_checkpoint:
+            if count == next_checkpoint:
+                execution_digest.add(count, context, plain_ops[op])
+                next_checkpoint += interval
+            if count + lengths[op] > next_checkpoint:
+                op = plain_ops[op]
+        context.pc = pc + 1
+        handlers[op](ps[pc], qs[pc], context)
+        count += lengths[op]
+
+    execution_digest.add(count, context, None)
+    return execution_digest
+
+
+def split_handlers(split_functions, stop_when_false=False) -> list:
+    """Returns a handlers table calling the ex0..ex3 functions of the interpreters with if chains.
+    The functions of translation/ return False to stop."""
+
+    def make_handler(op):
+        execute = split_functions[op // 16]
+        if stop_when_false:
+            def handler(p, q, context):
+                if not execute(op, p, q, context):
+                    context.running = False
+        else:
+            def handler(p, q, context):
+                execute(op, p, q, context)
+        return handler
+
+    return [make_handler(op) for op in range(OPCODE_COUNT)]
+
+
+def classic_handlers() -> list:
+    return split_handlers([interpreter.ex0, interpreter.ex1, interpreter.ex2, interpreter.ex3])
+
+
+def reference_interpreter():
+    """Imports the interpreter of translation/, which imports its modules as top level ones"""
+    folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "translation")
+    if folder not in sys.path:
+        sys.path.append(folder)
+    return importlib.import_module("pascal_interpreter")
+
+
+def run_reference(input_stream, output_stream, prd, prr, interval=DEFAULT_INTERVAL) -> ExecutionDigest:
+    """Loads and runs the P-Code file prd with the interpreter of translation/, as its main() does"""
+    reference = reference_interpreter()
+    store = [('UNDEF', None) for _ in range(reference.OVERM)]
+    reference.load(prd, store)
+    code = make_code([(instruction.op, instruction.p, instruction.q) for instruction in reference.code])
+
+    context = reference.Context(reference.InputStream(4, input_stream), output_stream, prd, prr, store)
+    context.running = True
+    # As reference.interpret() does
+    store[reference.INPUTADR] = ('INT', 0)
+    store[reference.PRDADR] = ('INT', 0)
+    store[reference.OUTPUTADR] = ('UNDEF', 0)
+    store[reference.PRRADR] = ('UNDEF', 0)
+
+    reference_functions = [reference.ex0, reference.ex1, reference.ex2, reference.ex3]
+    return run(context, code, split_handlers(reference_functions, stop_when_false=True), interval)
+
+
+def compare(first: ExecutionDigest, second: ExecutionDigest) -> str | None:
+    """Returns the description of the first divergent checkpoint, None if the runs are the same"""
+    if first.interval != second.interval:
+        return f"The digests have different intervals: {first.interval} and {second.interval}"
+
+    previous = 0
+    for first_checkpoint, second_checkpoint in zip(first.checkpoints, second.checkpoints):
+        if first_checkpoint != second_checkpoint:
+            return (f"First divergence between instructions {previous} and "
+                    f"{max(first_checkpoint['instructions'], second_checkpoint['instructions'])}:\n"
+                    f"  {first_checkpoint['instructions']}: {first_checkpoint['state']}\n"
+                    f"  {second_checkpoint['instructions']}: {second_checkpoint['state']}")
+        previous = first_checkpoint['instructions']
+
+    if len(first.checkpoints) != len(second.checkpoints):
+        return f"One of the runs stops after instruction {previous}"
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execution digests of the interpreters")
+    commands = parser.add_subparsers(dest='command', required=True)
+    reference_parser = commands.add_parser('reference', help="run a P-Code file with the interpreter of translation/,"
+                                                             " its PRR output goes to the .out file")
+    reference_parser.add_argument("prd_filename", help="P-Code file to run")
+    reference_parser.add_argument("digest_filename", help="JSON file where the digest is written")
+    reference_parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL,
+                                  help="number of instructions between two checkpoints")
+    compare_parser = commands.add_parser('compare', help="report the first divergent checkpoint of two digests")
+    compare_parser.add_argument("digest_filenames", nargs=2, metavar="DIGEST_FILE", help="JSON file of a digest")
+    arguments = parser.parse_args()
+
+    if arguments.command == 'reference':
+        base_filename, _ = os.path.splitext(arguments.prd_filename)
+        with open(arguments.prd_filename) as prd, open(base_filename + ".out", "w") as prr:
+            execution_digest = run_reference(sys.stdin, sys.stdout, prd, prr, arguments.interval)
+        execution_digest.save(arguments.digest_filename)
+    else:
+        divergence = compare(*(ExecutionDigest.load(filename) for filename in arguments.digest_filenames))
+        if divergence:
+            print(divergence)
+            sys.exit(1)
+        print("Same execution")
+
+
+class TestDigest(unittest.TestCase):
+    # The start code calls the procedure at 3, which stores 5 + 7 at 8 and 12 * 2 at 9
+    p_code = ("L   3\n ENT       L   4\n LDCI           5\n LDCI           7\n ADI\n SRO           8\n"
+              " LDO           8\n LDCI           2\n MPI\n SRO           9\n RETP\nL   4=        10\n\n"
+              " MST           0\n CUP   0   L   3\n STP\n\n")
+    program = [(11, 0, 0), (12, 0, 3), (58, 0, 0),
+               (13, 0, 10), (7, 1, 5), (7, 1, 7), (28, 0, 0), (3, 0, 8),
+               (1, 0, 8), (7, 1, 2), (51, 0, 0), (3, 0, 9), (14, 0, 0)]
+
+    def run_digest(self, code, handlers, interval, store=None) -> ExecutionDigest:
+        context = Context(None, io.StringIO(), None, None, store or Store(TestStore.MockStoreConfiguration()))
+        return run(context, code, handlers, interval)
+
+    def test_a_checkpoint_is_kept_every_interval(self):
+        execution_digest = self.run_digest(make_code(self.program), table_interpreter.op_handlers, 4)
+
+        self.assertEqual([4, 8, 12, 13], [checkpoint['instructions'] for checkpoint in execution_digest.checkpoints])
+        self.assertEqual({'pc': 9, 'op': 7, 'sp': 11, 'top': ['INT', 12]}, execution_digest.checkpoints[1]['state'])
+        self.assertEqual({'pc': 3, 'op': None, 'sp': -1, 'top': ['UNDEF', None]},
+                         execution_digest.checkpoints[-1]['state'])
+
+    def test_classic_and_table_handlers_run_the_same_way(self):
+        table_digest = self.run_digest(make_code(self.program), table_interpreter.op_handlers, 3)
+        classic_digest = self.run_digest(make_code(self.program), classic_handlers(), 3)
+
+        self.assertIsNone(compare(table_digest, classic_digest))
+
+    def test_superinstructions_stop_at_the_checkpoints(self):
+        table_digest = self.run_digest(make_code(self.program), table_interpreter.op_handlers, 3)
+        fused_code = make_code(self.program)
+        fusion = superinstructions.fuse(fused_code)
+
+        self.assertNotEqual(self.program, [(fused_code.op[pc], fused_code.p[pc], fused_code.q[pc])
+                                           for pc in range(len(self.program))])
+        self.assertIsNone(compare(table_digest, self.run_digest(fused_code, fusion.handlers, 3)))
+
+    def test_first_divergent_checkpoint_is_reported(self):
+        reference_digest = self.run_digest(make_code(self.program), table_interpreter.op_handlers, 4)
+        changed_program = list(self.program)
+        changed_program[5] = (7, 1, 8)  # LDCI 8 instead of LDCI 7
+        changed_digest = self.run_digest(make_code(changed_program), table_interpreter.op_handlers, 4)
+
+        divergence = compare(reference_digest, changed_digest)
+        self.assertTrue(divergence.startswith("First divergence between instructions 4 and 8:"))
+
+    def test_runs_of_different_lengths_diverge(self):
+        reference_digest = self.run_digest(make_code(self.program), table_interpreter.op_handlers, 4)
+        shorter_digest = ExecutionDigest(4)
+        shorter_digest.checkpoints = reference_digest.checkpoints[:2]
+
+        self.assertEqual("One of the runs stops after instruction 8", compare(reference_digest, shorter_digest))
+
+    def test_reference_interpreter_runs_the_same_way(self):
+        with tempfile.TemporaryFile("w+") as prd:
+            prd.write(self.p_code)
+            prd.seek(0)
+            reference_digest = run_reference(io.StringIO(), io.StringIO(), prd, io.StringIO(), 3)
+
+        store = Store(StoreConfiguration())
+        code = CodeSegment()
+        load(io.StringIO(self.p_code), store, code)
+        context = Context(None, io.StringIO(), None, None, store)
+        interpreter.initialize_files(context)
+        self.assertIsNone(compare(reference_digest, run(context, code, table_interpreter.op_handlers, 3)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+""" Control flow analysis of the assembled code. """
+import unittest
+
+from reinterpreted.code import CodeSegment
+
+UJP, FJP, XJP, CUP, ENT, RET, STP = 23, 24, 25, 12, 13, 14, 58
+
+# Instructions after which the execution doesn't go on with the next one
+BLOCK_ENDS = (UJP, FJP, XJP, CUP, RET, STP)
+
+
+def jump_targets(code: CodeSegment, return_addresses=True) -> set[int]:
+    """Returns the addresses where the execution can arrive other than from the previous instruction.
+
+    These are the targets of UJP, FJP and CUP, the entries of the XJP jump tables,
+    and the return addresses following each CUP (unless return_addresses is False).
+    """
+    targets = set()
+    ops, qs = code.op, code.q
+    for pc in range(code.size):
+        op = ops[pc]
+        if op in (UJP, FJP):
+            targets.add(qs[pc])
+        elif op == CUP:
+            targets.add(qs[pc])
+            if return_addresses:
+                targets.add(pc + 1)
+        elif op == XJP:
+            # The jump table is a sequence of UJP, each of them can be jumped to
+            entry = qs[pc]
+            while entry < code.size and ops[entry] == UJP:
+                targets.add(entry)
+                entry += 1
+    return targets
+
+
+def procedure_entries(code: CodeSegment) -> list[int]:
+    """Returns the addresses called by CUP, in increasing order"""
+    ops, qs = code.op, code.q
+    return sorted({qs[pc] for pc in range(code.size) if ops[pc] == CUP})
+
+
+def procedure_end(code: CodeSegment, entry) -> int | None:
+    """Returns the address of the RET ending the procedure starting at entry, None if not found.
+
+    The compiler writes each procedure as a single piece of code, from its ENT to its RET,
+    the nested procedures being written before.
+    """
+    ops = code.op
+    pc = entry
+    while pc < code.size:
+        if ops[pc] == RET:
+            return pc
+        if ops[pc] == ENT and pc != entry:
+            return None
+        pc += 1
+    return None
+
+
+def is_self_contained(code: CodeSegment, begin, end) -> bool:
+    """Checks that the jumps of the code from begin to end (included) stay inside it"""
+    ops, qs = code.op, code.q
+    for pc in range(begin, end + 1):
+        if ops[pc] in (UJP, FJP, XJP) and not begin <= qs[pc] <= end:
+            return False
+    return True
+
+
+def basic_blocks(code: CodeSegment, begin, end, targets: set[int], ends=BLOCK_ENDS) -> list[tuple[int, int]]:
+    """Splits the code from begin to end (included) into basic blocks, returned as (begin, end) ranges
+    with end excluded.
+
+    A block starts at begin, at a jump target, or after an instruction of ends.
+    """
+    ops = code.op
+    leaders = [begin]
+    for pc in range(begin + 1, end + 1):
+        if pc in targets or ops[pc - 1] in ends:
+            leaders.append(pc)
+    return list(zip(leaders, leaders[1:] + [end + 1]))
+
+
+def make_code(instructions) -> CodeSegment:
+    code = CodeSegment(len(instructions))
+    for address, (op, p, q) in enumerate(instructions):
+        code.set(address, op, p, q)
+    return code
+
+
+class TestFlow(unittest.TestCase):
+    def test_jump_and_call_targets(self):
+        code = make_code([(11, 0, 0), (12, 0, 5), (58, 0, 0), (23, 0, 6), (24, 0, 2), (14, 0, 0), (14, 0, 0)])
+
+        self.assertEqual({5, 2, 6}, jump_targets(code))
+
+    def test_jump_table_entries_are_targets(self):
+        code = make_code([(25, 0, 2), (58, 0, 0), (23, 0, 1), (23, 0, 1), (14, 0, 0)])
+
+        self.assertEqual({1, 2, 3}, jump_targets(code))
+
+    def test_procedure_ends_on_its_ret(self):
+        code = make_code([(11, 0, 0), (12, 0, 3), (58, 0, 0), (13, 0, 5), (0, 0, 5), (14, 0, 0)])
+
+        self.assertEqual([3], procedure_entries(code))
+        self.assertEqual(5, procedure_end(code, 3))
+
+    def test_basic_blocks_are_split_on_targets_and_jumps(self):
+        code = make_code([(13, 0, 5), (0, 0, 5), (24, 0, 4), (7, 1, 1), (7, 1, 2), (2, 0, 5), (14, 0, 0)])
+        targets = jump_targets(code)
+
+        self.assertEqual([(0, 3), (3, 4), (4, 7)], basic_blocks(code, 0, 6, targets))
+
+    def test_jumps_out_of_a_procedure_are_detected(self):
+        code = make_code([(13, 0, 5), (24, 0, 3), (23, 0, 0), (14, 0, 0)])
+
+        self.assertTrue(is_self_contained(code, 0, 3))
+        self.assertFalse(is_self_contained(code, 1, 2))
@@ -0,0 +1,221 @@
+""" Persistent cache of assembled P-Code images.
+
+Assembling the compiler P-Code takes longer than compiling a small source file.
+The assembled image (code, constant tables and labels) is saved in a `__pycache__`
+folder next to the P-Code file, one per store configuration. It is keyed by a hash of the
+P-Code file content and of the store configuration, so any change to one of them invalidates the image.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import unittest
+from array import array
+
+from reinterpreted.asm_labels import Labels
+from reinterpreted.assembler import load as assemble_load, MAX_LABELS
+from reinterpreted.code import CodeSegment
+from reinterpreted.store import Store, StoreConfiguration, TestStore
+
+# Change this value each time the content or the representation of the image changes
+IMAGE_FORMAT_VERSION = 5
+
+
+def configuration_key(configuration: StoreConfiguration) -> str:
+    names = sorted(name for name in dir(configuration) if not name.startswith('_'))
+    return repr([(name, getattr(configuration, name)) for name in names])
+
+
+def image_key(source: bytes, configuration: StoreConfiguration) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{IMAGE_FORMAT_VERSION}\n".encode())
+    digest.update(configuration_key(configuration).encode())
+    digest.update(source)
+    return digest.hexdigest()
+
+
+def cache_path(prd_filename, configuration: StoreConfiguration) -> str:
+    """Returns the path of the image, named after the configuration too, so that each layout of the store
+    keeps its own image"""
+    directory, filename = os.path.split(os.path.abspath(prd_filename))
+    layout = hashlib.sha256(configuration_key(configuration).encode()).hexdigest()[:8]
+    return os.path.join(directory, '__pycache__', f"{filename}.{layout}.img")
+
+
+def file_mode() -> int:
+    """Returns the mode of the files created with the current umask, as for the .pyc files"""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def save_image(path, key, code: CodeSegment, store: Store, labels: Labels, prd_position: int):
+    image = {
+        'key': key,
+        'code': [field[:code.size].tobytes() for field in (code.op, code.p, code.q)],
+        'constants': store.export_constants(),
+        'labels': labels.labels,
+        'prd_position': prd_position,
+    }
+
+    # Writes to a temporary file first, so a concurrent run never reads a partial image
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(image, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(temporary_path, file_mode())  # mkstemp creates the file readable by its owner only
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def load_image(path, key, store: Store, code: CodeSegment) -> tuple[Labels, int] | None:
+    """Fills store and code from the image at path, and returns the labels and the position
+    of the end of code in the P-Code file. Returns None if there's no valid image."""
+    try:
+        with open(path, 'rb') as f:
+            image = pickle.load(f)
+        if not isinstance(image, dict) or image.get('key') != key:
+            return None
+
+        fields = []
+        for data in image['code']:
+            field = array('i')
+            field.frombytes(data)
+            fields.append(field)
+        if len(fields) != 3 or len({len(field) for field in fields}) != 1:
+            return None
+        labels = Labels(MAX_LABELS)
+        labels.labels = image['labels']
+        prd_position = image['prd_position']
+
+        # Nothing is written to the store if the constants don't fit its tables
+        store.import_constants(image['constants'])
+    except Exception:
+        return None  # A damaged or foreign image is assembled again, as a missing one
+
+    code.reserve(len(fields[0]) - 1)
+    for segment_field, field in zip((code.op, code.p, code.q), fields):
+        segment_field[:len(field)] = field
+    code.size = len(fields[0])
+    return labels, prd_position
+
+
+def load(prd, store: Store, code: CodeSegment, configuration: StoreConfiguration) -> Labels:
+    """Loads the opened P-Code file in store and code, through the image cache of the file.
+
+    As with an assembled load, prd is left positioned after the assembled code.
+    """
+    source = prd.read().encode()
+    key = image_key(source, configuration)
+    path = cache_path(prd.name, configuration)
+
+    image = load_image(path, key, store, code)
+    if image is None:
+        prd.seek(0)
+        labels = assemble_load(prd, store, code)
+        try:
+            save_image(path, key, code, store, labels, prd.tell())
+        except OSError:
+            pass  # An image that can't be saved only means the next run will assemble again
+    else:
+        labels, prd_position = image
+        prd.seek(prd_position)
+
+    return labels
+
+
+class TestImageCache(unittest.TestCase):
+    source = "L   3\n ENT       L   4\n LDCI    9999999\n RETP\nL   4=         7\n\n MST           0\n CUP   0   L   3\n STP\n\n"
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.prd_filename = os.path.join(self.directory.name, 'test.p2')
+        with open(self.prd_filename, 'w') as prd:
+            prd.write(self.source)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load(self, configuration=TestStore.MockStoreConfiguration()):
+        store = Store(configuration)
+        code = CodeSegment(20)
+        with open(self.prd_filename) as prd:
+            labels = load(prd, store, code, configuration)
+            self.assertEqual('', prd.readline())  # Positioned after the code
+        return store, code, labels
+
+    def test_image_is_saved_after_first_load(self):
+        self.load()
+        self.assertTrue(os.path.exists(cache_path(self.prd_filename, TestStore.MockStoreConfiguration())))
+
+    def test_each_configuration_keeps_its_own_image(self):
+        class OtherConfiguration(TestStore.MockStoreConfiguration):
+            maximum_stack_size = 1000
+
+        self.load()
+        self.load(OtherConfiguration())
+        image_time = os.stat(cache_path(self.prd_filename, TestStore.MockStoreConfiguration())).st_mtime_ns
+        self.load()
+
+        self.assertNotEqual(cache_path(self.prd_filename, TestStore.MockStoreConfiguration()),
+                            cache_path(self.prd_filename, OtherConfiguration()))
+        self.assertTrue(os.path.exists(cache_path(self.prd_filename, OtherConfiguration())))
+        self.assertEqual(image_time,
+                         os.stat(cache_path(self.prd_filename, TestStore.MockStoreConfiguration())).st_mtime_ns)
+
+    def test_image_permissions_follow_the_umask(self):
+        umask = os.umask(0o022)
+        try:
+            self.load()
+        finally:
+            os.umask(umask)
+        self.assertEqual(0o644, os.stat(cache_path(self.prd_filename, TestStore.MockStoreConfiguration())).st_mode & 0o777)
+
+    def test_cached_image_is_identical_to_assembled_one(self):
+        store, code, labels = self.load()
+        cached_store, cached_code, cached_labels = self.load()
+
+        self.assertEqual(code.op, cached_code.op)
+        self.assertEqual(code.p, cached_code.p)
+        self.assertEqual(code.q, cached_code.q)
+        self.assertEqual(code.size, cached_code.size)
+        self.assertEqual(store.export_constants(), cached_store.export_constants())
+        self.assertEqual(labels.labels, cached_labels.labels)
+
+    def test_image_key_changes_with_source_and_configuration(self):
+        configuration = TestStore.MockStoreConfiguration()
+        key = image_key(self.source.encode(), configuration)
+
+        class OtherConfiguration(TestStore.MockStoreConfiguration):
+            integer_const_table_size = 4
+
+        self.assertNotEqual(key, image_key(self.source.encode() + b'\n', configuration))
+        self.assertNotEqual(key, image_key(self.source.encode(), OtherConfiguration()))
+
+    def test_damaged_images_are_assembled_again(self):
+        store, code, labels = self.load()
+        key = image_key(self.source.encode(), TestStore.MockStoreConfiguration())
+        damaged_images = [b'\x80\x05N.', b'garbage', pickle.dumps({'key': key}),
+                          pickle.dumps({'key': key, 'code': [b'', b'', b''], 'labels': [], 'prd_position': 0,
+                                        'constants': [(0, 1000, [])]})]
+
+        for damaged_image in damaged_images:
+            with open(cache_path(self.prd_filename, TestStore.MockStoreConfiguration()), 'wb') as image:
+                image.write(damaged_image)
+            loaded_store, loaded_code, loaded_labels = self.load()
+
+            self.assertEqual(code.op, loaded_code.op)
+            self.assertEqual(store.export_constants(), loaded_store.export_constants())
+            self.assertEqual(labels.labels, loaded_labels.labels)
+
+    def test_stale_image_is_replaced(self):
+        self.load()
+        with open(self.prd_filename, 'w') as prd:
+            prd.write(self.source.replace('9999999', '8888888'))
+
+        store, _, _ = self.load()
+        self.assertEqual(8888888, store.get_value(store.pointers.int_ranged_ptr.begin))
@@ -21,12 +21,60 @@ class Context:
             raise RuntimeError("Store Overflow")
         self.store[self.sp] = value
 
+    def push_copy(self, address):
+        self.sp += 1
+        if self.sp > self.np:
+            raise RuntimeError("Store Overflow")
+        self.store.copy(self.sp, address)
+
     def pop(self) -> (str, any):
         value = self.store[self.sp]
         self.sp -= 1
         return value
 
 
+class DisplayContext(Context):
+    """A Context keeping a display of the frames reachable through the static links.
+
+    display[depth] is the base address of the last frame entered at each nesting depth, the main
+    program being at depth 0, so that the frame `level` static links away from the current one,
+    the result of interpreter.base(context, level), is display[depth - level]. A call replaces the
+    entry of the called procedure only, which RET puts back, instead of building a new display.
+    The static link level given by MST is kept until the CUP that makes the call, as other calls can
+    happen in between, while evaluating the parameters. MST, CUP and RET being nested, the same stack
+    holds the level until the CUP, then the depth of the caller and the display entry replaced.
+    The table handlers inline mark(), call() and ret().
+    """
+
+    def __init__(self, input_stream, output_stream, input_file, output_file, store):
+        super().__init__(input_stream, output_stream, input_file, output_file, store)
+        self.display = [self.mp]
+        self.depth = 0
+        self.calls = []  # Level given by each MST waiting for its CUP, (depth, frame) replaced by each call
+
+    def mark(self, level):
+        self.calls.append(level)
+
+    def call(self):
+        """Called once mp is set to the frame of the called procedure"""
+        display = self.display
+        depth = self.depth - self.calls[-1] + 1
+        if depth == len(display):
+            display.append(self.mp)
+        self.calls[-1] = (self.depth, display[depth])
+        display[depth] = self.mp
+        self.depth = depth
+
+    def ret(self):
+        depth, frame = self.calls.pop()
+        self.display[self.depth] = frame
+        self.depth = depth
+
+    def frames(self) -> list[int]:
+        """Returns the frames reachable from the current one, by level"""
+        return [self.display[self.depth - level] for level in range(self.depth + 1)]
+
+
 class TestContext(unittest.TestCase):
     def test_can_push_value_to_context(self):
         store = Store(TestStore.MockStoreConfiguration())
@@ -48,3 +96,55 @@ class TestContext(unittest.TestCase):
         self.assertEqual(typed_value_1, context.pop())
         self.assertEqual(typed_value_2, context.pop())
         self.assertEqual(typed_value_1, context.pop())
+
+    def test_can_push_a_copy_of_a_store_value(self):
+        store = Store(TestStore.MockStoreConfiguration())
+        context = Context(None, None, None, None, store)
+        store[50] = 'INT', 123
+        context.push_copy(50)
+
+        self.assertEqual(0, context.sp)
+        self.assertEqual(('INT', 123), store[0])
+
+
+class TestDisplayContext(unittest.TestCase):
+    def setUp(self):
+        self.context = DisplayContext(None, None, None, None, Store(TestStore.MockStoreConfiguration()))
+
+    def enter(self, level, mp):
+        self.context.mark(level)
+        self.context.mp = mp
+        self.context.call()
+
+    def test_called_procedure_display_starts_with_its_frame(self):
+        self.enter(0, 10)  # A procedure declared in the main program
+
+        self.assertEqual([10, 0], self.context.frames())
+
+    def test_recursion_keeps_the_same_static_link(self):
+        self.enter(0, 10)
+        self.enter(1, 20)  # The procedure calls itself
+        self.enter(1, 30)
+
+        self.assertEqual([30, 0], self.context.frames())
+        self.context.ret()
+        self.assertEqual([20, 0], self.context.frames())
+
+    def test_nested_procedure_reaches_the_frames_of_its_parents(self):
+        self.enter(0, 10)
+        self.enter(0, 20)  # Declared in the procedure at 10
+        self.enter(0, 30)  # Declared in the procedure at 20
+        self.enter(2, 40)  # Declared in the procedure at 10, called from the one at 30
+
+        self.assertEqual([40, 10, 0], self.context.frames())
+        self.context.ret()
+        self.assertEqual([30, 20, 10, 0], self.context.frames())
+
+    def test_calls_in_parameters_use_their_own_level(self):
+        self.context.mark(0)  # MST of a call whose parameters call another procedure
+        self.enter(0, 10)
+        self.context.ret()
+        self.context.mp = 20
+        self.context.call()
+
+        self.assertEqual([20, 0], self.context.frames())
@@ -1,6 +1,7 @@
 import io
 from math import sin, cos, exp, log, sqrt, atan, trunc
 
+from reinterpreted.code import CodeSegment
 from reinterpreted.int_context import Context
 from translation import streams
 
@@ -18,7 +19,7 @@ def base(context, ld):
     return ad
 
 
-def get_stream(context, stream_id) -> streams.InputStream | io.IOBase:
+def get_stream(context, stream_id) -> streams.InputStream | streams.OutputStream | io.IOBase:
     return context.files[stream_id - INPUTADR]
 
 
@@ -28,7 +29,7 @@ def file_get(context):
         raise RuntimeError("Get on Output. Error")
 
     value = get_stream(context, file_id).read()
-    context.store[file_id] = ('INT', value)
+    context.store.set_int(file_id, value)
 
 
 def file_put(context):
@@ -46,20 +47,20 @@ def read_line(context):
     stream = get_stream(context, file_id)
     stream.read_line()
     value = stream.read()
-    context.store[INPUTADR] = ('INT', value)
+    context.store.set_int(INPUTADR, value)
 
 
 def write_line(context):
     _, file_id = context.pop()
     stream = get_stream(context, file_id)
-    stream.writelines(["\n"])
+    stream.write("\n")
 
 
 def eoln(context):
     file_id = context.store.get_value(context.sp)
     stream = get_stream(context, file_id)
     result = stream.eol()
-    context.store[context.sp] = ('BOOL', result)
+    context.store.set_bool(context.sp, result)
 
 
 def write_string(context: Context):
@@ -74,14 +75,12 @@ def write_string(context: Context):
     # If not inverted, this makes no sense. Or is it because another bug?
 
     if k > j:
-        for i in range(k - j):
-            stream.write(' ')
+        padding = ' ' * (k - j)
     else:
+        padding = ''
         j = k
 
-    for i in range(j):
-        v = context.store.get_value(address + i)
-        stream.write(chr(v))
+    stream.write(padding + ''.join([chr(v) for _, v in context.store.get_cells(address, address + j)]))
 
     context.sp -= 4
 
@@ -119,7 +118,7 @@ def read_byte(context, q):
 def file_eof(context):
     file_id = context.store.get_value(context.sp)
     stream = get_stream(context, file_id)
-    context.store[context.sp] = ('BOOL', stream.eof())
+    context.store.set_bool(context.sp, stream.eof())
 
 
 def call_sp(q, context: Context):
@@ -137,11 +136,10 @@ def call_sp(q, context: Context):
         ad = context.np - adr
         if ad <= context.sp:
             raise RuntimeError("Store Overflow")
-        for i in range(context.np - 1, ad, -1):
-            context.store[i] = ('UNDEF', 0)
+        context.store.fill_range(ad + 1, context.np, ('UNDEF', 0))
         context.np = ad
         ad = context.store.get_value(context.sp - 1)
-        context.store[ad] = ('ADR', context.np)
+        context.store.set_address(ad, context.np)
         context.sp -= 2
     elif q == 5:  # (*WLN*)
         write_line(context)
@@ -155,52 +153,52 @@ def call_sp(q, context: Context):
         read_byte(context, q)
     elif q == 14:  # (*SIN*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', sin(v))
+        context.store.set_real(context.sp, sin(v))
     elif q == 15:  # (*COS*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', cos(v))
+        context.store.set_real(context.sp, cos(v))
     elif q == 16:  # (*EXP*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', exp(v))
+        context.store.set_real(context.sp, exp(v))
     elif q == 17:  # (*LOG*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', log(v))
+        context.store.set_real(context.sp, log(v))
     elif q == 18:  # (*SQT*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', sqrt(v))
+        context.store.set_real(context.sp, sqrt(v))
     elif q == 19:  # (*ATN*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', atan(v))
+        context.store.set_real(context.sp, atan(v))
     elif q == 20:  # (*SAV*)
         t, addr = context.pop()
         assert (t == 'ADR')
-        context.store[addr] = ('ADR', context.np)
+        context.store.set_address(addr, context.np)
 
 
 def ex0(op, p, q, context):
     if op == 0:  # (*LOD*)
         ad = base(context, p) + q
-        t, v = context.store[ad]
-        if t == 'UNDEF':
+        if context.store.is_undefined(ad):
             raise RuntimeError("Value Undefined")
-        context.push((t, v))
+        context.push_copy(ad)
     elif op == 1:  # (*LDO*)
-        t, v = context.store[q]
-        if t == 'UNDEF':
+        if context.store.is_undefined(q):
             raise RuntimeError("Value Undefined")
-        context.push((t, v))
+        context.push_copy(q)
     elif op == 2:  # (*STR*)
-        context.store[base(context, p) + q] = context.pop()
+        context.store.copy(base(context, p) + q, context.sp)
+        context.sp -= 1
     elif op == 3:  # (*SRO*)
-        context.store[q] = context.pop()
+        context.store.copy(q, context.sp)
+        context.sp -= 1
     elif op == 4:  # (*LDA*)
         context.push(('ADR', base(context, p) + q))
     elif op == 5:  # (*LAO*)
         context.push(('ADR', q))
     elif op == 6:  # (*STO*)
-        t, adr = context.store[context.sp - 1]
-        assert (t == 'ADR')
-        context.store[adr] = context.store[context.sp]
+        assert (context.store.get_type(context.sp - 1) == 'ADR')
+        adr = context.store.get_value(context.sp - 1)
+        context.store.copy(adr, context.sp)
         context.sp -= 2
     elif op == 7:  # (*LDC*)
         if p == 1:
@@ -211,14 +209,13 @@ def ex0(op, p, q, context):
             typed_value = ('ADR', context.store.highest_address)
         context.push(typed_value)
     elif op == 8:  # (*LCI*)
-        context.push(context.store[q])
+        context.push_copy(q)
     elif op == 9:  # (*IND*)
         adr = context.store.get_value(context.sp)
         adr += q
-        t, value = context.store[adr]
-        if t == 'UNDEF':
+        if context.store.is_undefined(adr):
             raise RuntimeError("Value Undefined")
-        context.store[context.sp] = (t, value)
+        context.store.copy(context.sp, adr)
     elif op == 10:  # (*INC*)
         t, v = context.store[context.sp]
         context.store[context.sp] = (t, v + q)
@@ -240,8 +237,7 @@ def ex0(op, p, q, context):
             raise RuntimeError("Store overflow")
         if context.sp < INPUTADR:
             context.sp = PRDADR
-        for i in range(context.sp + 1, j + 1):
-            context.store[i] = ('UNDEF', 0)
+        context.store.fill_range(context.sp + 1, j + 1, ('UNDEF', 0))
         context.sp = j
     elif op == 14:  # (*RET*)
         if p == 0:
@@ -259,16 +255,8 @@ def ex0(op, p, q, context):
 def compare(context, q):
     adr1 = context.store.get_value(context.sp)
     adr2 = context.store.get_value(context.sp + 1)
-    i = 0
-    b = True
-    while b and i != q:
-        v1 = context.store.get_value(adr1 + i)
-        v2 = context.store.get_value(adr2 + i)
-        if v1 == v2:
-            i += 1
-        else:
-            b = False
-    return b, (adr1 + i, adr2 + i)
+    i = context.store.compare_range(adr1, adr2, q)
+    return i == q, (adr1 + i, adr2 + i)
 
 
 def ex1(op, p, q, context):
@@ -276,73 +264,90 @@ def ex1(op, p, q, context):
         context.sp -= 1
         adr1 = context.store.get_value(context.sp + 1)
         adr2 = context.store.get_value(context.sp)
-        context.store[context.sp] = ('ADR', q * adr1 + adr2)
+        context.store.set_address(context.sp, q * adr1 + adr2)
     if op == 17:  # (*EQU*)
         context.sp -= 1
         if p in (0, 1, 2, 3, 4):
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 == v2)
+            context.store.set_bool(context.sp, v1 == v2)
         elif p == 5:
             b, _ = compare(context, q)
-            context.store[context.sp] = ('BOOL', b)
+            context.store.set_bool(context.sp, b)
     if op == 18:  # (*NEQ*)
         context.sp -= 1
         if p in (0, 1, 2, 3, 4):
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 != v2)
+            context.store.set_bool(context.sp, v1 != v2)
         elif p == 5:
             b, _ = compare(context, q)
-            context.store[context.sp] = ('BOOL', not b)
+            context.store.set_bool(context.sp, not b)
     if op == 19:  # (*GEQ*)
         context.sp -= 1
-        if p in (0, 1, 2, 3, 4):
+        if p in (0, 1, 2, 3):
+            v1 = context.store.get_value(context.sp)
+            v2 = context.store.get_value(context.sp + 1)
+            context.store.set_bool(context.sp, v1 >= v2)
+        elif p == 4:  # Sets, as bitmasks
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 >= v2)
+            context.store.set_bool(context.sp, not v2 & ~v1)
         elif p == 5:
             b, (i1, i2) = compare(context, q)
             v1 = context.store.get_value(i1)
             v2 = context.store.get_value(i2)
-            context.store[context.sp] = ('BOOL', v1 >= v2 or b)
+            context.store.set_bool(context.sp, v1 >= v2 or b)
     if op == 20:  # (*GRT*)
         context.sp -= 1
-        if p in (0, 1, 2, 3, 4):
+        if p in (0, 1, 2, 3):
+            v1 = context.store.get_value(context.sp)
+            v2 = context.store.get_value(context.sp + 1)
+            context.store.set_bool(context.sp, v1 > v2)
+        elif p == 4:  # Sets, as bitmasks
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 > v2)
+            context.store.set_bool(context.sp, v1 != v2 and not v2 & ~v1)
         elif p == 5:
             b, (i1, i2) = compare(context, q)
             v1 = context.store.get_value(i1)
             v2 = context.store.get_value(i2)
-            context.store[context.sp] = ('BOOL', v1 > v2 and not b)
+            context.store.set_bool(context.sp, v1 > v2 and not b)
     if op == 21:  # (*LEQ*)
         context.sp -= 1
-        if p in (0, 1, 2, 3, 4):
+        if p in (0, 1, 2, 3):
+            v1 = context.store.get_value(context.sp)
+            v2 = context.store.get_value(context.sp + 1)
+            context.store.set_bool(context.sp, v1 <= v2)
+        elif p == 4:  # Sets, as bitmasks
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 <= v2)
+            context.store.set_bool(context.sp, not v1 & ~v2)
         elif p == 5:
             b, (i1, i2) = compare(context, q)
             v1 = context.store.get_value(i1)
             v2 = context.store.get_value(i2)
-            context.store[context.sp] = ('BOOL', v1 <= v2 or b)
+            context.store.set_bool(context.sp, v1 <= v2 or b)
     if op == 22:  # (*LES*)
         context.sp -= 1
-        if p in (0, 1, 2, 3, 4):
+        if p in (0, 1, 2, 3):
+            v1 = context.store.get_value(context.sp)
+            v2 = context.store.get_value(context.sp + 1)
+            context.store.set_bool(context.sp, v1 < v2)
+        elif p == 4:  # Sets, as bitmasks
             v1 = context.store.get_value(context.sp)
             v2 = context.store.get_value(context.sp + 1)
-            context.store[context.sp] = ('BOOL', v1 < v2)
+            context.store.set_bool(context.sp, v1 != v2 and not v1 & ~v2)
         elif p == 5:
             b, (i1, i2) = compare(context, q)
             v1 = context.store.get_value(i1)
             v2 = context.store.get_value(i2)
-            context.store[context.sp] = ('BOOL', v1 < v2 and not b)
+            context.store.set_bool(context.sp, v1 < v2 and not b)
     if op == 23:  # (*UJP*)
         context.pc = q
     if op == 24:  # (*FJP*)
-        _, b = context.pop()
+        b = context.store.get_value(context.sp)
+        context.sp -= 1
         if not b:
             context.pc = q
     if op == 25:  # (*XJP*)
@@ -360,83 +365,83 @@ def ex1(op, p, q, context):
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('INT', v1 + v2)
+        context.store.set_int(context.sp, v1 + v2)
     if op == 29:  # (*ADR*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('REEL', v1 + v2)
+        context.store.set_real(context.sp, v1 + v2)
     if op == 30:  # (*SBI*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('INT', v1 - v2)
+        context.store.set_int(context.sp, v1 - v2)
     if op == 31:  # (*SBR*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('REEL', v1 - v2)
+        context.store.set_real(context.sp, v1 - v2)
 
 
 def ex2(op, p, q, context):
     if op == 32:  # (*SGS*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('SETT', {v})
+        context.store.set_set(context.sp, 1 << v)
     if op == 33:  # (*FLT*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', v)
+        context.store.set_real(context.sp, v)
     if op == 34:  # (*FLO*)
         v = context.store.get_value(context.sp - 1)
-        context.store[context.sp - 1] = ('REEL', v)
+        context.store.set_real(context.sp - 1, v)
     if op == 35:  # (*TRC*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('INT', int(trunc(v)))
+        context.store.set_int(context.sp, int(trunc(v)))
     if op == 36:  # (*NGI*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('INT', -v)
+        context.store.set_int(context.sp, -v)
     if op == 37:  # (*NGR*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', -v)
+        context.store.set_real(context.sp, -v)
     if op == 38:  # (*SQI*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('INT', v * v)
+        context.store.set_int(context.sp, v * v)
     if op == 39:  # (*SQR*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', v * v)
+        context.store.set_real(context.sp, v * v)
     if op == 40:  # (*ABI*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('INT', abs(v))
+        context.store.set_int(context.sp, abs(v))
     if op == 41:  # (*ABR*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('REEL', abs(v))
+        context.store.set_real(context.sp, abs(v))
     if op == 42:  # (*NOT*)
         v = context.store.get_value(context.sp)
-        context.store[context.sp] = ('BOOL', not v)
+        context.store.set_bool(context.sp, not v)
     if op == 43:  # (*AND*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('BOOL', v1 and v2)
+        context.store.set_bool(context.sp, v1 and v2)
     if op == 44:  # (*IOR*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('BOOL', v1 or v2)
+        context.store.set_bool(context.sp, v1 or v2)
     if op == 45:  # (*DIF*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('SETT', v1.difference(v2))
+        context.store.set_set(context.sp, v1 & ~v2)
     if op == 46:  # (*INT*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('SETT', v1.intersection(v2))
+        context.store.set_set(context.sp, v1 & v2)
     if op == 47:  # (*UNI*)
         context.sp -= 1
         v1 = context.store.get_value(context.sp)
         v2 = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('SETT', v1.union(v2))
+        context.store.set_set(context.sp, v1 | v2)
 
 
 def ex3(op, p, q, context):
@@ -444,75 +449,87 @@ def ex3(op, p, q, context):
         context.sp -= 1
         int_value = context.store.get_value(context.sp)
         set_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('BOOL', int_value in set_value)
+        context.store.set_bool(context.sp, int_value >= 0 and bool(set_value >> int_value & 1))
     elif op == 49:  # (*MOD*)
         context.sp -= 1
         a_value = context.store.get_value(context.sp)
         b_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('INT', a_value % b_value)
+        context.store.set_int(context.sp, a_value % b_value)
     elif op == 50:  # (*ODD*)
         a_value = context.store.get_value(context.sp)
-        context.store[context.sp] = ('BOOL', (a_value % 2) > 0)
+        context.store.set_bool(context.sp, (a_value % 2) > 0)
     elif op == 51:  # (*MPI*)
         context.sp -= 1
         a_value = context.store.get_value(context.sp)
         b_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('INT', a_value * b_value)
+        context.store.set_int(context.sp, a_value * b_value)
     elif op == 52:  # (*MPR*)
         context.sp -= 1
         a_value = context.store.get_value(context.sp)
         b_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('REEL', a_value * b_value)
+        context.store.set_real(context.sp, a_value * b_value)
     elif op == 53:  # (*DVI*)
         context.sp -= 1
         a_value = context.store.get_value(context.sp)
         b_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('INT', a_value // b_value)
+        context.store.set_int(context.sp, a_value // b_value)
     elif op == 54:  # (*DVR*)
         context.sp -= 1
         a_value = context.store.get_value(context.sp)
         b_value = context.store.get_value(context.sp + 1)
-        context.store[context.sp] = ('REEL', a_value / b_value)
+        context.store.set_real(context.sp, a_value / b_value)
     elif op == 55:  # (*MOV*)
         _, i2_value = context.pop()
         _, i1_value = context.pop()
-        for i in range(q):
-            context.store[i1_value + i] = context.store[i2_value + i]
+        context.store.copy_range(i1_value, i2_value, q)
     elif op == 56:  # (*LCA*)
         context.push(('ADR', q))
     elif op == 57:  # (*DEC*)
         value = context.store.get_value(context.sp)
-        context.store[context.sp] = ('INT', value - q)
+        context.store.set_int(context.sp, value - q)
     if op == 58:  # (*STP*)
         context.running = False
+        flush_files(context)
 
 
 def initialize_files(context: Context):
-    context.store[INPUTADR] = ('INT', 0)
-    context.store[PRDADR] = ('INT', 0)
+    context.store.set_int(INPUTADR, 0)
+    context.store.set_int(PRDADR, 0)
     context.store[OUTPUTADR] = ('UNDEF', 0)
     context.store[PRRADR] = ('UNDEF', 0)
 
 
-def interpret(input_stream, output_stream, input_file, output_file, code, store):
-    context = Context(input_stream, output_stream, input_file, output_file, store)
-    initialize_files(context)
+def flush_files(context: Context):
+    """Writes the buffers of the output files, at STP"""
+    for file_id in (OUTPUTADR, PRRADR):
+        stream = get_stream(context, file_id)
+        if stream is not None:
+            stream.flush()
+
 
+def run(context: Context, code: CodeSegment):
     split_op_func = [ex0, ex1, ex2, ex3]
     count = 80
 
+    ops, ps, qs = code.op, code.p, code.q
     while context.running:
-        c = code[context.pc]
-        op = c.op
-        p = c.p
-        q = c.q
+        pc = context.pc
+        op = ops[pc]
+        p = ps[pc]
+        q = qs[pc]
 
         # print(f"{context.pc:10} {op:10}{p:10} {q:10}")
 
-        context.pc += 1
+        context.pc = pc + 1
 
         split_op_func[op // 16](op, p, q, context)
 
         # count-=1
         # if count == 0:
         #     context.running = False
+
+
+def interpret(input_stream, output_stream, input_file, output_file, code: CodeSegment, store):
+    context = Context(input_stream, output_stream, input_file, output_file, store)
+    initialize_files(context)
+    run(context, code)
@@ -1,9 +1,13 @@
+import argparse
+import contextlib
 from os.path import splitext
 
+from reinterpreted import (digest, image_cache, interpreter, procedure_profiler, profiler, sampler, superinstructions,
+                           table_interpreter, tiered, verifier)
 from reinterpreted.assembler import load
-from reinterpreted.code import Code
-from reinterpreted.interpreter import interpret
-from reinterpreted.store import Store, StoreConfiguration
+from reinterpreted.code import CodeSegment
+from reinterpreted.int_context import Context, DisplayContext
+from reinterpreted.store import GrowableStore, PagedStore, Store, TaggedStore
 from translation import streams
 
 """This is a P-Code Interpreter at P2 level.
@@ -11,23 +15,214 @@ from translation import streams
 The intent is to have a Pythonic version of PasInt.
 """
 
-PCMAX: int = 15000  # (* SIZE OF context.store. *)
+engines = {
+    'classic': interpreter.run,  # Dispatch through the if chains of ex0..ex3
+    'table': table_interpreter.run,  # Dispatch through tables of handlers
+}
+
+store_types = {
+    'tuple': Store,  # A (Type, Value) tuple per cell
+    'tagged': TaggedStore,  # Parallel arrays of type tags and values
+    'growable': GrowableStore,  # Tuples, the cells being allocated as they are written
+    'paged': PagedStore,  # Tuples in pages, created as they are written
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="P-Code Interpreter at P2 level")
+    parser.add_argument("prd_filename", help="P-Code file to run, its PRR output goes to the .out file")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always assemble the P-Code file instead of using its cached image")
+    parser.add_argument("--store", choices=store_types.keys(), default='tuple',
+                        help="representation of the data store")
+    parser.add_argument("--engine", choices=engines.keys(), default='classic',
+                        help="interpreter engine running the P-Code")
+    parser.add_argument("--fuse", action="store_true",
+                        help="fuse frequent instruction sequences into superinstructions (table engine only)")
+    parser.add_argument("--fusion-report", action="store_true",
+                        help="with --fuse, count the superinstructions executions and print them on stderr")
+    parser.add_argument("--display", action="store_true",
+                        help="resolve the static links with a display (table engine only). Only faster for the"
+                             " programs accessing the variables of enclosing procedures more often than they call"
+                             " procedures, the compiler runs at about the same speed")
+    parser.add_argument("--unchecked", action="store_true",
+                        help="if the code passes the verifier, skip the undefined value and overflow checks"
+                             " of each instruction (table engine only)")
+    parser.add_argument("--profile", metavar="JSON_FILE",
+                        help="count and time each opcode and standard procedure, print the report on stderr"
+                             " and write it to JSON_FILE (table engine only)")
+    parser.add_argument("--procedure-profile", metavar="COLLAPSED_FILE",
+                        help="count the instructions run by each procedure and call stack, print the table on stderr"
+                             " and write the stacks in the collapsed format of flame graphs (table engine only)")
+    parser.add_argument("--symbols", metavar="SYMBOL_FILE",
+                        help="with --procedure-profile or --sample, names of the procedures as `<label number> <name>` lines")
+    parser.add_argument("--sample", metavar="JSON_FILE",
+                        help="sample the pc and mp registers at a fixed interval, print the hot procedures and"
+                             " addresses on stderr and write them to JSON_FILE")
+    parser.add_argument("--sample-interval", type=float, default=sampler.DEFAULT_INTERVAL * 1000,
+                        help="interval between the samples, in milliseconds of processor time")
+    parser.add_argument("--usage", action="store_true",
+                        help="print on stderr the sizes of the code and the peak sizes of the store used by the run")
+    parser.add_argument("--tier2", action="store_true",
+                        help="compile the procedures called often into Python functions (table engine only)")
+    parser.add_argument("--tier2-threshold", type=int, default=tiered.DEFAULT_THRESHOLD,
+                        help="number of calls after which a procedure is compiled")
+    parser.add_argument("--digest", metavar="JSON_FILE",
+                        help="write the checkpoints of the execution digest to JSON_FILE, to be compared with"
+                             " the ones of another engine by reinterpreted.digest")
+    parser.add_argument("--digest-interval", type=int, default=digest.DEFAULT_INTERVAL,
+                        help="number of instructions between two checkpoints of the digest")
+    arguments = parser.parse_args()
+
+    if arguments.fuse and arguments.engine != 'table':
+        parser.error("--fuse needs the table engine")
+    if arguments.fusion_report and not arguments.fuse:
+        parser.error("--fusion-report needs --fuse")
+    if arguments.tier2 and (arguments.engine != 'table' or arguments.fuse):
+        parser.error("--tier2 needs the table engine, without --fuse")
+    if arguments.display and (arguments.engine != 'table' or arguments.fuse or arguments.tier2):
+        parser.error("--display needs the table engine, without --fuse or --tier2")
+    if arguments.unchecked and (arguments.engine != 'table' or arguments.fuse or arguments.tier2 or arguments.display):
+        parser.error("--unchecked needs the table engine, without --fuse, --tier2 or --display")
+    if arguments.profile and (arguments.engine != 'table' or arguments.fuse or arguments.tier2):
+        parser.error("--profile needs the table engine, without --fuse or --tier2")
+    if arguments.procedure_profile and (arguments.engine != 'table' or arguments.fuse or arguments.tier2
+                                        or arguments.profile):
+        parser.error("--procedure-profile needs the table engine, without --fuse, --tier2 or --profile")
+    if arguments.symbols and not (arguments.procedure_profile or arguments.sample):
+        parser.error("--symbols needs --procedure-profile or --sample")
+    if arguments.digest and (arguments.tier2 or arguments.fusion_report or arguments.profile
+                             or arguments.procedure_profile):
+        parser.error("--digest can't be used with --tier2, --fusion-report, --profile or --procedure-profile")
+
+    return arguments
+
+
+def unchecked_handlers(code: CodeSegment) -> list:
+    """Returns the unchecked handlers if the code passes the verifier, the checked ones otherwise"""
+    import sys
+    verification = verifier.verify(code)
+    if not verification.passed:
+        print(f"Verification failed, running checked: {verification.errors[0]}", file=sys.stderr)
+        return table_interpreter.op_handlers
+    return table_interpreter.make_unchecked_handlers(verification.max_depths, verification.max_depth)
+
+
+def procedure_names(prd_filename, symbols_filename) -> dict[int, str]:
+    """Returns the names of the procedures, after their labels in the P-Code file or the symbol file"""
+    with open(prd_filename) as prd:
+        labels = procedure_profiler.code_labels(prd)
+    symbols = {}
+    if symbols_filename:
+        with open(symbols_filename) as symbol_file:
+            symbols = procedure_profiler.read_symbols(symbol_file)
+    return procedure_profiler.procedure_names(labels, symbols)
+
+
+def save_procedure_profile(procedure_profile, prd_filename, arguments):
+    import sys
+    names = procedure_names(prd_filename, arguments.symbols)
+    print(procedure_profile.table(names), file=sys.stderr)
+    with open(arguments.procedure_profile, "w") as output:
+        output.write(procedure_profile.collapsed_stacks(names))
+
+
+def usage_report(code: CodeSegment, store) -> str:
+    usage = store.usage()
+    lines = [f"code: {code.size} instructions, {len(code)} allocated",
+             f"stack: {usage.pop('stack')} cells, heap: {usage.pop('heap')} cells",
+             f"store: {usage.pop('allocated')} cells allocated"]
+    lines += [f"{name}: {size}" for name, size in usage.items()]
+    return "\n".join(lines)
+
+
+def run_digest(context, code: CodeSegment, arguments):
+    """Runs the engine selected by the arguments, stepping through the instructions to keep the digest"""
+    if arguments.fuse:
+        handlers = superinstructions.fuse(code).handlers
+    elif arguments.engine == 'table':
+        handlers = table_interpreter.op_handlers
+        if arguments.unchecked:
+            handlers = unchecked_handlers(code)
+        elif arguments.display:
+            handlers = table_interpreter.display_handlers
+    else:
+        handlers = digest.classic_handlers()
+
+    execution_digest = digest.run(context, code, handlers, arguments.digest_interval)
+    execution_digest.save(arguments.digest)
+
+
+def run_engine(context, code: CodeSegment, prd_filename, arguments):
+    import sys
+    if arguments.digest:
+        run_digest(context, code, arguments)
+    elif arguments.tier2:
+        tiered.run(context, code, arguments.tier2_threshold)
+    elif arguments.fuse:
+        fusion = superinstructions.fuse(code)
+        if arguments.fusion_report:
+            table_interpreter.run(context, code, fusion.counting_handlers())
+            print(fusion.report(), file=sys.stderr)
+        else:
+            table_interpreter.run(context, code, fusion.handlers)
+    elif arguments.engine == 'table':
+        handlers = table_interpreter.op_handlers
+        if arguments.unchecked:
+            handlers = unchecked_handlers(code)
+        elif arguments.display:
+            handlers = table_interpreter.display_handlers
+
+        if arguments.profile:
+            profile = profiler.run(context, code, handlers)
+            print(profile.report(), file=sys.stderr)
+            profile.save(arguments.profile)
+        elif arguments.procedure_profile:
+            procedure_profile = procedure_profiler.run(context, code, handlers)
+            save_procedure_profile(procedure_profile, prd_filename, arguments)
+        else:
+            table_interpreter.run(context, code, handlers)
+    else:
+        engines[arguments.engine](context, code)
 
 
 def main():
     import sys
-    prd_filename = sys.argv[1]
+    arguments = parse_arguments()
+    prd_filename = arguments.prd_filename
     base_filename, _ = splitext(prd_filename)
     prr_filename = base_filename + ".out"
 
-    store = Store(StoreConfiguration())
-    code = [Code() for _ in range(PCMAX)]
+    store_class = store_types[arguments.store]
+    configuration = store_class.configuration_class()
+    store = store_class(configuration)
+    code = CodeSegment()
 
     with open(prd_filename) as prd:
-        load(prd, store, code)
+        if arguments.no_cache:
+            load(prd, store, code)
+        else:
+            image_cache.load(prd, store, code, configuration)
         with open(prr_filename, "w") as prr:
-            input_stream = streams.InputStream(4, sys.stdin)
-            interpret(input_stream, sys.stdout, prd, prr, code, store)
+            input_stream = streams.open_input(4, sys.stdin)
+            context_class = DisplayContext if arguments.display else Context
+            context = context_class(input_stream, streams.OutputStream(5, sys.stdout), prd,
+                                    streams.OutputStream(7, prr), store)
+            interpreter.initialize_files(context)
+
+            register_sampler = sampler.Sampler(context, arguments.sample_interval / 1000) if arguments.sample else None
+            try:
+                with register_sampler or contextlib.nullcontext():
+                    run_engine(context, code, prd_filename, arguments)
+            finally:
+                interpreter.flush_files(context)
+
+    if register_sampler:
+        names = procedure_names(prd_filename, arguments.symbols)
+        print(register_sampler.report(code, names), file=sys.stderr)
+        register_sampler.save(arguments.sample, code, names)
+    if arguments.usage:
+        print(usage_report(code, store), file=sys.stderr)
 
 
 if __name__ == '__main__':
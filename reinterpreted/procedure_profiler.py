@@ -0,0 +1,174 @@
+""" Per procedure profiling of the table interpreter.
+
+The profiled run follows the call stack through CUP and RET, and counts the instructions
+and the time spent with each call stack, the stack being the tuple of the entry addresses
+of the procedures being run, from the start code at address 0.
+
+The procedures are named after the labels of their entries in the P-Code file, or after
+the names given for these labels in a symbol file, with lines of `<label number> <name>`.
+The call stacks are written in the collapsed format of the flame graph tools, one
+`name;name;name count` line per stack.
+"""
+import io
+import unittest
+from time import perf_counter_ns
+
+from reinterpreted.assembler import BEGINCODE
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import CUP, RET, make_code
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, TestStore
+from reinterpreted.table_interpreter import op_handlers
+
+START_NAME = "(start)"
+
+
+class ProcedureProfile:
+    def __init__(self):
+        self.instructions = {}  # Indexed by call stack, for the last procedure of the stack
+        self.times = {}  # In nanoseconds, same as instructions
+        self.calls = {}  # Indexed by procedure entry
+
+    def procedure_totals(self) -> dict[int, list[int]]:
+        """Returns [exclusive instructions, inclusive instructions, exclusive time, inclusive time]
+        indexed by procedure entry"""
+        totals = {}
+        for stack, count in self.instructions.items():
+            time = self.times[stack]
+            exclusive = totals.setdefault(stack[-1], [0, 0, 0, 0])
+            exclusive[0] += count
+            exclusive[2] += time
+            for entry in set(stack):  # A recursive procedure is counted once
+                inclusive = totals.setdefault(entry, [0, 0, 0, 0])
+                inclusive[1] += count
+                inclusive[3] += time
+        return totals
+
+    def collapsed_stacks(self, names: dict[int, str]) -> str:
+        lines = [f"{';'.join(names.get(entry, f'@{entry}') for entry in stack)} {count}"
+                 for stack, count in sorted(self.instructions.items()) if count]
+        return "\n".join(lines) + "\n"
+
+    def table(self, names: dict[int, str]) -> str:
+        totals = self.procedure_totals()
+        total_count = sum(self.instructions.values()) or 1
+        lines = [f"{'Procedure':<20}{'calls':>10}{'exclusive':>12}{'%':>7}{'inclusive':>12}{'%':>7}"
+                 f"{'excl. ms':>10}{'incl. ms':>10}"]
+        for entry, (exclusive, inclusive, exclusive_time, inclusive_time) in sorted(
+                totals.items(), key=lambda item: item[1][0], reverse=True):
+            lines.append(f"{names.get(entry, f'@{entry}'):<20}{self.calls.get(entry, 0):>10}"
+                         f"{exclusive:>12}{100 * exclusive / total_count:>7.2f}"
+                         f"{inclusive:>12}{100 * inclusive / total_count:>7.2f}"
+                         f"{exclusive_time / 1e6:>10.1f}{inclusive_time / 1e6:>10.1f}")
+        return "\n".join(lines)
+
+
+def run(context: Context, code: CodeSegment, handlers=op_handlers) -> ProcedureProfile:
+    profile = ProcedureProfile()
+    instructions, times, calls = profile.instructions, profile.times, profile.calls
+    ops, ps, qs = code.op, code.p, code.q
+
+    stack = (0,)
+    count = 0
+    last = perf_counter_ns()
+    while context.running:
+        pc = context.pc
+        context.pc = pc + 1
+        op = ops[pc]
+        handlers[op](ps[pc], qs[pc], context)
+        count += 1
+        if op == CUP or op == RET:
+            # The CUP is counted in the caller, the RET in the callee
+            now = perf_counter_ns()
+            instructions[stack] = instructions.get(stack, 0) + count
+            times[stack] = times.get(stack, 0) + now - last
+            count = 0
+            last = now
+            if op == CUP:
+                calls[qs[pc]] = calls.get(qs[pc], 0) + 1
+                stack = stack + (qs[pc],)
+            else:
+                stack = stack[:-1]
+
+    instructions[stack] = instructions.get(stack, 0) + count
+    times[stack] = times.get(stack, 0) + perf_counter_ns() - last
+    return profile
+
+
+def code_labels(prd) -> dict[int, int]:
+    """Returns the number of the first label declared at each code address, read from the L records
+    of the P-Code file, laid out as assembler.load reads it"""
+    labels = {}
+    pc = BEGINCODE
+    parts = 0
+    for line in prd:
+        if not line.strip():
+            parts += 1
+            if parts == 2:
+                break
+            pc = 0
+        elif line[0] == 'L':
+            label, _, value = line[1:].partition('=')
+            if not value.strip():  # The labels with a value aren't code addresses
+                labels.setdefault(pc, int(label))
+        elif line[0] == ' ':
+            pc += 1
+    return labels
+
+
+def read_symbols(symbols) -> dict[int, str]:
+    """Reads the `<label number> <name>` lines of a symbol file, # starting a comment"""
+    names = {}
+    for line in symbols:
+        fields = line.split('#')[0].split()
+        if len(fields) >= 2:
+            names[int(fields[0])] = fields[1]
+    return names
+
+
+def procedure_names(labels: dict[int, int], symbols: dict[int, str]) -> dict[int, str]:
+    """Returns the names of the code addresses, from their labels"""
+    names = {address: symbols.get(label, f"L{label}") for address, label in labels.items()}
+    names[0] = START_NAME
+    return names
+
+
+class TestProcedureProfiler(unittest.TestCase):
+    # The start code calls P (at 4), which calls Q (at 10) twice
+    program = [(11, 0, 0), (12, 0, 4), (58, 0, 0), (58, 0, 0),
+               (13, 0, 5), (11, 1, 0), (12, 0, 10), (11, 1, 0), (12, 0, 10), (14, 0, 0),
+               (13, 0, 5), (7, 1, 1), (3, 0, 20), (14, 0, 0)]
+
+    def run_profile(self) -> ProcedureProfile:
+        context = Context(None, io.StringIO(), None, None, Store(TestStore.MockStoreConfiguration()))
+        return run(context, make_code(self.program))
+
+    def test_instructions_are_counted_by_call_stack(self):
+        profile = self.run_profile()
+
+        self.assertEqual({(0,): 3, (0, 4): 6, (0, 4, 10): 8}, profile.instructions)
+        self.assertEqual({4: 1, 10: 2}, profile.calls)
+
+    def test_inclusive_counts_include_the_callees(self):
+        totals = self.run_profile().procedure_totals()
+
+        self.assertEqual([6, 14], totals[4][:2])
+        self.assertEqual([8, 8], totals[10][:2])
+        self.assertEqual([3, 17], totals[0][:2])
+
+    def test_collapsed_stacks_use_the_names(self):
+        names = procedure_names({4: 3, 10: 5}, {5: 'Q'})
+        collapsed = self.run_profile().collapsed_stacks(names)
+
+        self.assertEqual("(start) 3\n(start);L3 6\n(start);L3;Q 8\n", collapsed)
+
+    def test_labels_are_read_from_the_p_code_file(self):
+        prd = io.StringIO("L   3\n ENT       L   4\n RET P\nL   4=5\nL   5\n ENT L 6\nI comment\n\n"
+                          " MST 0\n CUP 0 L 3\n STP\n\n")
+
+        self.assertEqual({3: 3, 5: 5}, code_labels(prd))
+
+    def test_symbols_are_read_by_label_number(self):
+        symbols = io.StringIO("# Procedures of the compiler\n3 INSYMBOL\n5 SEARCHID # comment\n")
+
+        self.assertEqual({3: 'INSYMBOL', 5: 'SEARCHID'}, read_symbols(symbols))
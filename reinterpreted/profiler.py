@@ -0,0 +1,113 @@
+""" Per opcode profiling of the table interpreter.
+
+The profiled run has its own loop, counting and timing each instruction by opcode, and each CSP
+by standard procedure as well, so that the other loops don't pay for it.
+"""
+import io
+import json
+import unittest
+from time import perf_counter_ns
+
+from reinterpreted.assembler import instructions, sptable
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import make_code
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, TestStore
+from reinterpreted.table_interpreter import op_handlers
+
+CSP = 15
+
+# The assembler names the LCI instruction '...' as it is only generated from LDC
+OPCODE_NAMES = ['LCI' if name == '...' else name for name in instructions]
+
+
+class Profile:
+    def __init__(self):
+        self.op_counts = [0] * len(OPCODE_NAMES)
+        self.op_times = [0] * len(OPCODE_NAMES)  # In nanoseconds
+        self.csp_counts = [0] * len(sptable)
+        self.csp_times = [0] * len(sptable)
+
+    @staticmethod
+    def rows(names, counts, times) -> list[tuple[str, int, int]]:
+        """Returns (name, count, time) for the names that ran, the longest time first"""
+        return sorted(((name, count, time) for name, count, time in zip(names, counts, times) if count),
+                      key=lambda row: row[2], reverse=True)
+
+    def opcode_rows(self):
+        return self.rows(OPCODE_NAMES, self.op_counts, self.op_times)
+
+    def standard_procedure_rows(self):
+        return self.rows(sptable, self.csp_counts, self.csp_times)
+
+    def report(self) -> str:
+        total_count = sum(self.op_counts)
+        total_time = sum(self.op_times) or 1
+        lines = [f"{total_count} instructions in {total_time / 1e9:.3f} s"]
+        for title, rows in (("Opcode", self.opcode_rows()), ("CSP", self.standard_procedure_rows())):
+            lines.append(f"{title:<8}{'count':>12}{'time (ms)':>12}{'ns/call':>10}{'time %':>8}")
+            for name, count, time in rows:
+                lines.append(f"{name:<8}{count:>12}{time / 1e6:>12.1f}{time / count:>10.0f}"
+                             f"{100 * time / total_time:>8.2f}")
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        def entries(rows):
+            return [{'name': name, 'count': count, 'time_ns': time} for name, count, time in rows]
+
+        return {'instructions': sum(self.op_counts),
+                'time_ns': sum(self.op_times),
+                'opcodes': entries(self.opcode_rows()),
+                'standard_procedures': entries(self.standard_procedure_rows())}
+
+    def save(self, filename):
+        with open(filename, "w") as output:
+            json.dump(self.to_json(), output, indent=2)
+
+
+def run(context: Context, code: CodeSegment, handlers=op_handlers) -> Profile:
+    profile = Profile()
+    op_counts, op_times = profile.op_counts, profile.op_times
+    csp_counts, csp_times = profile.csp_counts, profile.csp_times
+    ops, ps, qs = code.op, code.p, code.q
+
+    while context.running:
+        pc = context.pc
+        context.pc = pc + 1
+        op = ops[pc]
+        start = perf_counter_ns()
+        handlers[op](ps[pc], qs[pc], context)
+        elapsed = perf_counter_ns() - start
+        op_counts[op] += 1
+        op_times[op] += elapsed
+        if op == CSP:
+            csp_counts[qs[pc]] += 1
+            csp_times[qs[pc]] += elapsed
+    return profile
+
+
+class TestProfiler(unittest.TestCase):
+    def run_profile(self):
+        # LDCI 65 / LDCI 1 / LAO OUTPUT / CSP WRC / LAO OUTPUT / CSP WLN / STP
+        code = make_code([(7, 1, 65), (7, 1, 1), (5, 0, 5), (15, 0, 10), (5, 0, 5), (15, 0, 5), (58, 0, 0)])
+        context = Context(None, io.StringIO(), None, None, Store(TestStore.MockStoreConfiguration()))
+        return run(context, code)
+
+    def test_instructions_are_counted_by_opcode_and_standard_procedure(self):
+        profile = self.run_profile()
+
+        self.assertEqual(2, profile.op_counts[7])
+        self.assertEqual(2, profile.op_counts[CSP])
+        self.assertEqual(1, profile.csp_counts[sptable.index('WRC')])
+        self.assertEqual(7, sum(profile.op_counts))
+        self.assertEqual(profile.op_times[CSP], sum(profile.csp_times))
+
+    def test_report_and_json_have_the_same_rows(self):
+        profile = self.run_profile()
+        report = profile.report()
+        data = json.loads(json.dumps(profile.to_json()))
+
+        self.assertEqual(7, data['instructions'])
+        self.assertEqual({'LDC', 'LAO', 'CSP', 'STP'}, {entry['name'] for entry in data['opcodes']})
+        self.assertEqual({'WRC', 'WLN'}, {entry['name'] for entry in data['standard_procedures']})
+        self.assertIn("WRC", report)
@@ -0,0 +1,148 @@
+""" Sampling profiler, for runs too long to be profiled instruction by instruction.
+
+The sampler reads the pc and mp registers of the context at a fixed interval, from a SIGPROF
+handler where setitimer is available, from a thread otherwise, so that the interpreter loops
+run unchanged. The samples give the hot addresses, and the hot procedures from the procedure
+holding each address: the compiler writes each procedure from its ENT to its RET, after its
+nested procedures, so an address belongs to the closest procedure entry before it.
+"""
+import bisect
+import json
+import signal
+import threading
+import time
+import unittest
+
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import make_code, procedure_entries
+from reinterpreted.int_context import Context
+
+DEFAULT_INTERVAL = 0.005  # In seconds
+
+
+class Sampler:
+    def __init__(self, context: Context, interval=DEFAULT_INTERVAL, use_thread=None):
+        self.context = context
+        self.interval = interval
+        self.use_thread = not hasattr(signal, 'setitimer') if use_thread is None else use_thread
+        self.samples = {}  # Number of samples indexed by (pc, mp)
+        self.thread = None
+        self.sampling = False
+        self.previous_handler = None
+
+    def sample(self, *_):
+        context = self.context
+        registers = (context.pc, context.mp)
+        self.samples[registers] = self.samples.get(registers, 0) + 1
+
+    def sample_periodically(self):
+        while self.sampling:
+            time.sleep(self.interval)
+            self.sample()
+
+    def start(self):
+        self.sampling = True
+        if self.use_thread:
+            self.thread = threading.Thread(target=self.sample_periodically, daemon=True)
+            self.thread.start()
+        else:
+            self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        self.sampling = False
+        if self.use_thread:
+            self.thread.join()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self.previous_handler)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def address_histogram(self) -> dict[int, int]:
+        histogram = {}
+        for (pc, _), count in self.samples.items():
+            histogram[pc] = histogram.get(pc, 0) + count
+        return histogram
+
+    def procedure_histogram(self, code: CodeSegment) -> dict[int, int]:
+        """Returns the number of samples indexed by procedure entry, 0 being the main code"""
+        entries = [0] + procedure_entries(code)
+        histogram = {}
+        for pc, count in self.address_histogram().items():
+            entry = entries[bisect.bisect_right(entries, pc) - 1]
+            histogram[entry] = histogram.get(entry, 0) + count
+        return histogram
+
+    def report(self, code: CodeSegment, names: dict[int, str], top=20) -> str:
+        total = sum(self.samples.values()) or 1
+        lines = [f"{sum(self.samples.values())} samples every {self.interval * 1000:g} ms"]
+        for title, histogram in (("Procedure", self.procedure_histogram(code)),
+                                 ("Address", self.address_histogram())):
+            lines.append(f"{title:<20}{'samples':>10}{'%':>8}")
+            for address, count in sorted(histogram.items(), key=lambda item: item[1], reverse=True)[:top]:
+                name = names.get(address, f"@{address}") if title == "Procedure" else str(address)
+                lines.append(f"{name:<20}{count:>10}{100 * count / total:>8.2f}")
+        return "\n".join(lines)
+
+    def to_json(self, code: CodeSegment, names: dict[int, str]) -> dict:
+        def entries(histogram, key):
+            return [{key: address, 'name': names.get(address, f"@{address}"), 'samples': count}
+                    for address, count in sorted(histogram.items(), key=lambda item: item[1], reverse=True)]
+
+        return {'interval_s': self.interval,
+                'samples': sum(self.samples.values()),
+                'procedures': entries(self.procedure_histogram(code), 'entry'),
+                'addresses': entries(self.address_histogram(), 'address')}
+
+    def save(self, filename, code: CodeSegment, names: dict[int, str]):
+        with open(filename, "w") as output:
+            json.dump(self.to_json(code, names), output, indent=2)
+
+
+class TestSampler(unittest.TestCase):
+    class MockContext:
+        def __init__(self):
+            self.pc = 0
+            self.mp = 0
+
+    # The main code calls P (at 3), P calls Q (at 6)
+    code = make_code([(11, 0, 0), (12, 0, 3), (58, 0, 0),
+                      (13, 0, 5), (12, 0, 6), (14, 0, 0),
+                      (13, 0, 5), (7, 1, 1), (14, 0, 0)])
+
+    def test_samples_are_attributed_to_addresses_and_procedures(self):
+        context = self.MockContext()
+        sampler = Sampler(context)
+        for pc in (1, 4, 4, 7, 8, 8):
+            context.pc = pc
+            sampler.sample()
+
+        self.assertEqual({1: 1, 4: 2, 7: 1, 8: 2}, sampler.address_histogram())
+        self.assertEqual({0: 1, 3: 2, 6: 3}, sampler.procedure_histogram(self.code))
+
+    def run_sampled(self, use_thread) -> Sampler:
+        context = self.MockContext()
+        with Sampler(context, interval=0.001, use_thread=use_thread) as sampler:
+            end = time.process_time() + 0.1
+            while time.process_time() < end:
+                context.pc = (context.pc + 1) % 9
+        return sampler
+
+    @unittest.skipUnless(hasattr(signal, 'setitimer'), "needs setitimer")
+    def test_timer_samples_the_running_loop(self):
+        sampler = self.run_sampled(use_thread=False)
+
+        self.assertGreater(sum(sampler.samples.values()), 0)
+        self.assertEqual(signal.SIG_DFL, signal.getsignal(signal.SIGPROF))
+
+    def test_thread_samples_the_running_loop(self):
+        sampler = self.run_sampled(use_thread=True)
+
+        self.assertGreater(sum(sampler.samples.values()), 0)
+        self.assertFalse(sampler.thread.is_alive())
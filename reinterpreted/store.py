@@ -1,6 +1,17 @@
 """ The Store, as per P2 naming, is the data memory space. """
+import itertools
 import unittest
 
+DIRTY_CHUNK_SIZE = 64  # Cells compared at once when looking for the ranges written since a snapshot
+GROWTH_MINIMUM = 256  # Cells added at least when a GrowableStore grows
+PAGE_BITS = 8  # The pages of a PagedStore hold 1 << PAGE_BITS cells
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+UNDEF_CELL = ('UNDEF', None)  # The cells never written are this very tuple
+CONSTANT_TABLE_NAMES = ['integer', 'real', 'set', 'boundary', 'multiple']
+INITIAL_CONSTANT_CELLS = [('INT', 0), ('REEL', 0.0), ('SETT', 0), ('INT', 0), ('INT', 0)]
+
 
 class StoreConfiguration:
     maximum_stack_size = 20_000
@@ -16,6 +27,7 @@ class RangedPointer:
         self.pointer = begin
         self.begin = begin
         self.end = end
+        self.addresses = {}  # First address of each value of the used part of the table
 
     def increment_or_fail(self):
         self.pointer += 1
@@ -34,7 +46,7 @@ class Pointers:
         boundary_const_table_address = set_const_table_address + configuration.set_const_table_size
         multiple_const_table_address = boundary_const_table_address + configuration.boundary_const_table_size
 
-        self.highest_address = multiple_const_table_address + multiple_const_table_address + 1
+        self.highest_address = multiple_const_table_address + configuration.multiple_const_table_size
 
         self.int_ranged_ptr = RangedPointer(integer_const_table_address, real_const_table_address)
         self.real_ranged_ptr = RangedPointer(real_const_table_address, set_const_table_address)
@@ -42,27 +54,38 @@ class Pointers:
         self.boundary_ranged_ptr = RangedPointer(boundary_const_table_address, multiple_const_table_address)
         self.multiple_ranged_ptr = RangedPointer(multiple_const_table_address, self.highest_address)
 
+    def constant_tables(self) -> list[RangedPointer]:
+        return [self.int_ranged_ptr, self.real_ranged_ptr, self.set_ranged_ptr,
+                self.boundary_ranged_ptr, self.multiple_ranged_ptr]
+
 
 class Store:
+    configuration_class = StoreConfiguration
+
     def __init__(self, configuration: StoreConfiguration):
         # The store consists of tuples of (Type, Value)
         # Types are : INT (VI), REEL (VR), BOOL (VB), SETT (VS), ADR (VA), MARK (VM), UNDEF
+        # Sets are int bitmasks, the bit n being set when n is a member
 
         self.pointers = Pointers(configuration)
-        self.store: list[tuple] = [('UNDEF', None) for _ in range(self.pointers.highest_address)]
+        self.store: list[tuple] = [UNDEF_CELL] * self.pointers.highest_address
         self.stack_size = configuration.maximum_stack_size
         self.highest_address = self.pointers.highest_address
 
-        for i in self.pointers.int_ranged_ptr.get_range():
-            self.store[i] = ('INT', 0)
-        for i in self.pointers.real_ranged_ptr.get_range():
-            self.store[i] = ('REEL', 0.0)
-        for i in self.pointers.set_ranged_ptr.get_range():
-            self.store[i] = ('SETT', set())
-        for i in self.pointers.boundary_ranged_ptr.get_range():
-            self.store[i] = ('INT', 0)
-        for i in self.pointers.multiple_ranged_ptr.get_range():
-            self.store[i] = ('INT', 0)
+        self._initialize_constant_tables()
+
+    def _initialize_constant_tables(self):
+        for ranged_ptr, typed_value in zip(self.pointers.constant_tables(), INITIAL_CONSTANT_CELLS):
+            self.fill_range(ranged_ptr.begin, ranged_ptr.end, typed_value)
+
+    def initial_cell(self, address):
+        """Returns the cell at address in a new store"""
+        if 0 <= address <= self.stack_size:
+            return UNDEF_CELL
+        for ranged_ptr, typed_value in zip(self.pointers.constant_tables(), INITIAL_CONSTANT_CELLS):
+            if ranged_ptr.begin <= address < ranged_ptr.end:
+                return typed_value
+        raise IndexError("store index out of range")
 
     def __setitem__(self, address, instruction):
         self.store[address] = instruction
@@ -71,18 +94,116 @@ class Store:
         return self.store[address]
 
     def get_value(self, address):
-        return self.__getitem__(address)[1]
+        return self.store[address][1]
 
     def get_type(self, address):
-        return self.__getitem__(address)[0]
+        return self.store[address][0]
 
-    def __add_value_in_range(self, typed_value, ranged_ptr: RangedPointer):
-        self.store[ranged_ptr.pointer] = typed_value
+    def get_cells(self, begin, end) -> list[tuple]:
+        return self.store[begin:end]
+
+    def set_cells(self, begin, typed_values: list[tuple]):
+        self.store[begin:begin + len(typed_values)] = typed_values
+
+    # Accessors for the most used operations, that don't go through a (Type, Value) tuple
+    # on stores that don't hold tuples.
+
+    def is_undefined(self, address) -> bool:
+        return self.store[address][0] == 'UNDEF'
+
+    def copy(self, destination, source):
+        self.store[destination] = self.store[source]
+
+    def set_int(self, address, value):
+        self.store[address] = ('INT', value)
+
+    def set_real(self, address, value):
+        self.store[address] = ('REEL', value)
+
+    def set_bool(self, address, value):
+        self.store[address] = ('BOOL', value)
+
+    def set_set(self, address, value):
+        self.store[address] = ('SETT', value)
+
+    def set_address(self, address, value):
+        self.store[address] = ('ADR', value)
+
+    # Operations on ranges of cells, done with slices
+
+    def copy_range(self, destination, source, count):
+        """Copies count cells, with the result of a copy cell by cell in increasing addresses"""
+        if source < destination < source + count:
+            # The copy cell by cell repeats the cells already copied
+            for i in range(count):
+                self.copy(destination + i, source + i)
+        else:
+            self.store[destination:destination + count] = self.store[source:source + count]
+
+    def fill_range(self, begin, end, typed_value):
+        """Sets the cells from begin to end excluded to typed_value"""
+        if end > begin:
+            self.store[begin:end] = [typed_value] * (end - begin)
+
+    def compare_range(self, first, second, count) -> int:
+        """Compares the values of count cells, returns the index of the first different one, or count"""
+        first_cells = self.store[first:first + count]
+        second_cells = self.store[second:second + count]
+        if first_cells == second_cells:
+            return count
+        return next((i for i, (a, b) in enumerate(zip(first_cells, second_cells)) if a[1] != b[1]), count)
+
+    # Snapshots of the stack and heap area, for running a loaded program again.
+    # The programs only write there, from the stack at 0 up to its high-water mark, the file
+    # cells being at its bottom, and from the top of the area down to the lowest np.
+    # The ranges written are found by comparing the area with the snapshot chunk by chunk,
+    # so that the engines don't have to track them.
+
+    def snapshot(self):
+        return self.store[:self.stack_size + 1]
+
+    def dirty_ranges(self, snapshot, chunk_size=DIRTY_CHUNK_SIZE) -> list[tuple[int, int]]:
+        """Returns the (begin, end excluded) ranges of chunks differing from the snapshot"""
+        cells = self.store
+        return merge_ranges([(begin, end) for begin, end in chunk_ranges(len(snapshot), chunk_size)
+                             if cells[begin:end] != snapshot[begin:end]])
+
+    def restore(self, snapshot, ranges: list[tuple[int, int]]):
+        for begin, end in ranges:
+            self.store[begin:end] = snapshot[begin:end]
+
+    # Sizes used by a run, read from the cells of the stack and heap area never written:
+    # the stack is below the longest range of untouched cells, and the heap above it.
+
+    def untouched_ranges(self) -> list[tuple[int, int]]:
+        return flagged_ranges(cell is UNDEF_CELL for cell in self.store[:self.stack_size + 1])
 
-        index = self.store[ranged_ptr.begin:ranged_ptr.end].index(typed_value)
+    def allocated_cells(self) -> int:
+        return len(self.store)
 
-        address = index + ranged_ptr.begin
-        if address == ranged_ptr.pointer:
+    def usage(self) -> dict[str, int]:
+        """Returns the peak sizes of the stack and the heap, the used part of each constant table,
+        and the number of cells allocated"""
+        area_end = self.stack_size + 1
+        gap_begin, gap_end = max(self.untouched_ranges(), key=lambda gap: gap[1] - gap[0],
+                                 default=(area_end, area_end))
+        usage = {'stack': gap_begin, 'heap': area_end - gap_end}
+        for name, ranged_ptr in zip(CONSTANT_TABLE_NAMES, self.pointers.constant_tables()):
+            usage[f"{name} constants"] = ranged_ptr.pointer - ranged_ptr.begin
+        usage['allocated'] = self.allocated_cells()
+        return usage
+
+    # The constant tables are deduplicated through the addresses index of their RangedPointer.
+    # The addresses are the ones the linear search of the first equal cells gave.
+
+    def __add_value_in_range(self, typed_value, ranged_ptr: RangedPointer):
+        # The value is written at the pointer even when it is found, as the search used to
+        self[ranged_ptr.pointer] = typed_value
+
+        address = ranged_ptr.addresses.get(typed_value)
+        if address is None:
+            address = ranged_ptr.pointer
+            ranged_ptr.addresses[typed_value] = address
             ranged_ptr.increment_or_fail()
         return address
 
@@ -98,29 +219,36 @@ class Store:
         except MemoryError:
             raise RuntimeError("Real table overflow")
 
-    def add_set_constant(self, set_value) -> int:
+    def add_set_constant(self, set_value: int) -> int:
         try:
             return self.__add_value_in_range(('SET', set_value), self.pointers.set_ranged_ptr)
         except MemoryError:
             raise RuntimeError("Set table overflow")
 
     def add_boundary_constant(self, boundary_value: tuple[int, int]) -> int:
+        """Adds the (lower, upper) pair, returns the address of its upper bound.
+
+        The pairs are searched at each address of the table, so that a pair can be found
+        across two stored pairs: the index holds all the pairs of adjacent used cells.
+        """
         lower_bound, upper_bound = boundary_value
         typed_lower_bound = ('INT', lower_bound)
         typed_upper_bound = ('INT', upper_bound)
 
         ranged_ptr = self.pointers.boundary_ranged_ptr
-        self.store[ranged_ptr.pointer] = typed_lower_bound
-        self.store[ranged_ptr.pointer + 1] = typed_upper_bound
-
-        address = None
-        for ptr in range(ranged_ptr.begin, ranged_ptr.end):
-            if self.store[ptr] == typed_lower_bound and self.store[ptr + 1] == typed_upper_bound:
-                address = ptr
-                break
-        assert (address is not None)
+        pointer = ranged_ptr.pointer
+        self[pointer] = typed_lower_bound
+        self[pointer + 1] = typed_upper_bound
 
-        if address == ranged_ptr.pointer:
+        address = ranged_ptr.addresses.get((typed_lower_bound, typed_upper_bound))
+        if address is None and pointer > ranged_ptr.begin and self[pointer - 1] == typed_lower_bound \
+                and typed_lower_bound == typed_upper_bound:
+            address = pointer - 1  # The last upper bound and the new lower bound
+        if address is None:
+            address = pointer
+            if pointer > ranged_ptr.begin:
+                ranged_ptr.addresses.setdefault((self[pointer - 1], typed_lower_bound), pointer - 1)
+            ranged_ptr.addresses.setdefault((typed_lower_bound, typed_upper_bound), pointer)
             try:
                 ranged_ptr.increment_or_fail()
                 ranged_ptr.increment_or_fail()  # Boundary takes two places
@@ -136,14 +264,543 @@ class Store:
             raise RuntimeError("Multiple table overflow")
 
         for ptr, value in zip(range(ranged_ptr.pointer, ranged_ptr.end), value_list):
-            self.store[ptr] = 'INT', value
+            self[ptr] = 'INT', value
 
         ranged_ptr.pointer += len(value_list)
 
         return address
 
+    def export_constants(self) -> list:
+        """Returns the used part of each constant table, as (begin, pointer, typed values)"""
+        return [(ranged_ptr.begin, ranged_ptr.pointer, self.get_cells(ranged_ptr.begin, ranged_ptr.pointer))
+                for ranged_ptr in self.pointers.constant_tables()]
+
+    def import_constants(self, constants: list):
+        """Fills the constant tables from the result of export_constants() on a Store of same configuration"""
+        tables = list(zip(self.pointers.constant_tables(), constants))
+        for ranged_ptr, (begin, pointer, typed_values) in tables:
+            if begin != ranged_ptr.begin or not begin + len(typed_values) == pointer <= ranged_ptr.end:
+                raise RuntimeError("Constant tables layout mismatch")
+        for ranged_ptr, (begin, pointer, typed_values) in tables:
+            self.set_cells(begin, typed_values)
+            ranged_ptr.pointer = pointer
+            ranged_ptr.addresses = {}
+            if ranged_ptr is self.pointers.boundary_ranged_ptr:
+                pairs = zip(typed_values, typed_values[1:])
+            elif ranged_ptr is not self.pointers.multiple_ranged_ptr:
+                pairs = typed_values
+            else:
+                pairs = []
+            for address, value in enumerate(pairs, begin):
+                ranged_ptr.addresses.setdefault(value, address)
+
+
+# Small integer tags of the TaggedStore, and the type names they stand for.
+# 'SET' is the type given to the set constants by add_set_constant.
+TAG_NAMES = ['UNDEF', 'INT', 'REEL', 'BOOL', 'SETT', 'ADR', 'MARK', 'SET', 'CHAR']
+TAG_CODES = {name: tag for tag, name in enumerate(TAG_NAMES)}
+UNDEF_TAG, INT_TAG, REEL_TAG, BOOL_TAG, SETT_TAG, ADR_TAG = range(6)
+
+
+class TaggedStore(Store):
+    """A Store keeping the types and the values in two parallel arrays.
+
+    The types are small integer tags in a bytearray. The (Type, Value) tuples of the
+    Store interface are only built when asked for, the accessors for the most used
+    operations read and write the arrays directly.
+    """
+
+    def __init__(self, configuration: StoreConfiguration):
+        self.pointers = Pointers(configuration)
+        self.tags = bytearray(self.pointers.highest_address)  # All UNDEF_TAG
+        self.values = [None] * self.pointers.highest_address
+        self.stack_size = configuration.maximum_stack_size
+        self.highest_address = self.pointers.highest_address
+
+        self._initialize_constant_tables()
+
+    def __setitem__(self, address, typed_value):
+        t, self.values[address] = typed_value
+        self.tags[address] = TAG_CODES[t]
+
+    def __getitem__(self, address):
+        return TAG_NAMES[self.tags[address]], self.values[address]
+
+    def get_value(self, address):
+        return self.values[address]
+
+    def get_type(self, address):
+        return TAG_NAMES[self.tags[address]]
+
+    def get_cells(self, begin, end) -> list[tuple]:
+        return [(TAG_NAMES[tag], value) for tag, value in zip(self.tags[begin:end], self.values[begin:end])]
+
+    def set_cells(self, begin, typed_values: list[tuple]):
+        end = begin + len(typed_values)
+        self.tags[begin:end] = bytes(TAG_CODES[t] for t, _ in typed_values)
+        self.values[begin:end] = [value for _, value in typed_values]
+
+    def is_undefined(self, address) -> bool:
+        return self.tags[address] == UNDEF_TAG
+
+    def copy(self, destination, source):
+        self.tags[destination] = self.tags[source]
+        self.values[destination] = self.values[source]
+
+    def set_int(self, address, value):
+        self.tags[address] = INT_TAG
+        self.values[address] = value
+
+    def set_real(self, address, value):
+        self.tags[address] = REEL_TAG
+        self.values[address] = value
+
+    def set_bool(self, address, value):
+        self.tags[address] = BOOL_TAG
+        self.values[address] = value
+
+    def set_set(self, address, value):
+        self.tags[address] = SETT_TAG
+        self.values[address] = value
+
+    def set_address(self, address, value):
+        self.tags[address] = ADR_TAG
+        self.values[address] = value
+
+    def copy_range(self, destination, source, count):
+        if source < destination < source + count:
+            for i in range(count):
+                self.copy(destination + i, source + i)
+        else:
+            self.tags[destination:destination + count] = self.tags[source:source + count]
+            self.values[destination:destination + count] = self.values[source:source + count]
+
+    def fill_range(self, begin, end, typed_value):
+        if end > begin:
+            t, value = typed_value
+            self.tags[begin:end] = bytes([TAG_CODES[t]]) * (end - begin)
+            self.values[begin:end] = [value] * (end - begin)
+
+    def compare_range(self, first, second, count) -> int:
+        first_values = self.values[first:first + count]
+        second_values = self.values[second:second + count]
+        if first_values == second_values:
+            return count
+        return next((i for i, (a, b) in enumerate(zip(first_values, second_values)) if a != b), count)
+
+    def snapshot(self):
+        return bytes(self.tags[:self.stack_size + 1]), self.values[:self.stack_size + 1]
+
+    def dirty_ranges(self, snapshot, chunk_size=DIRTY_CHUNK_SIZE) -> list[tuple[int, int]]:
+        tags, values = self.tags, self.values
+        snapshot_tags, snapshot_values = snapshot
+        return merge_ranges([(begin, end) for begin, end in chunk_ranges(len(snapshot_values), chunk_size)
+                             if (tags[begin:end] != snapshot_tags[begin:end]
+                                 or values[begin:end] != snapshot_values[begin:end])])
+
+    def restore(self, snapshot, ranges: list[tuple[int, int]]):
+        snapshot_tags, snapshot_values = snapshot
+        for begin, end in ranges:
+            self.tags[begin:end] = snapshot_tags[begin:end]
+            self.values[begin:end] = snapshot_values[begin:end]
+
+    def untouched_ranges(self) -> list[tuple[int, int]]:
+        area_end = self.stack_size + 1
+        return flagged_ranges(tag == UNDEF_TAG and value is None
+                              for tag, value in zip(self.tags[:area_end], self.values[:area_end]))
+
+    def allocated_cells(self) -> int:
+        return len(self.values)
+
+
+class GrowableStoreConfiguration(StoreConfiguration):
+    # For the stores allocating the cells written, the unused addresses of the stack space cost nothing
+    maximum_stack_size = 1_000_000
+
+
+class GrowableStore(Store):
+    """A Store allocating its cells as they are written, with the addresses of the Store.
+
+    The cells from address 0 are in the low list, that grows upward with the stack.
+    The cells from high_begin are in the high list, that grows downward with the heap
+    and upward with the constant tables. The cells between the two lists, and the cells of the
+    constant tables after the high list, have never been written: they are read as UNDEF_CELL and
+    as the initial values of their table. The lists grow by doubling, from the side of the nearest one.
+
+    Each access checks which list holds the cell, which makes this store slower than the Store.
+    """
+    configuration_class = GrowableStoreConfiguration
+
+    def __init__(self, configuration: StoreConfiguration):
+        self.pointers = Pointers(configuration)
+        self.stack_size = configuration.maximum_stack_size
+        self.highest_address = self.pointers.highest_address
+        self.low: list[tuple] = []
+        self.high: list[tuple] = []
+        self.high_begin = self.stack_size + 1
+
+    def _initialize_constant_tables(self):
+        pass  # The constant tables are initialized as the high list grows over them
+
+    def reserve(self, address):
+        """Grows the list nearest to address so that it holds the cell at address"""
+        low, high, high_begin = self.low, self.high, self.high_begin
+        if address >= high_begin:
+            high_end = high_begin + len(high)
+            if address >= high_end:
+                new_end = min(max(address + 1, high_begin + 2 * len(high), high_end + GROWTH_MINIMUM),
+                              self.highest_address)
+                if address >= new_end:
+                    raise IndexError("store index out of range")
+                high.extend(self.initial_cell(cell_address) for cell_address in range(high_end, new_end))
+        elif address - len(low) < high_begin - address:
+            new_end = min(max(address + 1, 2 * len(low), GROWTH_MINIMUM), high_begin)
+            low.extend([UNDEF_CELL] * (new_end - len(low)))
+        else:
+            new_begin = max(min(address, high_begin - len(high), high_begin - GROWTH_MINIMUM), len(low))
+            high[:0] = [UNDEF_CELL] * (high_begin - new_begin)
+            self.high_begin = new_begin
+
+    def __setitem__(self, address, typed_value):
+        low = self.low
+        if address < len(low):
+            low[address] = typed_value
+            return
+        self.reserve(address)
+        if address < len(low):
+            low[address] = typed_value
+        else:
+            self.high[address - self.high_begin] = typed_value
+
+    def __getitem__(self, address):
+        low = self.low
+        if address < len(low):
+            return low[address]
+        index = address - self.high_begin
+        if index < 0:
+            return UNDEF_CELL
+        high = self.high
+        if index < len(high):
+            return high[index]
+        return self.initial_cell(address)
+
+    def get_value(self, address):
+        return self[address][1]
+
+    def get_type(self, address):
+        return self[address][0]
+
+    def get_cells(self, begin, end) -> list[tuple]:
+        if end <= len(self.low):
+            return self.low[begin:end]
+        return [self[address] for address in range(begin, end)]
+
+    def set_cells(self, begin, typed_values: list[tuple]):
+        end = begin + len(typed_values)
+        if end <= len(self.low):
+            self.low[begin:end] = typed_values
+        else:
+            for address, typed_value in enumerate(typed_values, begin):
+                self[address] = typed_value
+
+    def is_undefined(self, address) -> bool:
+        return self[address][0] == 'UNDEF'
+
+    def copy(self, destination, source):
+        self[destination] = self[source]
+
+    def set_int(self, address, value):
+        self[address] = ('INT', value)
+
+    def set_real(self, address, value):
+        self[address] = ('REEL', value)
+
+    def set_bool(self, address, value):
+        self[address] = ('BOOL', value)
+
+    def set_set(self, address, value):
+        self[address] = ('SETT', value)
+
+    def set_address(self, address, value):
+        self[address] = ('ADR', value)
+
+    def copy_range(self, destination, source, count):
+        if source < destination < source + count:
+            for i in range(count):
+                self.copy(destination + i, source + i)
+        else:
+            self.set_cells(destination, self.get_cells(source, source + count))
+
+    def fill_range(self, begin, end, typed_value):
+        if end > begin:
+            self.set_cells(begin, [typed_value] * (end - begin))
+
+    def compare_range(self, first, second, count) -> int:
+        first_cells = self.get_cells(first, first + count)
+        second_cells = self.get_cells(second, second + count)
+        if first_cells == second_cells:
+            return count
+        return next((i for i, (a, b) in enumerate(zip(first_cells, second_cells)) if a[1] != b[1]), count)
+
+    # The snapshot holds the two lists. The cells allocated since are dirty, and dropped by restore().
+
+    def snapshot(self):
+        return list(self.low), self.high_begin, list(self.high)
+
+    def dirty_ranges(self, snapshot, chunk_size=DIRTY_CHUNK_SIZE) -> list[tuple[int, int]]:
+        snapshot_low, snapshot_high_begin, snapshot_high = snapshot
+        low, high, high_begin = self.low, self.high, self.high_begin
+        ranges = [(begin, end) for begin, end in chunk_ranges(len(low), chunk_size)
+                  if low[begin:end] != snapshot_low[begin:end]]
+        offset = snapshot_high_begin - high_begin  # Index in the high list of the snapshot one
+        ranges += [(high_begin + begin, high_begin + end) for begin, end in chunk_ranges(len(high), chunk_size)
+                   if begin < offset or high[begin:end] != snapshot_high[begin - offset:end - offset]]
+        return merge_ranges(ranges)
+
+    def restore(self, snapshot, ranges: list[tuple[int, int]]):
+        snapshot_low, snapshot_high_begin, snapshot_high = snapshot
+        del self.low[len(snapshot_low):]
+        del self.high[:snapshot_high_begin - self.high_begin]
+        del self.high[len(snapshot_high):]
+        self.high_begin = snapshot_high_begin
+        for begin, end in ranges:
+            low_end = min(end, len(self.low))
+            if begin < low_end:
+                self.low[begin:low_end] = snapshot_low[begin:low_end]
+            high_begin = max(begin - snapshot_high_begin, 0)
+            high_end = min(end - snapshot_high_begin, len(self.high))
+            if high_begin < high_end:
+                self.high[high_begin:high_end] = snapshot_high[high_begin:high_end]
+
+    def untouched_ranges(self) -> list[tuple[int, int]]:
+        area_end = self.stack_size + 1
+        return merge_ranges(flagged_ranges(cell is UNDEF_CELL for cell in self.low)
+                            + [(len(self.low), self.high_begin)]
+                            + flagged_ranges((cell is UNDEF_CELL for cell in self.high[:area_end - self.high_begin]),
+                                             self.high_begin))
+
+    def allocated_cells(self) -> int:
+        return len(self.low) + len(self.high)
+
+
+class PagedStore(Store):
+    """A Store holding its cells in fixed size pages, created when one of their cells is written.
+
+    Until then, the pages list holds a blank page, shared by all the pages with the same initial
+    cells: UNDEF_CELL in the stack space, the initial values of the constant tables after it.
+    Filling whole pages with an undefined value, as ENT and NEW do to clear the frames and the
+    heap blocks, puts the blank page back instead of writing each cell. The values of the
+    undefined cells are then lost: they are read as UNDEF_CELL.
+
+    The snapshots keep a copy of the written pages of the stack space, and the pages are the chunks
+    compared by dirty_ranges().
+    """
+    configuration_class = GrowableStoreConfiguration
+
+    def __init__(self, configuration: StoreConfiguration):
+        self.pointers = Pointers(configuration)
+        self.stack_size = configuration.maximum_stack_size
+        self.highest_address = self.pointers.highest_address
+
+        self.undefined_page = [UNDEF_CELL] * PAGE_SIZE
+        blank_pages = {(UNDEF_CELL,): self.undefined_page}
+        table_limits = [self.stack_size + 1] + [ranged_ptr.end for ranged_ptr in self.pointers.constant_tables()]
+        mixed_pages = {limit >> PAGE_BITS for limit in table_limits if limit & PAGE_MASK}
+        self.blank_pages = []
+        for begin in range(0, self.highest_address, PAGE_SIZE):
+            if begin >> PAGE_BITS in mixed_pages:
+                cells = tuple(self.initial_cell(address) if address < self.highest_address else UNDEF_CELL
+                              for address in range(begin, begin + PAGE_SIZE))
+            else:
+                cells = (self.initial_cell(begin),)
+            if cells not in blank_pages:
+                blank_pages[cells] = list(cells) * (PAGE_SIZE // len(cells))
+            self.blank_pages.append(blank_pages[cells])
+        self.pages = list(self.blank_pages)
+
+    def _initialize_constant_tables(self):
+        pass  # The blank pages hold the initial values of the tables
+
+    def written_page(self, number) -> list:
+        """Returns the page, created if it is still blank"""
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.pages[number] = list(page)
+        return page
+
+    def page_slices(self, begin, end):
+        """Yields the (page number, first index, end index excluded) of the pages from begin to end excluded"""
+        while begin < end:
+            number = begin >> PAGE_BITS
+            index = begin & PAGE_MASK
+            count = min(end - begin, PAGE_SIZE - index)
+            yield number, index, index + count
+            begin += count
+
+    def __setitem__(self, address, typed_value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = typed_value
+
+    def __getitem__(self, address):
+        return self.pages[address >> PAGE_BITS][address & PAGE_MASK]
+
+    def get_value(self, address):
+        return self.pages[address >> PAGE_BITS][address & PAGE_MASK][1]
+
+    def get_type(self, address):
+        return self.pages[address >> PAGE_BITS][address & PAGE_MASK][0]
+
+    def get_cells(self, begin, end) -> list[tuple]:
+        cells = []
+        for number, first, last in self.page_slices(begin, end):
+            cells += self.pages[number][first:last]
+        return cells
+
+    def set_cells(self, begin, typed_values: list[tuple]):
+        position = 0
+        for number, first, last in self.page_slices(begin, begin + len(typed_values)):
+            self.written_page(number)[first:last] = typed_values[position:position + last - first]
+            position += last - first
+
+    def is_undefined(self, address) -> bool:
+        return self.pages[address >> PAGE_BITS][address & PAGE_MASK][0] == 'UNDEF'
+
+    def copy(self, destination, source):
+        number = destination >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[destination & PAGE_MASK] = self.pages[source >> PAGE_BITS][source & PAGE_MASK]
+
+    def set_int(self, address, value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = ('INT', value)
+
+    def set_real(self, address, value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = ('REEL', value)
+
+    def set_bool(self, address, value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = ('BOOL', value)
+
+    def set_set(self, address, value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = ('SETT', value)
+
+    def set_address(self, address, value):
+        number = address >> PAGE_BITS
+        page = self.pages[number]
+        if page is self.blank_pages[number]:
+            page = self.written_page(number)
+        page[address & PAGE_MASK] = ('ADR', value)
+
+    def copy_range(self, destination, source, count):
+        if source < destination < source + count:
+            for i in range(count):
+                self.copy(destination + i, source + i)
+        else:
+            self.set_cells(destination, self.get_cells(source, source + count))
+
+    def fill_range(self, begin, end, typed_value):
+        number = begin >> PAGE_BITS
+        if begin < end and (end - 1) >> PAGE_BITS == number:  # The frames are usually smaller than a page
+            index = begin & PAGE_MASK
+            self.written_page(number)[index:index + end - begin] = [typed_value] * (end - begin)
+            return
+
+        undefined = typed_value[0] == 'UNDEF'
+        for number, first, last in self.page_slices(begin, end):
+            if undefined and last - first == PAGE_SIZE and self.blank_pages[number] is self.undefined_page:
+                self.pages[number] = self.undefined_page
+            else:
+                self.written_page(number)[first:last] = [typed_value] * (last - first)
+
+    def compare_range(self, first, second, count) -> int:
+        first_cells = self.get_cells(first, first + count)
+        second_cells = self.get_cells(second, second + count)
+        if first_cells == second_cells:
+            return count
+        return next((i for i, (a, b) in enumerate(zip(first_cells, second_cells)) if a[1] != b[1]), count)
+
+    def stack_pages(self) -> range:
+        return range((self.stack_size >> PAGE_BITS) + 1)
+
+    def snapshot(self):
+        return [page if page is self.blank_pages[number] else list(page)
+                for number, page in zip(self.stack_pages(), self.pages)]
+
+    def dirty_ranges(self, snapshot, chunk_size=DIRTY_CHUNK_SIZE) -> list[tuple[int, int]]:
+        pages = self.pages
+        return merge_ranges([(number << PAGE_BITS, (number + 1) << PAGE_BITS) for number in self.stack_pages()
+                             if pages[number] is not snapshot[number] and pages[number] != snapshot[number]])
+
+    def restore(self, snapshot, ranges: list[tuple[int, int]]):
+        for begin, end in ranges:
+            for number in range(begin >> PAGE_BITS, end >> PAGE_BITS):
+                page = snapshot[number]
+                self.pages[number] = page if page is self.blank_pages[number] else list(page)
+
+    def untouched_ranges(self) -> list[tuple[int, int]]:
+        area_end = self.stack_size + 1
+        ranges = []
+        for number in self.stack_pages():
+            begin = number << PAGE_BITS
+            page = self.pages[number]
+            if page is self.undefined_page:
+                ranges.append((begin, min(begin + PAGE_SIZE, area_end)))
+            else:
+                ranges += flagged_ranges((cell is UNDEF_CELL for cell in page[:area_end - begin]), begin)
+        return merge_ranges(ranges)
+
+    def allocated_cells(self) -> int:
+        return PAGE_SIZE * sum(page is not blank_page for page, blank_page in zip(self.pages, self.blank_pages))
+
+
+def chunk_ranges(size, chunk_size) -> list[tuple[int, int]]:
+    return [(begin, min(begin + chunk_size, size)) for begin in range(0, size, chunk_size)]
+
+
+def flagged_ranges(flags, begin=0) -> list[tuple[int, int]]:
+    """Returns the (begin, end excluded) ranges of the true flags, the first flag being at begin"""
+    ranges = []
+    for flag, group in itertools.groupby(flags):
+        end = begin + sum(1 for _ in group)
+        if flag:
+            ranges.append((begin, end))
+        begin = end
+    return ranges
+
+
+def merge_ranges(ranges) -> list[tuple[int, int]]:
+    """Returns the ranges, the adjacent ones being merged"""
+    merged = []
+    for begin, end in ranges:
+        if merged and merged[-1][1] == begin:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((begin, end))
+    return merged
+
 
 class TestStore(unittest.TestCase):
+    store_class = Store
+
     class MockStoreConfiguration(StoreConfiguration):
         maximum_stack_size = 100
         integer_const_table_size = 3
@@ -153,15 +810,20 @@ class TestStore(unittest.TestCase):
         multiple_const_table_size = 10
 
     def test_a_typed_value_can_be_added_at_an_address(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         store[0] = 'INT', 4
 
         self.assertEqual(('INT', 4), store[0])
         self.assertEqual(4, store.get_value(0))
         self.assertEqual('INT', store.get_type(0))
 
+    def test_highest_address_follows_the_constant_tables(self):
+        # As MAXSTR, the NIL address of the P2 interpreter
+        store = self.store_class(self.MockStoreConfiguration())
+        self.assertEqual(100 + 1 + 3 + 3 + 10 + 4 + 10, store.highest_address)
+
     def test_store_constant_tables_are_initialized_to_their_types(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         self.assertEqual('INT', store[store.pointers.int_ranged_ptr.begin][0])
         self.assertEqual('REEL', store[store.pointers.real_ranged_ptr.begin][0])
         self.assertEqual('SETT', store[store.pointers.set_ranged_ptr.begin][0])
@@ -169,7 +831,7 @@ class TestStore(unittest.TestCase):
         self.assertEqual('INT', store[store.pointers.multiple_ranged_ptr.begin][0])
 
     def test_a_integer_constant_can_be_added_to_store(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         q = store.add_int_constant(10)
 
         constant_address = store.pointers.int_ranged_ptr.begin
@@ -178,13 +840,13 @@ class TestStore(unittest.TestCase):
 
     def test_raises_if_too_many_int_const_added(self):
         mock_configuration = self.MockStoreConfiguration()
-        store = Store(mock_configuration)
+        store = self.store_class(mock_configuration)
         for i in range(mock_configuration.integer_const_table_size - 1):
             store.add_int_constant(10 + i)
         self.assertRaises(RuntimeError, store.add_int_constant, 5)
 
     def test_a_real_constant_can_be_added_to_store(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         q = store.add_real_constant(10.0)
 
         constant_address = store.pointers.real_ranged_ptr.begin
@@ -192,15 +854,15 @@ class TestStore(unittest.TestCase):
         self.assertEqual(constant_address, q)
 
     def test_a_set_constant_can_be_added_to_store(self):
-        store = Store(self.MockStoreConfiguration())
-        q = store.add_set_constant({1, 2, 3})
+        store = self.store_class(self.MockStoreConfiguration())
+        q = store.add_set_constant(0b1110)
 
         constant_address = store.pointers.set_ranged_ptr.begin
-        self.assertEqual({1, 2, 3}, store[constant_address][1])
+        self.assertEqual(0b1110, store[constant_address][1])
         self.assertEqual(constant_address, q)
 
     def test_a_boundary_constant_can_be_added_to_store(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         q = store.add_boundary_constant((1, 5))
 
         constant_address = store.pointers.boundary_ranged_ptr.begin
@@ -209,7 +871,7 @@ class TestStore(unittest.TestCase):
         self.assertEqual(constant_address + 1, q)  # The pointed address is the upper bound
 
     def test_a_multiple_constant_can_be_added_to_store(self):
-        store = Store(self.MockStoreConfiguration())
+        store = self.store_class(self.MockStoreConfiguration())
         q = store.add_multiple_constant([10, 20, 30])
 
         constant_address = store.pointers.multiple_ranged_ptr.begin
@@ -217,3 +879,226 @@ class TestStore(unittest.TestCase):
         self.assertEqual(20, store[constant_address + 1][1])
         self.assertEqual(30, store[constant_address + 2][1])
         self.assertEqual(constant_address, q)
+
+    def test_constants_can_be_exported_to_another_store(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        int_address = store.add_int_constant(10)
+        set_address = store.add_set_constant(0b110)
+        multiple_address = store.add_multiple_constant([10, 20])
+
+        other_store = self.store_class(self.MockStoreConfiguration())
+        other_store.import_constants(store.export_constants())
+
+        self.assertEqual(('INT', 10), other_store[int_address])
+        self.assertEqual(0b110, other_store.get_value(set_address))
+        self.assertEqual(20, other_store.get_value(multiple_address + 1))
+        self.assertEqual(multiple_address + 2, other_store.add_multiple_constant([30]))
+
+    def test_constants_past_the_end_of_a_table_are_not_imported(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        constants = store.export_constants()
+        begin = store.pointers.multiple_ranged_ptr.begin
+        constants[-1] = (begin, begin + 11, [('INT', 0)] * 11)
+
+        with self.assertRaises(RuntimeError):
+            self.store_class(self.MockStoreConfiguration()).import_constants(constants)
+
+    def test_imported_constants_are_deduplicated(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        int_address = store.add_int_constant(10)
+        boundary_address = store.add_boundary_constant((1, 9))
+
+        other_store = self.store_class(self.MockStoreConfiguration())
+        other_store.import_constants(store.export_constants())
+
+        self.assertEqual(int_address, other_store.add_int_constant(10))
+        self.assertEqual(int_address + 1, other_store.add_int_constant(11))
+        self.assertEqual(boundary_address, other_store.add_boundary_constant((1, 9)))
+
+    def test_boundaries_are_found_across_two_pairs(self):
+        class LargerConfiguration(self.MockStoreConfiguration):
+            boundary_const_table_size = 10
+
+        store = self.store_class(LargerConfiguration())
+        begin = store.pointers.boundary_ranged_ptr.begin
+        store.add_boundary_constant((5, 7))
+        store.add_boundary_constant((7, 9))
+
+        self.assertEqual(begin + 2, store.add_boundary_constant((7, 7)))
+        self.assertEqual(begin + 3, store.add_boundary_constant((7, 9)))
+        self.assertEqual(begin + 4, store.add_boundary_constant((9, 9)))
+        self.assertEqual(begin + 4, store.pointers.boundary_ranged_ptr.pointer)
+
+    def test_accessors_write_typed_values(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_int(0, 5)
+        store.set_real(1, 2.5)
+        store.set_bool(2, True)
+        store.set_set(3, 1 << 4)
+        store.set_address(4, 50)
+        store.copy(5, 0)
+
+        self.assertEqual([('INT', 5), ('REEL', 2.5), ('BOOL', True), ('SETT', 1 << 4), ('ADR', 50), ('INT', 5)],
+                         [store[address] for address in range(6)])
+
+    def test_undefined_values_are_detected(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store[1] = ('UNDEF', 0)
+        store.set_int(2, 0)
+
+        self.assertTrue(store.is_undefined(0))
+        self.assertTrue(store.is_undefined(1))
+        self.assertFalse(store.is_undefined(2))
+
+    def test_a_range_of_cells_can_be_copied(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_cells(10, [('INT', 1), ('REEL', 2.0), ('BOOL', False)])
+        store.copy_range(20, 10, 3)
+
+        self.assertEqual([('INT', 1), ('REEL', 2.0), ('BOOL', False)], store.get_cells(20, 23))
+
+    def test_overlapping_range_copy_is_done_in_increasing_addresses(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_cells(10, [('INT', 1), ('INT', 2), ('INT', 3)])
+        store.copy_range(11, 10, 3)
+
+        self.assertEqual([('INT', 1)] * 4, store.get_cells(10, 14))
+
+    def test_a_range_of_cells_can_be_filled(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_cells(10, [('INT', 1), ('INT', 2), ('INT', 3)])
+        store.fill_range(10, 12, ('UNDEF', 0))
+        store.fill_range(12, 10, ('INT', 5))
+
+        self.assertEqual([('UNDEF', 0), ('UNDEF', 0), ('INT', 3)], store.get_cells(10, 13))
+
+    def test_ranges_are_compared_on_their_values(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_cells(10, [('INT', 65), ('INT', 66), ('INT', 67)])
+        store.set_cells(20, [('INT', 65), ('INT', 66), ('INT', 68)])
+        store.set_cells(30, [('ADR', 65), ('INT', 66), ('INT', 67)])
+
+        self.assertEqual(2, store.compare_range(10, 20, 3))
+        self.assertEqual(2, store.compare_range(10, 20, 2))
+        self.assertEqual(3, store.compare_range(10, 30, 3))
+
+    def test_written_ranges_are_restored_from_a_snapshot(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.set_int(5, 1)
+        snapshot = store.snapshot()
+        store.set_int(5, 2)
+        store.set_int(6, 3)
+        store.set_real(store.stack_size, 1.5)
+
+        ranges = store.dirty_ranges(snapshot, chunk_size=10)
+        self.assertEqual([(0, 10), (100, 101)], ranges)
+
+        store.restore(snapshot, ranges)
+        self.assertEqual([], store.dirty_ranges(snapshot, chunk_size=10))
+        self.assertEqual([('INT', 1), ('UNDEF', None)], store.get_cells(5, 7))
+
+
+class TestTaggedStore(TestStore):
+    store_class = TaggedStore
+
+    def test_tags_and_values_are_kept_apart(self):
+        store = TaggedStore(self.MockStoreConfiguration())
+        store[10] = ('MARK', 42)
+
+        self.assertEqual(TAG_CODES['MARK'], store.tags[10])
+        self.assertEqual(42, store.values[10])
+
+    def test_usage_is_read_from_the_cells_written(self):
+        store = self.store_class(self.MockStoreConfiguration())
+        store.add_int_constant(10)
+        store.set_cells(0, [('INT', 1)] * 12)
+        store.fill_range(90, 101, ('UNDEF', 0))
+
+        usage = store.usage()
+        self.assertEqual(12, usage['stack'])
+        self.assertEqual(11, usage['heap'])
+        self.assertEqual(1, usage['integer constants'])
+        self.assertEqual(0, usage['multiple constants'])
+
+
+class TestGrowableStore(TestStore):
+    store_class = GrowableStore
+
+    def test_cells_are_allocated_when_written(self):
+        store = GrowableStore(self.MockStoreConfiguration())
+        self.assertEqual(0, store.allocated_cells())
+        self.assertEqual(UNDEF_CELL, store[50])
+
+        store.set_int(3, 7)
+        store.set_address(95, 3)
+        self.assertEqual(('INT', 7), store[3])
+        self.assertEqual(('ADR', 3), store[95])
+        self.assertEqual(UNDEF_CELL, store[50])
+        self.assertEqual(('REEL', 0.0), store[store.pointers.real_ranged_ptr.begin])
+        self.assertLess(store.allocated_cells(), store.highest_address)
+
+    def test_lists_grow_from_the_nearest_side(self):
+        class LargerConfiguration(self.MockStoreConfiguration):
+            maximum_stack_size = 10_000
+
+        store = GrowableStore(LargerConfiguration())
+        store.set_int(10, 1)
+        store.set_int(9_000, 2)
+        store.set_int(600, 3)
+
+        self.assertEqual(601, len(store.low))
+        self.assertEqual(9_000, store.high_begin)
+        self.assertEqual([('INT', 1), ('INT', 3), ('INT', 2)], [store[10], store[600], store[9_000]])
+
+    def test_cells_allocated_after_a_snapshot_are_dropped(self):
+        store = GrowableStore(self.MockStoreConfiguration())
+        store.set_int(5, 1)
+        snapshot = store.snapshot()
+        store.set_int(store.stack_size, 2)
+        store.add_multiple_constant([1, 2])
+
+        store.restore(snapshot, store.dirty_ranges(snapshot))
+        self.assertEqual(snapshot, store.snapshot())
+        self.assertEqual(UNDEF_CELL, store[store.stack_size])
+
+
+class TestPagedStore(TestStore):
+    store_class = PagedStore
+
+    def test_pages_are_created_when_written(self):
+        store = PagedStore(self.MockStoreConfiguration())
+        self.assertEqual(0, store.allocated_cells())
+
+        store.set_int(3, 7)
+        self.assertEqual(('INT', 7), store[3])
+        self.assertEqual(UNDEF_CELL, store[4])
+        self.assertEqual(PAGE_SIZE, store.allocated_cells())
+        self.assertEqual(('REEL', 0.0), store[store.pointers.real_ranged_ptr.begin])
+
+    def test_filling_whole_pages_with_undefined_values_drops_them(self):
+        class LargerConfiguration(self.MockStoreConfiguration):
+            maximum_stack_size = 4 * PAGE_SIZE
+
+        store = PagedStore(LargerConfiguration())
+        store.fill_range(0, 3 * PAGE_SIZE, ('INT', 1))
+        store.fill_range(PAGE_SIZE // 2, 3 * PAGE_SIZE, ('UNDEF', 0))
+
+        self.assertEqual(PAGE_SIZE, store.allocated_cells())
+        self.assertEqual(('UNDEF', 0), store[PAGE_SIZE - 1])
+        self.assertEqual(UNDEF_CELL, store[PAGE_SIZE])
+        self.assertEqual(('INT', 1), store[0])
+
+    def test_written_ranges_are_restored_from_a_snapshot(self):
+        store = PagedStore(self.MockStoreConfiguration())
+        store.set_int(5, 1)
+        snapshot = store.snapshot()
+        store.set_int(5, 2)
+        store.set_real(store.stack_size, 1.5)
+
+        ranges = store.dirty_ranges(snapshot)
+        self.assertEqual([(0, PAGE_SIZE)], ranges)
+
+        store.restore(snapshot, ranges)
+        self.assertEqual([], store.dirty_ranges(snapshot))
+        self.assertEqual([('INT', 1), UNDEF_CELL], store.get_cells(5, 7))
+        self.assertEqual(UNDEF_CELL, store[store.stack_size])
@@ -0,0 +1,346 @@
+""" Fusion of frequent instruction sequences into superinstructions.
+
+After loading, the code is scanned for frequent sequences (like LOD LOD ADI, or
+LDCI STR). The first instruction of each sequence found is changed into a
+superinstruction doing the work of the whole sequence with a single dispatch.
+The other instructions of the sequence are left untouched. A sequence is never
+fused across an address that can be jumped to.
+
+The superinstructions only run with the table driven interpreter, their handlers
+are appended to its opcode table.
+"""
+import io
+import operator
+import unittest
+from collections import Counter
+
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import jump_targets, make_code
+from reinterpreted.int_context import Context
+from reinterpreted.interpreter import base
+from reinterpreted.store import Store, TestStore
+from reinterpreted import table_interpreter
+
+# Instructions of the patterns, as (op, p). A None p matches any p.
+LOD, LDO, STR, SRO, LDA, LDCI, MST, CUP, CSP = (0, None), (1, None), (2, None), (3, None), (4, None), (7, 1), \
+    (11, None), (12, None), (15, None)
+FJP, ADI, NOT = (24, None), (28, None), (42, None)
+EQUI, NEQI, GEQI, GRTI, LEQI, LESI = (17, 1), (18, 1), (19, 1), (20, 1), (21, 1), (22, 1)
+
+
+def frame_address(context, p, q):
+    return (context.mp if p == 0 else base(context, p)) + q
+
+
+def check_defined(store, address):
+    if store.is_undefined(address):
+        raise RuntimeError("Value Undefined")
+
+
+def check_growth(context, growth):
+    if context.sp + growth > context.np:
+        raise RuntimeError("Store Overflow")
+
+
+# Each make_ function returns the handler of a superinstruction. The handler is called with
+# the p and q parameters of the first instruction, when context.pc is on the second one.
+# The parameters of the following instructions are read from the code arrays ps and qs.
+
+def make_lod_lod_adi(ps, qs):
+    def lod_lod_adi(p, q, context):
+        pc = context.pc
+        context.pc = pc + 2
+        store = context.store
+        address_1 = frame_address(context, p, q)
+        check_defined(store, address_1)
+        address_2 = frame_address(context, ps[pc], qs[pc])
+        check_defined(store, address_2)
+        check_growth(context, 2)
+        sp = context.sp + 1
+        context.sp = sp
+        store.set_int(sp, store.get_value(address_1) + store.get_value(address_2))
+
+    return lod_lod_adi
+
+
+def make_ldci_str(ps, qs):
+    def ldci_str(p, q, context):
+        pc = context.pc
+        context.pc = pc + 1
+        check_growth(context, 1)
+        context.store.set_int(frame_address(context, ps[pc], qs[pc]), q)
+
+    return ldci_str
+
+
+def make_lod_ldci_compare_fjp(compare_function):
+    def make(ps, qs):
+        def lod_ldci_compare_fjp(p, q, context):
+            pc = context.pc
+            store = context.store
+            address = frame_address(context, p, q)
+            check_defined(store, address)
+            check_growth(context, 2)
+            if compare_function(store.get_value(address), qs[pc]):
+                context.pc = pc + 3
+            else:
+                context.pc = qs[pc + 2]
+
+        return lod_ldci_compare_fjp
+
+    return make
+
+
+def make_ldo_ldci_adi_sro(ps, qs):
+    def ldo_ldci_adi_sro(p, q, context):
+        pc = context.pc
+        context.pc = pc + 3
+        store = context.store
+        check_defined(store, q)
+        check_growth(context, 2)
+        store.set_int(qs[pc + 2], store.get_value(q) + qs[pc])
+
+    return ldo_ldci_adi_sro
+
+
+def make_mst_cup(ps, qs):
+    def mst_cup(p, q, context):
+        pc = context.pc
+        store = context.store
+        sp = context.sp
+        store[sp + 1] = ('UNDEF', 0)  # For return value
+        store[sp + 2] = ('MARK', base(context, p))  # For static link
+        store[sp + 3] = ('MARK', context.mp)  # For dynamic link
+        store[sp + 4] = ('UNDEF', 0)  # For previous EP
+        sp += 4
+        context.sp = sp
+        context.mp = sp - (ps[pc] + 3)
+        store[context.mp + 3] = ('MARK', pc + 1)  # Return address
+        context.pc = qs[pc]
+
+    return mst_cup
+
+
+def make_ldo_ldci(ps, qs):
+    def ldo_ldci(p, q, context):
+        pc = context.pc
+        context.pc = pc + 1
+        store = context.store
+        check_defined(store, q)
+        check_growth(context, 2)
+        sp = context.sp + 2
+        context.sp = sp
+        store.copy(sp - 1, q)
+        store.set_int(sp, qs[pc])
+
+    return ldo_ldci
+
+
+def make_lod_ldci(ps, qs):
+    def lod_ldci(p, q, context):
+        pc = context.pc
+        context.pc = pc + 1
+        store = context.store
+        address = frame_address(context, p, q)
+        check_defined(store, address)
+        check_growth(context, 2)
+        sp = context.sp + 2
+        context.sp = sp
+        store.copy(sp - 1, address)
+        store.set_int(sp, qs[pc])
+
+    return lod_ldci
+
+
+def make_ldo_fjp(ps, qs):
+    def ldo_fjp(p, q, context):
+        pc = context.pc
+        store = context.store
+        check_defined(store, q)
+        check_growth(context, 1)
+        if store.get_value(q):
+            context.pc = pc + 1
+        else:
+            context.pc = qs[pc]
+
+    return ldo_fjp
+
+
+def make_not_fjp(ps, qs):
+    def not_fjp(p, q, context):
+        pc = context.pc
+        b = context.store.get_value(context.sp)
+        context.sp -= 1
+        if b:  # FJP jumps when NOT gives False
+            context.pc = qs[pc]
+        else:
+            context.pc = pc + 1
+
+    return not_fjp
+
+
+def make_lda_csp(ps, qs):
+    sp_handlers = table_interpreter.sp_handlers
+
+    def lda_csp(p, q, context):
+        pc = context.pc
+        context.pc = pc + 1
+        table_interpreter.op_lda(p, q, context)
+        sp_handlers[qs[pc]](context)
+
+    return lda_csp
+
+
+def make_ldci_adi(ps, qs):
+    def ldci_adi(p, q, context):
+        context.pc += 1
+        check_growth(context, 1)
+        store = context.store
+        store.set_int(context.sp, store.get_value(context.sp) + q)
+
+    return ldci_adi
+
+
+class Superinstruction:
+    def __init__(self, name, pattern, make_handler):
+        self.name = name
+        self.pattern = pattern
+        self.make_handler = make_handler
+
+
+# The longest patterns come first, as they are tried in this order
+superinstructions = [
+    Superinstruction('LOD LDCI EQUI FJP', (LOD, LDCI, EQUI, FJP), make_lod_ldci_compare_fjp(operator.eq)),
+    Superinstruction('LOD LDCI NEQI FJP', (LOD, LDCI, NEQI, FJP), make_lod_ldci_compare_fjp(operator.ne)),
+    Superinstruction('LOD LDCI GEQI FJP', (LOD, LDCI, GEQI, FJP), make_lod_ldci_compare_fjp(operator.ge)),
+    Superinstruction('LOD LDCI GRTI FJP', (LOD, LDCI, GRTI, FJP), make_lod_ldci_compare_fjp(operator.gt)),
+    Superinstruction('LOD LDCI LEQI FJP', (LOD, LDCI, LEQI, FJP), make_lod_ldci_compare_fjp(operator.le)),
+    Superinstruction('LOD LDCI LESI FJP', (LOD, LDCI, LESI, FJP), make_lod_ldci_compare_fjp(operator.lt)),
+    Superinstruction('LDO LDCI ADI SRO', (LDO, LDCI, ADI, SRO), make_ldo_ldci_adi_sro),
+    Superinstruction('LOD LOD ADI', (LOD, LOD, ADI), make_lod_lod_adi),
+    Superinstruction('MST CUP', (MST, CUP), make_mst_cup),
+    Superinstruction('LDCI STR', (LDCI, STR), make_ldci_str),
+    Superinstruction('LDO LDCI', (LDO, LDCI), make_ldo_ldci),
+    Superinstruction('LOD LDCI', (LOD, LDCI), make_lod_ldci),
+    Superinstruction('LDO FJP', (LDO, FJP), make_ldo_fjp),
+    Superinstruction('NOT FJP', (NOT, FJP), make_not_fjp),
+    Superinstruction('LDA CSP', (LDA, CSP), make_lda_csp),
+    Superinstruction('LDCI ADI', (LDCI, ADI), make_ldci_adi),
+]
+
+FIRST_OPCODE = len(table_interpreter.op_handlers)  # Opcode of the first superinstruction
+
+
+class Fusion:
+    """Result of the fusion pass on a code: the handlers table and the fused sequences"""
+
+    def __init__(self, code: CodeSegment):
+        self.sites = Counter()  # Number of fused sequences, per superinstruction name
+        self.executions = [0] * len(superinstructions)  # Filled when running with counting handlers
+        self.handlers = table_interpreter.op_handlers + [superinstruction.make_handler(code.p, code.q)
+                                                         for superinstruction in superinstructions]
+
+    def counting_handlers(self) -> list:
+        """Returns a handlers table where the superinstructions count their executions"""
+
+        def counting(index, handler):
+            def counting_handler(p, q, context):
+                self.executions[index] += 1
+                handler(p, q, context)
+
+            return counting_handler
+
+        fused_handlers = self.handlers[FIRST_OPCODE:]
+        return self.handlers[:FIRST_OPCODE] + [counting(index, handler)
+                                               for index, handler in enumerate(fused_handlers)]
+
+    def report(self) -> str:
+        lines = [f"{'Superinstruction':<20}{'Sites':>8}{'Executions':>12}"]
+        for index, superinstruction in enumerate(superinstructions):
+            lines.append(f"{superinstruction.name:<20}{self.sites[superinstruction.name]:>8}"
+                         f"{self.executions[index]:>12}")
+        return '\n'.join(lines)
+
+
+def matches(code: CodeSegment, pc, pattern, targets) -> bool:
+    if pc + len(pattern) > code.size:
+        return False
+    for offset, (op, p) in enumerate(pattern):
+        address = pc + offset
+        if code.op[address] != op or (p is not None and code.p[address] != p):
+            return False
+        if offset > 0 and address in targets:
+            return False
+    return True
+
+
+def fuse(code: CodeSegment) -> Fusion:
+    """Changes the frequent sequences of the code into superinstructions"""
+    fusion = Fusion(code)
+    targets = jump_targets(code)
+
+    pc = 0
+    while pc < code.size:
+        length = 1
+        for index, superinstruction in enumerate(superinstructions):
+            if matches(code, pc, superinstruction.pattern, targets):
+                code.op[pc] = FIRST_OPCODE + index
+                fusion.sites[superinstruction.name] += 1
+                length = len(superinstruction.pattern)
+                break
+        pc += length
+
+    return fusion
+
+
+class TestSuperinstructions(unittest.TestCase):
+    def run_code(self, code, handlers):
+        store = Store(TestStore.MockStoreConfiguration())
+        context = Context(None, io.StringIO(), None, None, store)
+        context.mp = 10
+        for address in range(10, 20):
+            store.set_int(address, address * 2)
+        context.sp = 20
+        table_interpreter.run(context, code, handlers)
+        return context
+
+    def run_fused_and_unfused(self, instructions):
+        unfused_context = self.run_code(make_code(instructions), table_interpreter.op_handlers)
+        code = make_code(instructions)
+        fusion = fuse(code)
+        fused_context = self.run_code(code, fusion.handlers)
+
+        self.assertEqual(unfused_context.sp, fused_context.sp)
+        self.assertEqual(unfused_context.store.get_cells(0, unfused_context.sp + 1),
+                         fused_context.store.get_cells(0, fused_context.sp + 1))
+        return fusion
+
+    def test_lod_lod_adi_is_fused(self):
+        fusion = self.run_fused_and_unfused([(0, 0, 1), (0, 0, 2), (28, 0, 0), (58, 0, 0)])
+        self.assertEqual(1, fusion.sites['LOD LOD ADI'])
+
+    def test_compare_and_jump_is_fused(self):
+        for constant in (12, 30):  # Jump taken, and not taken
+            fusion = self.run_fused_and_unfused([(0, 0, 1), (7, 1, constant), (21, 1, 0), (24, 0, 6), (7, 1, 99),
+                                                 (58, 0, 0), (7, 1, 10), (58, 0, 0)])
+            self.assertEqual(1, fusion.sites['LOD LDCI LEQI FJP'])
+
+    def test_global_increment_is_fused(self):
+        fusion = self.run_fused_and_unfused([(1, 0, 12), (7, 1, 3), (28, 0, 0), (3, 0, 13), (58, 0, 0)])
+        self.assertEqual(1, fusion.sites['LDO LDCI ADI SRO'])
+
+    def test_sequence_is_not_fused_across_a_jump_target(self):
+        # The UJP jumps to the LDCI, so the LOD and the LDCI can't be fused
+        code = make_code([(23, 0, 2), (0, 0, 1), (7, 1, 3), (28, 0, 0), (58, 0, 0)])
+        fusion = fuse(code)
+
+        self.assertEqual(0, fusion.sites['LOD LDCI'])
+        self.assertEqual(1, fusion.sites['LDCI ADI'])
+        self.assertEqual(0, code.op[1])
+
+    def test_executions_are_counted(self):
+        code = make_code([(0, 0, 1), (0, 0, 2), (28, 0, 0), (58, 0, 0)])
+        fusion = fuse(code)
+        self.run_code(code, fusion.counting_handlers())
+
+        self.assertEqual(1, fusion.executions[[s.name for s in superinstructions].index('LOD LOD ADI')])
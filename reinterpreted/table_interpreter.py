@@ -0,0 +1,775 @@
+""" A table driven version of the interpreter.
+
+Each opcode and each standard procedure has its own handler. The handlers are
+gathered in two flat tables, indexed by the opcode (59 entries) and by the
+standard procedure number (21 entries), so that an instruction is dispatched with
+a single lookup instead of going through the if chains of interpreter.ex0..ex3
+and interpreter.call_sp.
+
+The output is the same as the one of interpreter.interpret.
+"""
+import io
+import unittest
+from math import sin, cos, exp, log, sqrt, atan, trunc
+
+from reinterpreted.code import CodeSegment
+from reinterpreted.int_context import Context, DisplayContext
+from reinterpreted.interpreter import (INPUTADR, PRDADR, base, compare, eoln, file_eof, file_get, file_put,
+                                       flush_files, initialize_files, read_byte, read_line, write_line,
+                                       write_string, write_to_file)
+from reinterpreted.flow import make_code
+from reinterpreted.store import Store, TestStore
+from reinterpreted.verifier import verify
+
+
+# Standard procedures handlers
+
+def sp_rst(context):
+    context.np = context.store.get_value(context.sp)
+    context.sp -= 1
+
+
+def sp_new(context):
+    store = context.store
+    adr = store.get_value(context.sp)
+    ad = context.np - adr
+    if ad <= context.sp:
+        raise RuntimeError("Store Overflow")
+    store.fill_range(ad + 1, context.np, ('UNDEF', 0))
+    context.np = ad
+    ad = store.get_value(context.sp - 1)
+    store.set_address(ad, context.np)
+    context.sp -= 2
+
+
+def sp_wri(context):
+    write_to_file(context, 8)
+
+
+def sp_wrr(context):
+    write_to_file(context, 9)
+
+
+def sp_wrc(context):
+    write_to_file(context, 10)
+
+
+def sp_rdi(context):
+    read_byte(context, 11)
+
+
+def sp_rdr(context):
+    read_byte(context, 12)
+
+
+def sp_rdc(context):
+    read_byte(context, 13)
+
+
+def sp_sin(context):
+    context.store.set_real(context.sp, sin(context.store.get_value(context.sp)))
+
+
+def sp_cos(context):
+    context.store.set_real(context.sp, cos(context.store.get_value(context.sp)))
+
+
+def sp_exp(context):
+    context.store.set_real(context.sp, exp(context.store.get_value(context.sp)))
+
+
+def sp_log(context):
+    context.store.set_real(context.sp, log(context.store.get_value(context.sp)))
+
+
+def sp_sqt(context):
+    context.store.set_real(context.sp, sqrt(context.store.get_value(context.sp)))
+
+
+def sp_atn(context):
+    context.store.set_real(context.sp, atan(context.store.get_value(context.sp)))
+
+
+def sp_sav(context):
+    assert (context.store.get_type(context.sp) == 'ADR')
+    addr = context.store.get_value(context.sp)
+    context.store.set_address(addr, context.np)
+    context.sp -= 1
+
+
+# Indexed by the standard procedure number, in the order of assembler.sptable
+sp_handlers = [file_get, file_put, sp_rst, read_line, sp_new,
+               write_line, write_string, eoln, sp_wri, sp_wrr,
+               sp_wrc, sp_rdi, sp_rdr, sp_rdc, sp_sin,
+               sp_cos, sp_exp, sp_log, sp_sqt, sp_atn,
+               sp_sav]
+
+
+# Instructions handlers, all taking the p and q parameters of the instruction
+
+def grow_stack(context) -> int:
+    sp = context.sp + 1
+    if sp > context.np:
+        raise RuntimeError("Store Overflow")
+    context.sp = sp
+    return sp
+
+
+def op_lod(p, q, context):
+    ad = (context.mp if p == 0 else base(context, p)) + q
+    if context.store.is_undefined(ad):
+        raise RuntimeError("Value Undefined")
+    context.store.copy(grow_stack(context), ad)
+
+
+def op_ldo(p, q, context):
+    if context.store.is_undefined(q):
+        raise RuntimeError("Value Undefined")
+    context.store.copy(grow_stack(context), q)
+
+
+def op_str(p, q, context):
+    context.store.copy((context.mp if p == 0 else base(context, p)) + q, context.sp)
+    context.sp -= 1
+
+
+def op_sro(p, q, context):
+    context.store.copy(q, context.sp)
+    context.sp -= 1
+
+
+def op_lda(p, q, context):
+    context.store.set_address(grow_stack(context), (context.mp if p == 0 else base(context, p)) + q)
+
+
+def op_lao(p, q, context):
+    context.store.set_address(grow_stack(context), q)
+
+
+def op_sto(p, q, context):
+    store = context.store
+    assert (store.get_type(context.sp - 1) == 'ADR')
+    store.copy(store.get_value(context.sp - 1), context.sp)
+    context.sp -= 2
+
+
+def op_ldc(p, q, context):
+    sp = grow_stack(context)
+    if p == 1:
+        context.store.set_int(sp, q)
+    elif p == 3:
+        context.store.set_bool(sp, q == 1)
+    else:
+        context.store.set_address(sp, context.store.highest_address)
+
+
+def op_lci(p, q, context):
+    context.store.copy(grow_stack(context), q)
+
+
+def op_ind(p, q, context):
+    store = context.store
+    adr = store.get_value(context.sp) + q
+    if store.is_undefined(adr):
+        raise RuntimeError("Value Undefined")
+    store.copy(context.sp, adr)
+
+
+def op_inc(p, q, context):
+    t, v = context.store[context.sp]
+    context.store[context.sp] = (t, v + q)
+
+
+def op_mst(p, q, context):
+    # (*P=LEVEL OF CALLING PROCEDURE MINUS LEVEL OF CALLED PROCEDURE + 1;  SET DL AND SL, INCREMENT SP*)
+    store = context.store
+    sp = context.sp
+    store[sp + 1] = ('UNDEF', 0)  # For return value
+    store[sp + 2] = ('MARK', base(context, p))  # For static link
+    store[sp + 3] = ('MARK', context.mp)  # For dynamic link
+    store[sp + 4] = ('UNDEF', 0)  # For previous EP
+    context.sp = sp + 4
+
+
+def op_cup(p, q, context):
+    # (*P=NO OF LOCATIONS FOR PARAMETERS, Q=ENTRY POINT*)
+    context.mp = context.sp - (p + 3)
+    context.store[context.mp + 3] = ('MARK', context.pc)  # Return address
+    context.pc = q
+
+
+def op_ent(p, q, context):
+    j = context.mp + q
+    if j > context.np:
+        raise RuntimeError("Store overflow")
+    if context.sp < INPUTADR:
+        context.sp = PRDADR
+    context.store.fill_range(context.sp + 1, j + 1, ('UNDEF', 0))
+    context.sp = j
+
+
+def op_ret(p, q, context):
+    if p == 0:
+        context.sp = context.mp - 1
+    else:
+        context.sp = context.mp
+    pc = context.store.get_value(context.mp + 3)
+    context.mp = context.store.get_value(context.mp + 2)
+    context.pc = pc
+
+
+def op_csp(p, q, context):
+    sp_handlers[q](context)
+
+
+def op_ixa(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_address(sp, q * store.get_value(sp + 1) + store.get_value(sp))
+
+
+def op_equ(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, _ = compare(context, q)
+        store.set_bool(sp, b)
+    else:
+        store.set_bool(sp, store.get_value(sp) == store.get_value(sp + 1))
+
+
+def op_neq(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, _ = compare(context, q)
+        store.set_bool(sp, not b)
+    else:
+        store.set_bool(sp, store.get_value(sp) != store.get_value(sp + 1))
+
+
+def op_geq(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, (i1, i2) = compare(context, q)
+        store.set_bool(sp, store.get_value(i1) >= store.get_value(i2) or b)
+    elif p == 4:  # Sets, as bitmasks
+        v1, v2 = store.get_value(sp), store.get_value(sp + 1)
+        store.set_bool(sp, not v2 & ~v1)
+    else:
+        store.set_bool(sp, store.get_value(sp) >= store.get_value(sp + 1))
+
+
+def op_grt(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, (i1, i2) = compare(context, q)
+        store.set_bool(sp, store.get_value(i1) > store.get_value(i2) and not b)
+    elif p == 4:  # Sets, as bitmasks
+        v1, v2 = store.get_value(sp), store.get_value(sp + 1)
+        store.set_bool(sp, v1 != v2 and not v2 & ~v1)
+    else:
+        store.set_bool(sp, store.get_value(sp) > store.get_value(sp + 1))
+
+
+def op_leq(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, (i1, i2) = compare(context, q)
+        store.set_bool(sp, store.get_value(i1) <= store.get_value(i2) or b)
+    elif p == 4:  # Sets, as bitmasks
+        v1, v2 = store.get_value(sp), store.get_value(sp + 1)
+        store.set_bool(sp, not v1 & ~v2)
+    else:
+        store.set_bool(sp, store.get_value(sp) <= store.get_value(sp + 1))
+
+
+def op_les(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    if p == 5:
+        b, (i1, i2) = compare(context, q)
+        store.set_bool(sp, store.get_value(i1) < store.get_value(i2) and not b)
+    elif p == 4:  # Sets, as bitmasks
+        v1, v2 = store.get_value(sp), store.get_value(sp + 1)
+        store.set_bool(sp, v1 != v2 and not v1 & ~v2)
+    else:
+        store.set_bool(sp, store.get_value(sp) < store.get_value(sp + 1))
+
+
+def op_ujp(p, q, context):
+    context.pc = q
+
+
+def op_fjp(p, q, context):
+    b = context.store.get_value(context.sp)
+    context.sp -= 1
+    if not b:
+        context.pc = q
+
+
+def op_xjp(p, q, context):
+    v = context.store.get_value(context.sp)
+    context.sp -= 1
+    context.pc = v + q
+
+
+def op_chk(p, q, context):
+    store = context.store
+    v = store.get_value(context.sp)
+    if v < store.get_value(q - 1) or v > store.get_value(q):
+        raise RuntimeError("Value out of range")
+
+
+def op_eof(p, q, context):
+    file_eof(context)
+
+
+def op_adi(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_int(sp, store.get_value(sp) + store.get_value(sp + 1))
+
+
+def op_adr(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_real(sp, store.get_value(sp) + store.get_value(sp + 1))
+
+
+def op_sbi(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_int(sp, store.get_value(sp) - store.get_value(sp + 1))
+
+
+def op_sbr(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_real(sp, store.get_value(sp) - store.get_value(sp + 1))
+
+
+def op_sgs(p, q, context):
+    context.store.set_set(context.sp, 1 << context.store.get_value(context.sp))
+
+
+def op_flt(p, q, context):
+    context.store.set_real(context.sp, context.store.get_value(context.sp))
+
+
+def op_flo(p, q, context):
+    context.store.set_real(context.sp - 1, context.store.get_value(context.sp - 1))
+
+
+def op_trc(p, q, context):
+    context.store.set_int(context.sp, int(trunc(context.store.get_value(context.sp))))
+
+
+def op_ngi(p, q, context):
+    context.store.set_int(context.sp, -context.store.get_value(context.sp))
+
+
+def op_ngr(p, q, context):
+    context.store.set_real(context.sp, -context.store.get_value(context.sp))
+
+
+def op_sqi(p, q, context):
+    v = context.store.get_value(context.sp)
+    context.store.set_int(context.sp, v * v)
+
+
+def op_sqr(p, q, context):
+    v = context.store.get_value(context.sp)
+    context.store.set_real(context.sp, v * v)
+
+
+def op_abi(p, q, context):
+    context.store.set_int(context.sp, abs(context.store.get_value(context.sp)))
+
+
+def op_abr(p, q, context):
+    context.store.set_real(context.sp, abs(context.store.get_value(context.sp)))
+
+
+def op_not(p, q, context):
+    context.store.set_bool(context.sp, not context.store.get_value(context.sp))
+
+
+def op_and(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_bool(sp, store.get_value(sp) and store.get_value(sp + 1))
+
+
+def op_ior(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_bool(sp, store.get_value(sp) or store.get_value(sp + 1))
+
+
+def op_dif(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_set(sp, store.get_value(sp) & ~store.get_value(sp + 1))
+
+
+def op_int(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_set(sp, store.get_value(sp) & store.get_value(sp + 1))
+
+
+def op_uni(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_set(sp, store.get_value(sp) | store.get_value(sp + 1))
+
+
+def op_inn(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    v = store.get_value(sp)
+    store.set_bool(sp, v >= 0 and bool(store.get_value(sp + 1) >> v & 1))
+
+
+def op_mod(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_int(sp, store.get_value(sp) % store.get_value(sp + 1))
+
+
+def op_odd(p, q, context):
+    context.store.set_bool(context.sp, (context.store.get_value(context.sp) % 2) > 0)
+
+
+def op_mpi(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_int(sp, store.get_value(sp) * store.get_value(sp + 1))
+
+
+def op_mpr(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_real(sp, store.get_value(sp) * store.get_value(sp + 1))
+
+
+def op_dvi(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_int(sp, store.get_value(sp) // store.get_value(sp + 1))
+
+
+def op_dvr(p, q, context):
+    store = context.store
+    sp = context.sp - 1
+    context.sp = sp
+    store.set_real(sp, store.get_value(sp) / store.get_value(sp + 1))
+
+
+def op_mov(p, q, context):
+    store = context.store
+    source = store.get_value(context.sp)
+    destination = store.get_value(context.sp - 1)
+    context.sp -= 2
+    store.copy_range(destination, source, q)
+
+
+def op_lca(p, q, context):
+    context.store.set_address(grow_stack(context), q)
+
+
+def op_dec(p, q, context):
+    context.store.set_int(context.sp, context.store.get_value(context.sp) - q)
+
+
+def op_stp(p, q, context):
+    context.running = False
+    flush_files(context)
+
+
+# Indexed by the opcode, in the order of assembler.instructions ('...' being the LCI instruction)
+op_handlers = [op_lod, op_ldo, op_str, op_sro, op_lda, op_lao, op_sto, op_ldc, op_lci, op_ind,
+               op_inc, op_mst, op_cup, op_ent, op_ret, op_csp, op_ixa, op_equ, op_neq, op_geq,
+               op_grt, op_leq, op_les, op_ujp, op_fjp, op_xjp, op_chk, op_eof, op_adi, op_adr,
+               op_sbi, op_sbr, op_sgs, op_flt, op_flo, op_trc, op_ngi, op_ngr, op_sqi, op_sqr,
+               op_abi, op_abr, op_not, op_and, op_ior, op_dif, op_int, op_uni, op_inn, op_mod,
+               op_odd, op_mpi, op_mpr, op_dvi, op_dvr, op_mov, op_lca, op_dec, op_stp]
+
+
+# Handlers resolving the static links with the display of a DisplayContext, instead of base()
+
+def op_lod_display(p, q, context):
+    ad = (context.mp if p == 0 else context.display[context.depth - p]) + q
+    if context.store.is_undefined(ad):
+        raise RuntimeError("Value Undefined")
+    context.store.copy(grow_stack(context), ad)
+
+
+def op_str_display(p, q, context):
+    context.store.copy((context.mp if p == 0 else context.display[context.depth - p]) + q, context.sp)
+    context.sp -= 1
+
+
+def op_lda_display(p, q, context):
+    context.store.set_address(grow_stack(context), (context.mp if p == 0 else context.display[context.depth - p]) + q)
+
+
+def op_mst_display(p, q, context):
+    store = context.store
+    sp = context.sp
+    store[sp + 1] = ('UNDEF', 0)  # For return value
+    store[sp + 2] = ('MARK', context.mp if p == 0 else context.display[context.depth - p])  # For static link
+    store[sp + 3] = ('MARK', context.mp)  # For dynamic link
+    store[sp + 4] = ('UNDEF', 0)  # For previous EP
+    context.sp = sp + 4
+    context.calls.append(p)
+
+
+def op_cup_display(p, q, context):
+    mp = context.sp - (p + 3)
+    context.mp = mp
+    context.store[mp + 3] = ('MARK', context.pc)  # Return address
+    context.pc = q
+
+    # DisplayContext.call()
+    display = context.display
+    calls = context.calls
+    caller_depth = context.depth
+    depth = caller_depth - calls[-1] + 1
+    if depth == len(display):
+        display.append(mp)
+    calls[-1] = (caller_depth, display[depth])
+    display[depth] = mp
+    context.depth = depth
+
+
+def op_ret_display(p, q, context):
+    mp = context.mp
+    context.sp = mp - 1 if p == 0 else mp
+    store = context.store
+    context.pc = store.get_value(mp + 3)
+    context.mp = store.get_value(mp + 2)
+
+    # DisplayContext.ret()
+    depth, frame = context.calls.pop()
+    context.display[context.depth] = frame
+    context.depth = depth
+
+
+display_handlers = list(op_handlers)
+display_handlers[0] = op_lod_display
+display_handlers[2] = op_str_display
+display_handlers[4] = op_lda_display
+display_handlers[11] = op_mst_display
+display_handlers[12] = op_cup_display
+display_handlers[14] = op_ret_display
+
+
+# Handlers without the undefined value checks, and without the overflow checks of the pushes,
+# for code that passed the verifier. The overflow is checked once per procedure by ENT, with the
+# maximum depth of the stack in the procedure, and by NEW and RST with the maximum depth of all
+# the procedures (after them, the procedure can push up to this depth before its next ENT).
+
+def unchecked_push(context) -> int:
+    sp = context.sp + 1
+    context.sp = sp
+    return sp
+
+
+def op_lod_unchecked(p, q, context):
+    context.store.copy(unchecked_push(context), (context.mp if p == 0 else base(context, p)) + q)
+
+
+def op_ldo_unchecked(p, q, context):
+    context.store.copy(unchecked_push(context), q)
+
+
+def op_lda_unchecked(p, q, context):
+    context.store.set_address(unchecked_push(context), (context.mp if p == 0 else base(context, p)) + q)
+
+
+def op_lao_unchecked(p, q, context):
+    context.store.set_address(unchecked_push(context), q)
+
+
+def op_ldc_unchecked(p, q, context):
+    sp = unchecked_push(context)
+    if p == 1:
+        context.store.set_int(sp, q)
+    elif p == 3:
+        context.store.set_bool(sp, q == 1)
+    else:
+        context.store.set_address(sp, context.store.highest_address)
+
+
+def op_ind_unchecked(p, q, context):
+    store = context.store
+    store.copy(context.sp, store.get_value(context.sp) + q)
+
+
+def make_unchecked_handlers(max_depths: dict, max_depth) -> list:
+    """Returns the handlers for code verified with the given maximum depths, indexed by procedure entry"""
+
+    def op_ent_unchecked(p, q, context):
+        j = context.mp + q
+        if j + max_depths[context.pc - 1] > context.np:
+            raise RuntimeError("Store overflow")
+        if context.sp < INPUTADR:
+            context.sp = PRDADR
+        context.store.fill_range(context.sp + 1, j + 1, ('UNDEF', 0))
+        context.sp = j
+
+    def sp_new_unchecked(context):
+        if context.np - context.store.get_value(context.sp) <= context.sp + max_depth:
+            raise RuntimeError("Store Overflow")
+        sp_new(context)
+
+    def sp_rst_unchecked(context):
+        sp_rst(context)
+        if context.np <= context.sp + max_depth:
+            raise RuntimeError("Store Overflow")
+
+    unchecked_sp_handlers = list(sp_handlers)
+    unchecked_sp_handlers[2] = sp_rst_unchecked
+    unchecked_sp_handlers[4] = sp_new_unchecked
+
+    def op_csp_unchecked(p, q, context):
+        unchecked_sp_handlers[q](context)
+
+    handlers = list(op_handlers)
+    handlers[0] = op_lod_unchecked
+    handlers[1] = op_ldo_unchecked
+    handlers[4] = op_lda_unchecked
+    handlers[5] = op_lao_unchecked
+    handlers[7] = op_ldc_unchecked
+    handlers[8] = op_ldo_unchecked  # LCI
+    handlers[9] = op_ind_unchecked
+    handlers[13] = op_ent_unchecked
+    handlers[15] = op_csp_unchecked
+    handlers[56] = op_lao_unchecked  # LCA
+    return handlers
+
+
+def run(context: Context, code: CodeSegment, handlers=op_handlers):
+    # The handler of each instruction is bound once, before running
+    instruction_handlers = [handlers[op] for op in code.op]
+    ps, qs = code.p, code.q
+
+    while context.running:
+        pc = context.pc
+        context.pc = pc + 1
+        instruction_handlers[pc](ps[pc], qs[pc], context)
+
+
+def interpret(input_stream, output_stream, input_file, output_file, code: CodeSegment, store):
+    context = Context(input_stream, output_stream, input_file, output_file, store)
+    initialize_files(context)
+    run(context, code)
+
+
+class TestTableInterpreter(unittest.TestCase):
+    def run_code(self, instructions, context_class=Context, handlers=op_handlers):
+        code = CodeSegment(len(instructions))
+        for address, (op, p, q) in enumerate(instructions):
+            code.set(address, op, p, q)
+        store = Store(TestStore.MockStoreConfiguration())
+        context = context_class(None, io.StringIO(), None, None, store)
+        run(context, code, handlers)
+        return context
+
+    def test_tables_have_an_entry_per_opcode_and_standard_procedure(self):
+        self.assertEqual(59, len(op_handlers))
+        self.assertEqual(21, len(sp_handlers))
+
+    def test_arithmetic_on_stack(self):
+        context = self.run_code([(7, 1, 6), (7, 1, 4), (28, 0, 0), (7, 1, 3), (51, 0, 0), (58, 0, 0)])
+
+        self.assertEqual(0, context.sp)
+        self.assertEqual(('INT', 30), context.store[0])
+
+    def test_false_jump_is_taken_on_false_value(self):
+        context = self.run_code([(7, 3, 0), (24, 0, 3), (7, 1, 1), (7, 1, 2), (58, 0, 0)])
+
+        self.assertEqual(0, context.sp)
+        self.assertEqual(('INT', 2), context.store[0])
+
+    def test_sets_are_bitmasks(self):
+        # LDCI 3 / SGS / LDCI 5 / SGS / UNI / STP
+        context = self.run_code([(7, 1, 3), (32, 0, 0), (7, 1, 5), (32, 0, 0), (47, 0, 0), (58, 0, 0)])
+
+        self.assertEqual(('SETT', 0b101000), context.store[0])
+
+    def test_set_comparisons_are_inclusions(self):
+        # {3} <= {3, 5} / {3, 5} <= {3} / 5 in {3, 5}
+        three_five = [(7, 1, 3), (32, 0, 0), (7, 1, 5), (32, 0, 0), (47, 0, 0)]
+        context = self.run_code([(7, 1, 3), (32, 0, 0)] + three_five + [(21, 4, 0)] +
+                                three_five + [(7, 1, 3), (32, 0, 0), (21, 4, 0)] +
+                                [(7, 1, 5)] + three_five + [(48, 0, 0), (58, 0, 0)])
+
+        self.assertEqual([('BOOL', True), ('BOOL', False), ('BOOL', True)], context.store.get_cells(0, 3))
+
+    def test_write_standard_procedures(self):
+        # LDC 'A' / LDC 1 / LAO OUTPUT / CSP WRC / LAO OUTPUT / CSP WLN / STP
+        context = self.run_code([(7, 1, 65), (7, 1, 1), (5, 0, 5), (15, 0, 10), (5, 0, 5), (15, 0, 5),
+                                 (58, 0, 0)])
+
+        self.assertEqual("A\n", context.files[1].getvalue())
+
+    # The main program calls P (at 3), that calls its nested procedure Q (at 11). Q increments the local of P
+    # and calls itself until the local reaches 3, then P copies its local to the global at 20
+    nested_program = [(11, 0, 0), (12, 0, 3), (58, 0, 0),
+                      (13, 0, 6), (7, 1, 0), (2, 0, 5), (11, 0, 0), (12, 0, 11), (0, 0, 5), (3, 0, 20), (14, 0, 0),
+                      (13, 0, 5), (0, 1, 5), (10, 0, 1), (2, 1, 5), (0, 1, 5), (7, 1, 3), (22, 1, 0), (24, 0, 21),
+                      (11, 1, 0), (12, 0, 11), (14, 0, 0)]
+
+    def test_display_gives_the_same_results_as_the_static_links(self):
+        expected = self.run_code(self.nested_program)
+        context = self.run_code(self.nested_program, DisplayContext, display_handlers)
+
+        self.assertEqual(('INT', 3), expected.store[20])
+        self.assertEqual(expected.store[20], context.store[20])
+        self.assertEqual(expected.sp, context.sp)
+        self.assertEqual([0], context.frames())
+
+    def test_unchecked_handlers_give_the_same_results(self):
+        verification = verify(make_code(self.nested_program))
+        expected = self.run_code(self.nested_program)
+        context = self.run_code(self.nested_program,
+                                handlers=make_unchecked_handlers(verification.max_depths, verification.max_depth))
+
+        self.assertEqual(expected.store[20], context.store[20])
+        self.assertEqual(expected.sp, context.sp)
+
+    def test_unchecked_enter_checks_the_maximum_depth(self):
+        code = CodeSegment(3)
+        code.set(0, 11, 0, 0)
+        code.set(1, 12, 0, 2)
+        code.set(2, 13, 0, 95)
+        context = Context(None, None, None, None, Store(TestStore.MockStoreConfiguration()))
+
+        self.assertRaises(RuntimeError, run, context, code, make_unchecked_handlers({2: 10}, 10))
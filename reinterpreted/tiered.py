@@ -0,0 +1,106 @@
+""" Tiered execution: the table interpreter, and procedures compiled to Python when they get hot.
+
+The calls of each procedure are counted. When a procedure has been called threshold times,
+it is split into basic blocks that are compiled into Python functions (see codegen), and each
+function replaces the handler of the first instruction of its block.
+The code that isn't compiled keeps running in the table interpreter, instruction by instruction.
+"""
+import io
+import unittest
+
+from reinterpreted import codegen
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import CUP, basic_blocks, is_self_contained, jump_targets, make_code, procedure_end
+from reinterpreted.int_context import Context
+from reinterpreted.store import Store, TestStore
+from reinterpreted.table_interpreter import op_cup, op_handlers
+
+DEFAULT_THRESHOLD = 2
+
+
+class TieredBlockCompiler(codegen.BlockCompiler):
+    """Counts the calls made from the compiled code"""
+
+    def compile_call(self, p, q, return_address) -> bool:
+        super().compile_call(p, q, return_address)
+        self.emit(f"on_call({q})")
+        return True
+
+
+class TieredEngine:
+    def __init__(self, code: CodeSegment, threshold=DEFAULT_THRESHOLD, handlers=op_handlers):
+        self.code = code
+        self.threshold = threshold
+        self.handlers = handlers
+        self.targets = jump_targets(code)
+        self.calls = {}
+        self.compiled = set()  # Entries of the procedures compiled, or that can't be
+
+        self.instruction_handlers = [handlers[op] for op in code.op]
+        for pc in range(code.size):
+            if code.op[pc] == CUP:
+                self.instruction_handlers[pc] = self.counting_cup
+
+    def counting_cup(self, p, q, context):
+        op_cup(p, q, context)
+        self.called(q)
+
+    def called(self, entry):
+        count = self.calls.get(entry, 0) + 1
+        self.calls[entry] = count
+        if count >= self.threshold and entry not in self.compiled:
+            self.compiled.add(entry)
+            self.promote(entry)
+
+    def promote(self, entry):
+        end = procedure_end(self.code, entry)
+        if end is None or not is_self_contained(self.code, entry, end):
+            return
+        blocks = basic_blocks(self.code, entry, end, self.targets)
+        functions = codegen.compile_blocks(self.code, blocks, self.handlers, {'on_call': self.called},
+                                           TieredBlockCompiler)
+        for begin, function in functions.items():
+            self.instruction_handlers[begin] = function
+
+    def run(self, context: Context):
+        instruction_handlers = self.instruction_handlers
+        ps, qs = self.code.p, self.code.q
+
+        while context.running:
+            pc = context.pc
+            context.pc = pc + 1
+            instruction_handlers[pc](ps[pc], qs[pc], context)
+
+
+def run(context: Context, code: CodeSegment, threshold=DEFAULT_THRESHOLD):
+    TieredEngine(code, threshold).run(context)
+
+
+class TestTieredEngine(unittest.TestCase):
+    # The main program calls 5 times a procedure incrementing the global at 20
+    program = [(7, 1, 0), (3, 0, 20),
+               (11, 0, 0), (12, 0, 10), (1, 0, 20), (7, 1, 5), (22, 1, 0), (24, 0, 9), (23, 0, 2),
+               (58, 0, 0),
+               (13, 0, 5), (1, 0, 20), (7, 1, 1), (28, 0, 0), (3, 0, 20), (14, 0, 0)]
+
+    def run_program(self, threshold):
+        code = make_code(self.program)
+        store = Store(TestStore.MockStoreConfiguration())
+        context = Context(None, io.StringIO(), None, None, store)
+        engine = TieredEngine(code, threshold)
+        engine.run(context)
+        return engine, context
+
+    def test_procedure_is_compiled_when_it_gets_hot(self):
+        engine, context = self.run_program(threshold=2)
+
+        self.assertEqual({10}, engine.compiled)
+        self.assertEqual(5, engine.calls[10])
+        self.assertEqual(('INT', 5), context.store[20])
+        self.assertEqual(-1, context.sp)
+
+    def test_cold_procedure_is_interpreted(self):
+        engine, context = self.run_program(threshold=10)
+
+        self.assertEqual(set(), engine.compiled)
+        self.assertEqual(('INT', 5), context.store[20])
@@ -0,0 +1,225 @@
+""" Ahead of time translation of a P-Code file into a Python module.
+
+Each procedure becomes a Python function, and each of its basic blocks a function returning
+the block that follows, or None when the procedure returns. A CUP is a call of the Python
+function of the procedure, so that the P-Code calls are Python calls. The code of the blocks
+is generated by codegen, the instructions that aren't translated calling the handlers of the
+table interpreter.
+
+The generated module holds the constant tables of the store, and runs with the same
+command line as pascal_interpreter:
+`python -m reinterpreted.translator compiler/pcomp-adjusted.p2 -o compiler/pcomp_adjusted.py`
+then `python -m compiler.pcomp_adjusted < examples/hello.pas`.
+"""
+import argparse
+import io
+import os
+import py_compile
+import re
+import sys
+import unittest
+from os.path import splitext
+
+from reinterpreted import codegen, image_cache, interpreter
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import (CUP, STP, basic_blocks, BLOCK_ENDS, is_self_contained, jump_targets,
+                                make_code, procedure_end, procedure_entries)
+from reinterpreted.int_context import Context
+from reinterpreted.pascal_interpreter import store_types
+from reinterpreted.store import Store, StoreConfiguration, TestStore
+from translation import streams
+
+RECURSION_LIMIT = 20000  # Each P-Code call uses two Python frames
+
+
+class Stop(Exception):
+    """Raised by STP, to leave all the procedures being run"""
+
+
+class ModuleBlockCompiler(codegen.BlockCompiler):
+    """Generates blocks returning the block that follows, and calling the procedures"""
+    parameters = "context"
+
+    def emit_jump(self, target):
+        self.emit(f"return block_{target}")
+
+    def emit_branch(self, condition, next_pc, target):
+        self.emit(f"return block_{next_pc} if {condition} else block_{target}")
+
+    def emit_indexed_jump(self, address):
+        self.emit(f"return blocks[{address}]")
+
+    def compile_call(self, p, q, return_address) -> bool:
+        self.emit(f"mp = context.sp - {p + 3}")
+        self.emit("context.mp = mp")
+        self.emit(f"store[mp + 3] = ('MARK', {return_address})")
+        self.emit(f"procedure_{q}(context)")
+        self.emit("sp = context.sp")
+        self.emit("mp = context.mp")
+        self.emit("np = context.np")
+        self.offset = 0
+        return False
+
+    def emit_return(self, p):
+        self.emit(f"context.sp = {'mp - 1' if p == 0 else 'mp'}")
+        self.emit("context.mp = store.get_value(mp + 2)")
+        self.emit("return None")
+
+    def emit_stop(self, next_pc):
+        self.emit("context.running = False")
+        self.emit("flush_files(context)")
+        self.emit("raise Stop()")
+
+
+def program_end(code: CodeSegment) -> int:
+    """Returns the address of the STP ending the main code, starting at 0"""
+    pc = 0
+    while code.op[pc] != STP:
+        pc += 1
+    return pc
+
+
+def translate(code: CodeSegment, store, prd_filename, prd_position, module_directory=os.curdir) -> str:
+    """Returns the source of the module running the code, to be written in module_directory.
+    The module finds the P-Code file relative to its own file, wherever it is run from."""
+    prd_path = os.path.relpath(os.path.abspath(prd_filename), os.path.abspath(module_directory))
+    entries = procedure_entries(code)
+    extents = [(0, program_end(code))] + [(entry, procedure_end(code, entry)) for entry in entries]
+    targets = jump_targets(code, return_addresses=False)
+    block_ends = tuple(op for op in BLOCK_ENDS if op != CUP)
+
+    compiler = ModuleBlockCompiler(code)
+    parts = []
+    leaders = []
+    for entry, end in extents:
+        if end is None or not is_self_contained(code, entry, end):
+            raise RuntimeError(f"Procedure at {entry} can't be translated")
+        blocks = basic_blocks(code, entry, end, targets, block_ends)
+        parts.extend(compiler.compile_block(begin, block_end) for begin, block_end in blocks)
+        parts.append(f"def procedure_{entry}(context):\n"
+                     f"    block = block_{entry}\n"
+                     f"    while block is not None:\n"
+                     f"        block = block(context)\n")
+        leaders.extend(begin for begin, _ in blocks)
+
+    header = (f'""" Translation of {prd_filename} by reinterpreted.translator. """\n'
+              f"import os\n"
+              f"from math import trunc\n\n"
+              f"from reinterpreted.interpreter import base, flush_files\n"
+              f"from reinterpreted.table_interpreter import op_handlers as handlers, sp_handlers\n"
+              f"from reinterpreted.translator import Stop, run_translation\n\n"
+              f"PRD_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), {prd_path!r})\n"
+              f"PRD_POSITION = {prd_position!r}\n"
+              f"CONSTANTS = {store.export_constants()!r}\n")
+    footer = (f"blocks = {{{', '.join(f'{leader}: block_{leader}' for leader in leaders)}}}\n\n\n"
+              f"def main():\n"
+              f"    run_translation(procedure_0, CONSTANTS, PRD_FILENAME, PRD_POSITION)\n\n\n"
+              f"if __name__ == '__main__':\n"
+              f"    main()\n")
+    return "\n\n".join([header] + parts + [footer])
+
+
+def run_program(program, context: Context):
+    recursion_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(recursion_limit, RECURSION_LIMIT))
+    try:
+        program(context)
+    except Stop:
+        pass
+    finally:
+        sys.setrecursionlimit(recursion_limit)
+
+
+def run_translation(program, constants, prd_filename, prd_position):
+    """Runs a translated program, as pascal_interpreter runs its P-Code file"""
+    parser = argparse.ArgumentParser(description=f"Translation of {prd_filename}")
+    parser.add_argument("prd_filename", nargs='?', default=prd_filename,
+                        help="P-Code file the program was translated from, its PRR output goes to the .out file")
+    parser.add_argument("--store", choices=store_types.keys(), default='tuple',
+                        help="representation of the data store")
+    arguments = parser.parse_args()
+
+    store = store_types[arguments.store](StoreConfiguration())
+    store.import_constants(constants)
+    base_filename, _ = splitext(arguments.prd_filename)
+    with open(arguments.prd_filename) as prd:
+        prd.seek(prd_position)
+        with open(base_filename + ".out", "w") as prr:
+            context = Context(streams.open_input(4, sys.stdin), streams.OutputStream(5, sys.stdout),
+                              prd, streams.OutputStream(7, prr), store)
+            interpreter.initialize_files(context)
+            try:
+                run_program(program, context)
+            finally:
+                interpreter.flush_files(context)
+
+
+def module_filename(prd_filename) -> str:
+    """Returns the default name of the module translated from prd_filename, which must be importable"""
+    directory, filename = os.path.split(prd_filename)
+    name, _ = splitext(filename)
+    return os.path.join(directory, re.sub(r'\W', '_', name) + ".py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Translates a P-Code file into a Python module")
+    parser.add_argument("prd_filename", help="P-Code file to translate")
+    parser.add_argument("-o", "--output", help="Python module to write (default: next to the P-Code file)")
+    arguments = parser.parse_args()
+    output_filename = arguments.output or module_filename(arguments.prd_filename)
+
+    configuration = StoreConfiguration()
+    store = Store(configuration)
+    code = CodeSegment()
+    with open(arguments.prd_filename) as prd:
+        image_cache.load(prd, store, code, configuration)
+        prd_position = prd.tell()
+
+    with open(output_filename, "w") as output:
+        output.write(translate(code, store, arguments.prd_filename, prd_position, os.path.dirname(output_filename)))
+    py_compile.compile(output_filename)
+
+
+class TestTranslator(unittest.TestCase):
+    def run_translated(self, instructions):
+        code = make_code(instructions)
+        store = Store(TestStore.MockStoreConfiguration())
+        namespace = {'__file__': "test.py"}
+        exec(compile(translate(code, store, "test.p2", 0), "test.py", "exec"), namespace)
+        context = Context(None, io.StringIO(), None, None, store)
+        run_program(namespace['procedure_0'], context)
+        return context
+
+    def test_procedure_calls_are_python_calls(self):
+        # The main program calls 5 times a procedure incrementing the global at 20
+        context = self.run_translated([(7, 1, 0), (3, 0, 20),
+                                       (11, 0, 0), (12, 0, 10), (1, 0, 20), (7, 1, 5), (22, 1, 0), (24, 0, 9),
+                                       (23, 0, 2), (58, 0, 0),
+                                       (13, 0, 5), (1, 0, 20), (7, 1, 1), (28, 0, 0), (3, 0, 20), (14, 0, 0)])
+
+        self.assertFalse(context.running)
+        self.assertEqual(-1, context.sp)
+        self.assertEqual(('INT', 5), context.store[20])
+
+    def test_jump_table(self):
+        # LDCI 1 / XJP 2 / UJP 4 / UJP 6 / LDCI 10 / UJP 7 / LDCI 20 / SRO 30 / STP
+        context = self.run_translated([(7, 1, 1), (25, 0, 2), (23, 0, 4), (23, 0, 6), (7, 1, 10), (23, 0, 7),
+                                       (7, 1, 20), (3, 0, 30), (58, 0, 0)])
+
+        self.assertEqual(('INT', 20), context.store[30])
+
+    def test_p_code_file_is_found_next_to_the_module(self):
+        source = translate(make_code([(58, 0, 0)]), Store(TestStore.MockStoreConfiguration()),
+                           os.path.join("compiler", "test.p2"), 0, "compiler")
+        module_directory = os.path.join(os.sep, "elsewhere", "compiler")
+        namespace = {'__file__': os.path.join(module_directory, "test.py")}
+        exec(compile(source, "test.py", "exec"), namespace)
+
+        self.assertEqual(os.path.join(module_directory, "test.p2"), namespace['PRD_FILENAME'])
+
+    def test_module_is_named_after_the_p_code_file(self):
+        self.assertEqual(os.path.join("compiler", "pcomp_adjusted.py"), module_filename("compiler/pcomp-adjusted.p2"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+""" Load time verification of the stack usage of the assembled code.
+
+Each procedure is followed from its entry through all its instructions, computing the stack
+depth above its frame (the cells reserved by ENT) before each instruction. The code is verified
+when the depths never go below the frame, when all the ways to reach an instruction give it the
+same depth, and when the jumps stay in the procedure.
+
+The maximum depth of each procedure is then known at its ENT, so that a single check there can
+replace the overflow checks of each push (see table_interpreter.make_unchecked_handlers).
+"""
+import unittest
+
+from reinterpreted.code import CodeSegment
+from reinterpreted.flow import (CUP, ENT, FJP, RET, STP, UJP, XJP, make_code, procedure_end,
+                                procedure_entries)
+
+CSP = 15
+
+# Cells popped and pushed by each instruction, indexed by the opcode.
+# CUP, ENT and CSP are computed apart.
+STACK_EFFECTS = [(0, 1), (0, 1), (1, 0), (1, 0), (0, 1), (0, 1), (2, 0), (0, 1), (0, 1), (1, 1),
+                 (1, 1), (0, 4), None, None, (0, 0), None, (2, 1), (2, 1), (2, 1), (2, 1),
+                 (2, 1), (2, 1), (2, 1), (0, 0), (1, 0), (1, 0), (1, 1), (1, 1), (2, 1), (2, 1),
+                 (2, 1), (2, 1), (1, 1), (1, 1), (2, 2), (1, 1), (1, 1), (1, 1), (1, 1), (1, 1),
+                 (1, 1), (1, 1), (1, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 1),
+                 (1, 1), (2, 1), (2, 1), (2, 1), (2, 1), (2, 0), (0, 1), (1, 1), (0, 0)]
+
+# Cells popped and pushed by each standard procedure, in the order of assembler.sptable
+CSP_STACK_EFFECTS = [(1, 0), (1, 0), (1, 0), (1, 0), (2, 0),
+                     (1, 0), (4, 0), (1, 1), (3, 0), (3, 0),
+                     (3, 0), (2, 0), (2, 0), (2, 0), (1, 1),
+                     (1, 1), (1, 1), (1, 1), (1, 1), (1, 1),
+                     (1, 0)]
+
+
+class Verification:
+    def __init__(self):
+        self.max_depths = {}  # Indexed by the procedure entries
+        self.errors = []
+
+    @property
+    def passed(self) -> bool:
+        return not self.errors
+
+    @property
+    def max_depth(self) -> int:
+        return max(self.max_depths.values(), default=0)
+
+
+def successors(code: CodeSegment, pc) -> list[int]:
+    op, q = code.op[pc], code.q[pc]
+    if op == UJP:
+        return [q]
+    if op == FJP:
+        return [pc + 1, q]
+    if op == XJP:
+        entries = []
+        while q < code.size and code.op[q] == UJP:
+            entries.append(q)
+            q += 1
+        return entries
+    if op in (RET, STP):
+        return []
+    return [pc + 1]
+
+
+def stack_effect(code: CodeSegment, pc) -> tuple[int, int]:
+    op, p, q = code.op[pc], code.p[pc], code.q[pc]
+    if op == CUP:
+        # Pops the mark and the parameters, the callee returns a value if it is a function
+        end = procedure_end(code, q)
+        if end is None:
+            raise ValueError(f"call to {q} which isn't a procedure")
+        return p + 4, 0 if code.p[end] == 0 else 1
+    if op == CSP:
+        return CSP_STACK_EFFECTS[q]
+    return STACK_EFFECTS[op]
+
+
+def verify_procedure(code: CodeSegment, begin, end, verification: Verification):
+    """Follows the instructions from begin, adds the maximum depth or the errors to verification"""
+    depths = {begin: 0}
+    pending = [begin]
+    max_depth = 0
+    try:
+        while pending:
+            pc = pending.pop()
+            depth = depths[pc]
+            if code.op[pc] == ENT:
+                if pc != begin:
+                    raise ValueError("ENT inside the procedure")
+                depth_after = 0
+            else:
+                pops, pushes = stack_effect(code, pc)
+                if pops > depth:
+                    raise ValueError("stack underflow")
+                depth_after = depth - pops + pushes
+            max_depth = max(max_depth, depth_after)
+
+            for successor in successors(code, pc):
+                if not begin <= successor <= end:
+                    raise ValueError(f"jump out of the procedure to {successor}")
+                if successor not in depths:
+                    depths[successor] = depth_after
+                    pending.append(successor)
+                elif depths[successor] != depth_after:
+                    raise ValueError(f"depth {depth_after} instead of {depths[successor]} at {successor}")
+    except ValueError as error:
+        verification.errors.append(f"Procedure at {begin}, instruction {pc}: {error}")
+    else:
+        verification.max_depths[begin] = max_depth
+
+
+def verify(code: CodeSegment) -> Verification:
+    """Verifies the main code, starting at 0, and all the procedures"""
+    verification = Verification()
+    main_end = 0
+    while main_end < code.size and code.op[main_end] != STP:
+        main_end += 1
+    verify_procedure(code, 0, main_end, verification)
+    for entry in procedure_entries(code):
+        end = procedure_end(code, entry)
+        if end is None or code.op[entry] != ENT:
+            verification.errors.append(f"Procedure at {entry}: no ENT ... RET extent")
+        else:
+            verify_procedure(code, entry, end, verification)
+    return verification
+
+
+class TestVerifier(unittest.TestCase):
+    # The main program calls P (at 3), which adds 1 to its parameter and returns it
+    program = [(11, 0, 0), (7, 1, 41), (12, 1, 4), (58, 0, 0),
+               (13, 0, 6), (0, 0, 4), (7, 1, 1), (28, 0, 0), (2, 0, 0), (14, 1, 0)]
+
+    def test_tables_have_an_entry_per_opcode_and_standard_procedure(self):
+        self.assertEqual(59, len(STACK_EFFECTS))
+        self.assertEqual(21, len(CSP_STACK_EFFECTS))
+
+    def test_maximum_depths_are_computed(self):
+        verification = verify(make_code(self.program))
+
+        self.assertTrue(verification.passed)
+        self.assertEqual({0: 5, 4: 2}, verification.max_depths)
+        self.assertEqual(5, verification.max_depth)
+
+    def test_stack_underflow_is_detected(self):
+        verification = verify(make_code([(28, 0, 0), (58, 0, 0)]))
+
+        self.assertFalse(verification.passed)
+        self.assertIn("underflow", verification.errors[0])
+
+    def test_different_depths_on_a_join_are_detected(self):
+        # LDCB 1 / FJP 3 / LDCI 1 / STP
+        verification = verify(make_code([(7, 3, 1), (24, 0, 3), (7, 1, 1), (58, 0, 0)]))
+
+        self.assertFalse(verification.passed)
+
+    def test_jump_table_entries_are_followed(self):
+        # LDCI 0 / XJP 2 / UJP 4 / UJP 4 / STP
+        verification = verify(make_code([(7, 1, 0), (25, 0, 2), (23, 0, 4), (23, 0, 4), (58, 0, 0)]))
+
+        self.assertTrue(verification.passed)
@@ -1,5 +1,7 @@
 import io
+import os
 import sys
+import tempfile
 import unittest
 import io
 import re
@@ -57,6 +59,100 @@ class InputStream:
         return 0
 
 
+class MemoryInputStream:
+    """An InputStream reading its whole seekable stream at once, then reading from the text in memory.
+
+    The position in the text replaces the current line, the end of the current line being kept
+    to move to the next line the way InputStream.read_line does.
+    """
+
+    def __init__(self, file_id, stream: io.IOBase):
+        self.file_id = file_id
+        self.stream = stream
+        stream.seek(0, SEEK_SET)
+        self.text = stream.read()
+        self.size = len(self.text)
+        self.position = 0
+        self.line_end = 0
+        self.read_line()
+
+    def get_id(self):
+        return self.file_id
+
+    def read(self):
+        position = self.position
+        if position < self.size:
+            c = self.text[position]
+            self.position = position + 1
+            if self.position == self.line_end:
+                self.read_line()
+            return c
+        else:
+            return 0
+
+    def eol(self):
+        return self.text[self.position] == '\n'
+
+    def read_line(self):
+        self.position = self.line_end
+        line_end = self.text.find('\n', self.position)
+        self.line_end = self.size if line_end < 0 else line_end + 1
+
+    def eof(self):
+        return self.position >= self.size
+
+    def read_next_number(self):
+        m = re_number.match(self.text, self.position, self.line_end)
+        if m:
+            result = m.group(0)
+            self.position += len(result)
+            return float(result)
+        return 0
+
+
+def open_input(file_id, stream: io.IOBase) -> InputStream | MemoryInputStream:
+    """Returns a MemoryInputStream for the seekable streams, an InputStream reading line by line otherwise"""
+    if stream.seekable():
+        return MemoryInputStream(file_id, stream)
+    return InputStream(file_id, stream)
+
+
+class OutputStream:
+    """Gathers the writes in a buffer, so that the values written a character or a field at a time
+    reach the underlying stream as a single string.
+
+    The buffer goes to the stream at the end of each line, when it holds threshold writes,
+    and on flush, which also flushes the stream.
+    """
+
+    def __init__(self, file_id, stream: io.IOBase, threshold=1024):
+        self.file_id = file_id
+        self.stream = stream
+        self.threshold = threshold
+        self.pieces = []
+
+    def get_id(self):
+        return self.file_id
+
+    def write(self, text):
+        pieces = self.pieces
+        pieces.append(text)
+        if text[-1:] == "\n" or len(pieces) >= self.threshold:
+            self.write_pieces()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def write_pieces(self):
+        self.stream.write("".join(self.pieces))
+        self.pieces.clear()
+
+    def flush(self):
+        self.write_pieces()
+        self.stream.flush()
+
+
 input_data = """Hello,
 This is a text!
 """
@@ -110,6 +206,81 @@ class TestFiles(unittest.TestCase):
         self.assertEqual(1, number_1)
 
 
+class TestMemoryInputStream(unittest.TestCase):
+    def read_both(self, text, actions) -> tuple[list, list]:
+        """Applies the same actions to an InputStream and a MemoryInputStream, returns their results"""
+        results = []
+        for stream_class in (InputStream, MemoryInputStream):
+            f = stream_class(4, io.StringIO(text))
+            results.append([action(f) for action in actions])
+        return results[0], results[1]
+
+    def test_reads_as_input_stream(self):
+        actions = [lambda f: (f.eof() or f.eol(), f.read(), f.eof()) for _ in range(len(input_data) + 2)]
+        expected, result = self.read_both(input_data, actions)
+        self.assertEqual(expected, result)
+
+    def test_skips_lines_as_input_stream(self):
+        actions = [lambda f: f.read(), lambda f: f.read_line(), lambda f: f.read(), lambda f: f.read_line(),
+                   lambda f: f.eof()]
+        expected, result = self.read_both(input_data, actions)
+        self.assertEqual(expected, result)
+
+    def test_reads_numbers_as_input_stream(self):
+        actions = [lambda f: f.read_next_number()] * 4 + [lambda f: f.eof()]
+        expected, result = self.read_both(input_numbers, actions)
+        self.assertEqual(expected, result)
+
+    def test_files_translate_line_ends_as_input_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "crlf.txt")
+            with open(filename, "wb") as crlf_file:
+                crlf_file.write(b'ab\r\ncd\r\n')
+
+            results = []
+            for make_stream in (lambda f: InputStream(4, f), lambda f: MemoryInputStream(4, f)):
+                with open(filename) as source:
+                    f = make_stream(source)
+                    results.append([f.read(), f.read(), f.eol(), f.read(), f.read(), f.read(), f.eof()])
+
+        self.assertEqual(['a', 'b', True, '\n', 'c', 'd', False], results[1])
+        self.assertEqual(results[0], results[1])
+
+    def test_non_seekable_streams_are_read_by_line(self):
+        class Pipe(io.StringIO):
+            def seekable(self):
+                return False
+
+        self.assertIsInstance(open_input(4, Pipe(input_data)), InputStream)
+        self.assertIsInstance(open_input(4, io.StringIO(input_data)), MemoryInputStream)
+
+
+class TestOutputStream(unittest.TestCase):
+    def test_writes_are_gathered_until_the_end_of_line(self):
+        stream = io.StringIO()
+        f = OutputStream(5, stream)
+        f.write("H")
+        f.write("i")
+        self.assertEqual("", stream.getvalue())
+
+        f.write("\n")
+        self.assertEqual("Hi\n", stream.getvalue())
+
+    def test_writes_go_to_the_stream_at_the_threshold(self):
+        stream = io.StringIO()
+        f = OutputStream(5, stream, threshold=3)
+        for c in "abcd":
+            f.write(c)
+        self.assertEqual("abc", stream.getvalue())
+
+    def test_flush_writes_the_buffer(self):
+        stream = io.StringIO()
+        f = OutputStream(7, stream)
+        f.writelines(["a", "b"])
+        f.flush()
+        self.assertEqual("ab", stream.getvalue())
+
+
 def main():
     f = InputStream(1, sys.stdin)
     while not f.eof():